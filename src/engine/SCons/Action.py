@@ -125,6 +125,11 @@ print_actions = 1
 execute_actions = 1
 print_actions_presub = 0
 
+# The -j and --jobserver-auth flags that command actions pass on in
+# $MAKEFLAGS, while a parallel build shares a make jobserver with the
+# commands it runs (see SCons.Job.Jobserver).
+jobserver_makeflags = None
+
 # Use pickle protocol 1 when pickling functions for signature
 # otherwise python3 and python2 will yield different pickles
 # for the same object.
@@ -883,8 +888,11 @@ class CommandAction(_ActionAction):
             return ''
         return _string_from_cmd_list(cmd_list[0])
 
-    def execute(self, target, source, env, executor=None):
-        """Execute a command action.
+    def get_commands(self, target, source, env, executor=None):
+        """Returns what's needed to spawn the commands of this action:
+        the spawn function, the shell, the escape function, the shell
+        environment, and a list of (command line, ignore) pairs, with
+        the command lines escaped for the shell.
 
         This will handle lists of commands as well as individual commands,
         because construction variable substitution may turn a single
@@ -928,15 +936,31 @@ class CommandAction(_ActionAction):
                     # reasonable for just about everything else:
                     ENV[key] = str(value)
 
+        if jobserver_makeflags:
+            ENV = ENV.copy()
+            # Replace any jobserver flags the ENV has with ours.
+            flags = [f for f in ENV.get('MAKEFLAGS', '').split()
+                     if not f.startswith('-j')
+                     and not f.startswith('--jobserver-')]
+            flags.append(jobserver_makeflags)
+            ENV['MAKEFLAGS'] = ' '.join(flags)
+
         if executor:
             target = executor.get_all_targets()
             source = executor.get_all_sources()
         cmd_list, ignore, silent = self.process(target, list(map(rfile, source)), env, executor)
 
-        # Use len() to filter out any "command" that's zero-length.
-        for cmd_line in filter(len, cmd_list):
-            # Escape the command line for the interpreter we are using.
-            cmd_line = escape_list(cmd_line, escape)
+        # Use len() to filter out any "command" that's zero-length, and
+        # escape the command lines for the interpreter we are using.
+        commands = [(escape_list(cmd_line, escape), ignore)
+                    for cmd_line in filter(len, cmd_list)]
+        return spawn, shell, escape, ENV, commands
+
+    def execute(self, target, source, env, executor=None):
+        """Execute a command action."""
+        spawn, shell, escape, ENV, commands = \
+            self.get_commands(target, source, env, executor)
+        for cmd_line, ignore in commands:
             result = spawn(shell, escape, cmd_line[0], cmd_line, ENV)
             if not ignore and result:
                 msg = "Error %s" % result
@@ -27,12 +27,16 @@ __doc__ = """
 CacheDir support
 """
 
+import importlib
 import json
 import os
+import shutil
 import stat
 import sys
+import time
 
 import SCons.Action
+import SCons.Util
 import SCons.Warnings
 
 cache_enabled = True
@@ -41,30 +45,73 @@ cache_force = False
 cache_show = False
 cache_readonly = False
 
+# The names of the files in a cache directory with a max_size or a
+# max_entries in its config that keep track of when its entries were
+# last used (see CacheDir.record_access()), and of how big it was when
+# it was last pruned (see prune()).
+index_name = 'index'
+usage_name = 'usage'
+
+# The size-limited CacheDirs that this build pushed files to, by their
+# paths (see prune_caches()).
+pushed_to = {}
+
+# The codecs that cache entries can get compressed with (see the
+# 'compression' cache config setting), by name: the suffix that a
+# compressed entry's file name gets, so that caches with entries that
+# got compressed differently (or not at all) keep working, and a
+# function that opens a compressed file like open() does.
+codecs = {}
+
+try:
+    import gzip
+except ImportError:
+    pass
+else:
+    codecs['gzip'] = ('.gz', lambda name, mode: gzip.open(name, mode, 6))
+
+try:
+    import bz2
+except ImportError:
+    pass
+else:
+    codecs['bz2'] = ('.bz2', bz2.BZ2File)
+
+try:
+    import lzma
+except ImportError:
+    pass
+else:
+    codecs['lzma'] = ('.xz', lzma.open)
+
+# The cache backends for CacheDir() paths that are URLs, by the URL
+# scheme: CacheDir subclasses that take the URL, or the names of the
+# classes to import (see get_cachedir()).
+backends = {
+    'http' : 'SCons.CacheDirHTTP.HTTPCacheDir',
+    'https' : 'SCons.CacheDirHTTP.HTTPCacheDir',
+}
+
 def CacheRetrieveFunc(target, source, env):
     t = target[0]
-    fs = t.fs
     cd = env.get_CacheDir()
     cachedir, cachefile = cd.cachepath(t)
-    if not fs.exists(cachefile):
+    if not cd.exists(t, cachefile):
         cd.CacheDebug('CacheRetrieve(%s):  %s not in cache\n', t, cachefile)
         return 1
     cd.CacheDebug('CacheRetrieve(%s):  retrieving from %s\n', t, cachefile)
     if SCons.Action.execute_actions:
-        if fs.islink(cachefile):
-            fs.symlink(fs.readlink(cachefile), t.get_internal_path())
-        else:
-            env.copy_from_cache(cachefile, t.get_internal_path())
-        st = fs.stat(cachefile)
-        fs.chmod(t.get_internal_path(), stat.S_IMODE(st[stat.ST_MODE]) | stat.S_IWRITE)
+        if not cd.fetch(t, cachefile, env):
+            # It got pruned from the cache since we looked.
+            cd.CacheDebug('CacheRetrieve(%s):  %s not in cache\n', t, cachefile)
+            return 1
     return 0
 
 def CacheRetrieveString(target, source, env):
     t = target[0]
-    fs = t.fs
     cd = env.get_CacheDir()
     cachedir, cachefile = cd.cachepath(t)
-    if t.fs.exists(cachefile):
+    if cd.exists(t, cachefile):
         return "Retrieved `%s' from cache" % t.get_internal_path()
     return None
 
@@ -79,10 +126,9 @@ def CachePushFunc(target, source, env):
     t = target[0]
     if t.nocache:
         return
-    fs = t.fs
     cd = env.get_CacheDir()
     cachedir, cachefile = cd.cachepath(t)
-    if fs.exists(cachefile):
+    if cd.exists(t, cachefile):
         # Don't bother copying it if it's already there.  Note that
         # usually this "shouldn't happen" because if the file already
         # existed in cache, we'd have retrieved the file from there,
@@ -94,36 +140,7 @@ def CachePushFunc(target, source, env):
         return
 
     cd.CacheDebug('CachePush(%s):  pushing to %s\n', t, cachefile)
-
-    tempfile = cachefile+'.tmp'+str(os.getpid())
-    errfmt = "Unable to copy %s to cache. Cache file is %s"
-
-    if not fs.isdir(cachedir):
-        try:
-            fs.makedirs(cachedir)
-        except EnvironmentError:
-            # We may have received an exception because another process
-            # has beaten us creating the directory.
-            if not fs.isdir(cachedir):
-                msg = errfmt % (str(target), cachefile)
-                raise SCons.Errors.EnvironmentError(msg)
-
-    try:
-        if fs.islink(t.get_internal_path()):
-            fs.symlink(fs.readlink(t.get_internal_path()), tempfile)
-        else:
-            fs.copy2(t.get_internal_path(), tempfile)
-        fs.rename(tempfile, cachefile)
-        st = fs.stat(t.get_internal_path())
-        fs.chmod(cachefile, stat.S_IMODE(st[stat.ST_MODE]) | stat.S_IWRITE)
-    except EnvironmentError:
-        # It's possible someone else tried writing the file at the
-        # same time we did, or else that there was some problem like
-        # the CacheDir being on a separate file system that's full.
-        # In any case, inability to push a file to cache doesn't affect
-        # the correctness of the build, so just print a warning.
-        msg = errfmt % (str(target), cachefile)
-        SCons.Warnings.warn(SCons.Warnings.CacheWriteErrorWarning, msg)
+    cd.store(t, cachedir, cachefile)
 
 CachePush = SCons.Action.Action(CachePushFunc, None)
 
@@ -144,6 +161,10 @@ class CacheDir(object):
         self.current_cache_debug = None
         self.debugFP = None
         self.config = dict()
+        self.max_size = 0
+        self.max_entries = 0
+        self.compression = None
+        self.codec_order = [None]
         if path is None:
             return
         # See if there's a config file in the cache directory. If there is,
@@ -195,7 +216,24 @@ class CacheDir(object):
             except ValueError:
                 msg = "Failed to read cache configuration for " + path
                 raise SCons.Errors.EnvironmentError(msg)
-            
+        self.max_size = self.config.get('max_size') or 0
+        self.max_entries = self.config.get('max_entries') or 0
+        compression = self.config.get('compression')
+        if compression not in (None, 'none'):
+            if compression in codecs:
+                self.compression = compression
+            elif (self.path, compression) not in warned:
+                msg = "Cache compression %s is not supported by this Python; " \
+                      "not compressing files pushed to %s" % (compression, self.path)
+                SCons.Warnings.warn(SCons.Warnings.CacheCompressionWarning, msg)
+                warned[(self.path, compression)] = True
+        # Look for entries compressed the way they get pushed first.
+        others = [c for c in sorted(codecs.keys()) if c != self.compression]
+        if self.compression:
+            self.codec_order = [self.compression, None] + others
+        else:
+            self.codec_order = [None] + others
+
 
     def CacheDebug(self, fmt, target, cachefile):
         if cache_debug != self.current_cache_debug:
@@ -215,6 +253,168 @@ class CacheDir(object):
     def is_readonly(self):
         return cache_readonly
 
+    def is_limited(self):
+        return bool(self.max_size or self.max_entries)
+
+    def record_access(self, op, cachefile, size):
+        """
+        Records in the access-time index of a size-limited cache that
+        'cachefile', of 'size' bytes, just got pushed ('push') or
+        retrieved ('get').  This is called from multiple threads in a
+        parallel build (see retrieve()), but the index is locked for
+        other processes anyway.
+        """
+        if not self.is_limited():
+            return
+        line = '%d %s %d %s\n' % (time.time(), op, size,
+                                   cachefile[len(self.path)+1:])
+        index = os.path.join(self.path, index_name)
+        lock = SCons.Util.lock_file(index + '.lock')
+        try:
+            with open(index, 'ab') as f:
+                f.write(line.encode('utf-8'))
+        except EnvironmentError:
+            # Like a failed push, this doesn't affect the build.
+            pass
+        finally:
+            SCons.Util.unlock_file(index + '.lock', lock)
+        if op == 'push':
+            pushed_to[self.path] = self
+
+    def prune_if_full(self):
+        """
+        Prunes the cache if what got pushed to it since it was last
+        pruned could have taken it over its max_size or max_entries,
+        going by its index.  Also prunes it (which compacts the index)
+        if the index has grown a lot since.
+        """
+        try:
+            with open(os.path.join(self.path, usage_name)) as f:
+                usage = json.load(f)
+            offset = usage['index_size']
+            entries, size, count, end = read_index(self.path, offset)
+            size = size + usage['size']
+            count = count + usage['entries']
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            # It never got pruned.
+            prune(self.path, self.max_size, self.max_entries)
+            return
+        if (self.max_size and size > self.max_size) or \
+           (self.max_entries and count > self.max_entries) or \
+           end - offset > max(offset, 1024 * 1024):
+            prune(self.path, self.max_size, self.max_entries)
+
+    def entry(self, fs, cachefile):
+        """
+        Returns the file of the entry for 'cachefile' in the cache and
+        the codec that it's compressed with (None if it isn't), or None
+        if it's not in the cache.
+        """
+        for codec in self.codec_order:
+            if codec is None:
+                name = cachefile
+            else:
+                name = cachefile + codecs[codec][0]
+            if fs.exists(name):
+                return name, codec
+        return None
+
+    def exists(self, node, cachefile):
+        """
+        Returns whether 'cachefile' (as returned by cachepath()) is in
+        the cache.  This and fetch() and store() are what a cache
+        backend overrides (see get_cachedir()).
+        """
+        return self.entry(node.fs, cachefile) is not None
+
+    def fetch(self, node, cachefile, env):
+        """
+        Copies 'cachefile' from the cache to 'node'.  Returns False if
+        it isn't in the cache after all.
+        """
+        fs = node.fs
+        found = self.entry(fs, cachefile)
+        if found is None:
+            return False
+        cachefile, codec = found
+        try:
+            if fs.islink(cachefile):
+                fs.symlink(fs.readlink(cachefile), node.get_internal_path())
+            elif codec is None:
+                env.copy_from_cache(cachefile, node.get_internal_path())
+            else:
+                self.decompress(codec, cachefile, node.get_internal_path(), env)
+            st = fs.stat(cachefile)
+        except EnvironmentError:
+            if fs.islink(cachefile) or fs.exists(cachefile):
+                raise
+            return False
+        fs.chmod(node.get_internal_path(), stat.S_IMODE(st[stat.ST_MODE]) | stat.S_IWRITE)
+        self.record_access('get', cachefile, st[stat.ST_SIZE])
+        return True
+
+    def decompress(self, codec, cachefile, path, env):
+        """
+        Decompresses 'cachefile' straight to 'path'.  Like
+        env.copy_from_cache() would, it gives the file the times of
+        'cachefile', unless the Decider() wants retrieved files to be
+        newer than what they're built from.  fetch() sets the mode.
+        """
+        with codecs[codec][1](cachefile, 'rb') as src:
+            with open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        if env.get_source_decider() != 'timestamp-newer':
+            st = os.stat(cachefile)
+            os.utime(path, (st[stat.ST_ATIME], st[stat.ST_MTIME]))
+
+    def store(self, node, cachedir, cachefile):
+        """
+        Copies 'node' to 'cachefile' in the cache, which is in
+        'cachedir'.
+        """
+        fs = node.fs
+        tempfile = cachefile+'.tmp'+str(os.getpid())
+        errfmt = "Unable to copy %s to cache. Cache file is %s"
+
+        if not fs.isdir(cachedir):
+            try:
+                fs.makedirs(cachedir)
+            except EnvironmentError:
+                # We may have received an exception because another process
+                # has beaten us creating the directory.
+                if not fs.isdir(cachedir):
+                    msg = errfmt % (str(node), cachefile)
+                    raise SCons.Errors.EnvironmentError(msg)
+
+        try:
+            size = None
+            if fs.islink(node.get_internal_path()):
+                fs.symlink(fs.readlink(node.get_internal_path()), tempfile)
+            elif self.compression:
+                with open(node.get_internal_path(), 'rb') as src:
+                    with codecs[self.compression][1](tempfile, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                shutil.copystat(node.get_internal_path(), tempfile)
+                cachefile = cachefile + codecs[self.compression][0]
+                size = fs.stat(tempfile)[stat.ST_SIZE]
+            else:
+                fs.copy2(node.get_internal_path(), tempfile)
+            fs.rename(tempfile, cachefile)
+            st = fs.stat(node.get_internal_path())
+            fs.chmod(cachefile, stat.S_IMODE(st[stat.ST_MODE]) | stat.S_IWRITE)
+            if size is None:
+                size = st[stat.ST_SIZE]
+        except EnvironmentError:
+            # It's possible someone else tried writing the file at the
+            # same time we did, or else that there was some problem like
+            # the CacheDir being on a separate file system that's full.
+            # In any case, inability to push a file to cache doesn't affect
+            # the correctness of the build, so just print a warning.
+            msg = errfmt % (str(node), cachefile)
+            SCons.Warnings.warn(SCons.Warnings.CacheWriteErrorWarning, msg)
+        else:
+            self.record_access('push', cachefile, size)
+
     def cachepath(self, node):
         """
         """
@@ -223,7 +423,12 @@ class CacheDir(object):
 
         sig = node.get_cachedir_bsig()
         subdir = sig[:self.config['prefix_len']].upper()
-        dir = os.path.join(self.path, subdir)
+        if SCons.Util.hash_format == 'md5':
+            dir = os.path.join(self.path, subdir)
+        else:
+            # Keep the files of other hash formats apart, so that the
+            # signatures of different formats can't ever collide.
+            dir = os.path.join(self.path, SCons.Util.hash_format, subdir)
         return dir, os.path.join(dir, sig)
 
     def retrieve(self, node):
@@ -274,6 +479,156 @@ class CacheDir(object):
         if cache_force:
             return self.push(node)
 
+
+def get_cachedir(path):
+    """
+    Returns the CacheDir for 'path', which is either a directory or
+    the URL of a cache server with a backend in 'backends'.
+    """
+    if path is not None and '://' in path:
+        scheme = path.split('://', 1)[0].lower()
+        try:
+            backend = backends[scheme]
+        except KeyError:
+            msg = "No CacheDir backend for %s URL: %s" % (scheme, path)
+            raise SCons.Errors.UserError(msg)
+        if SCons.Util.is_String(backend):
+            module, name = backend.rsplit('.', 1)
+            backend = getattr(importlib.import_module(module), name)
+            backends[scheme] = backend
+        return backend(path)
+    return CacheDir(path)
+
+def read_index(path, offset=0):
+    """
+    Reads the access-time index of the cache directory 'path', from
+    'offset' on.  Returns a dictionary of the [last access time, size]
+    of the entries in it, by their paths relative to the cache, the
+    number of bytes and entries that got pushed, and the offset of the
+    end of the index.
+    """
+    entries = {}
+    size = 0
+    count = 0
+    try:
+        with open(os.path.join(path, index_name), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except EnvironmentError:
+        return entries, size, count, offset
+    for line in data.decode('utf-8', 'replace').splitlines():
+        fields = line.split(' ', 3)
+        try:
+            atime = int(fields[0])
+            entry_size = int(fields[2])
+            name = fields[3]
+        except (ValueError, IndexError):
+            continue
+        if fields[1] == 'push':
+            size = size + entry_size
+            count = count + 1
+        entry = entries.get(name)
+        if entry is None:
+            entries[name] = [atime, entry_size]
+        elif atime >= entry[0]:
+            entries[name] = [atime, entry_size]
+    return entries, size, count, offset + len(data)
+
+def scan_entries(path):
+    """
+    Returns a dictionary of the [modification time, size] of all the
+    entries in the cache directory 'path', by their paths relative to
+    it.
+    """
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(path):
+        if dirpath == path:
+            # The config, index and usage files.
+            continue
+        for name in filenames:
+            if '.tmp' in name:
+                # It's being pushed.
+                continue
+            p = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(p)
+            except OSError:
+                continue
+            entries[p[len(path)+1:]] = [int(st.st_mtime), st.st_size]
+    return entries
+
+def prune(path, max_size=0, max_entries=0):
+    """
+    Removes the least recently used entries from the cache directory
+    'path' until they take up no more than 'max_size' bytes and there
+    are no more than 'max_entries' of them (a limit of 0 means there's
+    none), and compacts its access-time index.  Goes by the times in
+    the index, and if the cache never got pruned, by the times of the
+    files that aren't in the index yet, too.  Returns the number of
+    entries that got removed.
+    """
+    index = os.path.join(path, index_name)
+    usage = os.path.join(path, usage_name)
+    lock = SCons.Util.lock_file(index + '.lock')
+    try:
+        entries = read_index(path)[0]
+        if not os.path.exists(usage):
+            # Only what got pushed or retrieved since the cache got a
+            # limit is in the index, so look for all of the files.
+            scanned = scan_entries(path)
+            for name in scanned:
+                if name in entries:
+                    scanned[name] = entries[name]
+            entries = scanned
+
+        size = sum([entry[1] for entry in entries.values()])
+        count = len(entries)
+        removed = 0
+        lru = sorted(entries.items(), key=lambda item: item[1][0])
+        for name, (atime, entry_size) in lru:
+            if (not max_size or size <= max_size) and \
+               (not max_entries or count <= max_entries):
+                break
+            try:
+                os.unlink(os.path.join(path, name))
+            except OSError:
+                # Someone else got to it first.
+                pass
+            del entries[name]
+            size = size - entry_size
+            count = count - 1
+            removed = removed + 1
+
+        tempfile = index + '.tmp' + str(os.getpid())
+        with open(tempfile, 'wb') as f:
+            for name, (atime, entry_size) in entries.items():
+                line = '%d get %d %s\n' % (atime, entry_size, name)
+                f.write(line.encode('utf-8'))
+            index_size = f.tell()
+        if os.path.exists(index):
+            os.unlink(index)
+        os.rename(tempfile, index)
+        with open(usage, 'w') as f:
+            json.dump({'size' : size,
+                       'entries' : count,
+                       'index_size' : index_size}, f)
+    finally:
+        SCons.Util.unlock_file(index + '.lock', lock)
+    return removed
+
+def prune_caches():
+    """
+    Prunes the size-limited caches that this build pushed files to, if
+    they've gone over their limits.
+    """
+    for path, cd in sorted(pushed_to.items()):
+        try:
+            cd.prune_if_full()
+        except EnvironmentError as e:
+            msg = "Unable to prune cache %s: %s" % (path, e)
+            SCons.Warnings.warn(SCons.Warnings.CacheWriteErrorWarning, msg)
+    pushed_to.clear()
+
 # Local Variables:
 # tab-width:4
 # indent-tabs-mode:nil
@@ -0,0 +1,486 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+__doc__ = """
+CacheDir support for HTTP cache servers
+
+A CacheDir() path like http://host:port/path makes the cache an HTTP
+server.  Derived files get retrieved from it with a GET, and pushed
+to it with a PUT, of path/<prefix>/<signature>, which is the same
+layout as a cache directory.  The mode of a file goes along in an
+X-SCons-Mode header, and a symbolic link is an X-SCons-Link header
+with an empty body.
+
+CacheServer is a small reference server that keeps the files in a
+directory.  To run one:
+
+    python -m SCons.CacheDirHTTP [--host HOST] [--port PORT] DIRECTORY
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+try:
+    import http.client as httplib
+    import http.server as BaseHTTPServer
+    import socketserver as SocketServer
+    from urllib.parse import quote, unquote, urlsplit
+except ImportError:
+    import httplib
+    import BaseHTTPServer
+    import SocketServer
+    from urllib import quote, unquote
+    from urlparse import urlsplit
+
+import SCons.CacheDir
+import SCons.Util
+import SCons.Warnings
+
+# How long to wait (in seconds) for the cache server.
+timeout = 30
+
+# How much of a file that got retrieved gets kept in memory until it's
+# written to the target; the rest gets spooled to a temporary file.
+spool_size = 1024 * 1024
+
+class HTTPCacheDir(SCons.CacheDir.CacheDir):
+    """
+    A CacheDir that's an HTTP cache server.
+
+    Retrieving a file takes a single GET, which happens when the file
+    is looked up (from CacheRetrieveString(), say), and whatever it got
+    is what fetch() writes to the target.  Outside of a retrieval (when
+    a file is about to be pushed), seeing whether a file is in the cache
+    only takes a HEAD.  The connections to the server
+    are kept alive and reused, so the threads of a parallel build each
+    fetch their files over their own connection, without connecting to
+    the server for each one.
+
+    If the server can't be reached, the cache doesn't get used for the
+    rest of the build.
+    """
+
+    def __init__(self, url):
+        SCons.CacheDir.CacheDir.__init__(self, None)
+        self.path = url.rstrip('/')
+        self.config['prefix_len'] = 2
+        url = urlsplit(self.path)
+        self.scheme = url.scheme.lower()
+        self.netloc = url.netloc
+        self.url_path = url.path
+        # The exception that made us give up on the server, if any.
+        self.unavailable = None
+        # The idle connections to the server.
+        self.connections = []
+        self.lock = threading.Lock()
+        # The last lookup in each thread (see lookup()), and whether
+        # the thread is retrieving a file (see retrieve()).
+        self.lookups = threading.local()
+
+    def cachepath(self, node):
+        if not self.is_enabled():
+            return None, None
+
+        sig = node.get_cachedir_bsig()
+        subdir = sig[:self.config['prefix_len']].upper()
+        if SCons.Util.hash_format == 'md5':
+            dir = '%s/%s' % (self.path, subdir)
+        else:
+            dir = '%s/%s/%s' % (self.path, SCons.Util.hash_format, subdir)
+        return dir, '%s/%s' % (dir, sig)
+
+    def connect(self):
+        """
+        Returns an idle connection to the server, or a new one, and
+        whether it's a reused one.
+        """
+        with self.lock:
+            if self.connections:
+                return self.connections.pop(), True
+        if self.scheme == 'https':
+            conn = httplib.HTTPSConnection(self.netloc, timeout=timeout)
+        else:
+            conn = httplib.HTTPConnection(self.netloc, timeout=timeout)
+        return conn, False
+
+    def release(self, conn, response):
+        """
+        Puts a connection back in the pool once its response has been
+        read.
+        """
+        if response.will_close:
+            conn.close()
+            return
+        with self.lock:
+            self.connections.append(conn)
+
+    def request(self, method, cachefile, body=None, headers={}):
+        """
+        Sends a request for 'cachefile' to the server, and returns the
+        connection and the response.  The caller has to read all of the
+        response and release() the connection.
+        """
+        path = quote(self.url_path + cachefile[len(self.path):])
+        while True:
+            conn, reused = self.connect()
+            try:
+                conn.request(method, path, body, headers)
+                return conn, conn.getresponse()
+            except (EnvironmentError, httplib.HTTPException):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed it while it was idle, so try again.
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+
+    def give_up(self, e):
+        with self.lock:
+            if self.unavailable is not None:
+                return
+            self.unavailable = e
+        msg = "Unable to use cache server %s: %s" % (self.path, e)
+        SCons.Warnings.warn(SCons.Warnings.CacheServerWarning, msg)
+
+    def forget(self):
+        """
+        Forgets the last lookup in this thread.
+        """
+        last = getattr(self.lookups, 'last', None)
+        if last is not None and last[1] is not None:
+            last[1][0].close()
+        self.lookups.last = None
+
+    def lookup(self, cachefile):
+        """
+        GETs 'cachefile' from the server, unless it's what this thread
+        looked up last.  Returns None if it isn't in the cache, or a
+        file with its contents, its mode and where it links to.
+        """
+        last = getattr(self.lookups, 'last', None)
+        if last is not None and last[0] == cachefile:
+            return last[1]
+        self.forget()
+        if self.unavailable is not None:
+            return None
+        conn = None
+        try:
+            conn, response = self.request('GET', cachefile)
+            if response.status == 200:
+                contents = tempfile.SpooledTemporaryFile(spool_size)
+                shutil.copyfileobj(response, contents)
+                length = response.getheader('Content-Length')
+                if length is not None and int(length) != contents.tell():
+                    raise httplib.IncompleteRead(b'', int(length) - contents.tell())
+                contents.seek(0)
+                link = response.getheader('X-SCons-Link')
+                if link is not None:
+                    link = unquote(link)
+                entry = (contents, response.getheader('X-SCons-Mode'), link)
+            else:
+                response.read()
+                entry = None
+        except (EnvironmentError, httplib.HTTPException, ValueError) as e:
+            if conn is not None:
+                conn.close()
+            self.give_up(e)
+            return None
+        self.release(conn, response)
+        self.lookups.last = (cachefile, entry)
+        return entry
+
+    def head(self, cachefile):
+        """
+        HEADs 'cachefile' on the server, unless it's what this thread
+        looked up last, and returns whether it's in the cache.
+        """
+        last = getattr(self.lookups, 'last', None)
+        if last is not None and last[0] == cachefile:
+            return last[1] is not None
+        if self.unavailable is not None:
+            return False
+        conn = None
+        try:
+            conn, response = self.request('HEAD', cachefile)
+            response.read()
+        except (EnvironmentError, httplib.HTTPException) as e:
+            if conn is not None:
+                conn.close()
+            self.give_up(e)
+            return False
+        self.release(conn, response)
+        return response.status == 200
+
+    def retrieve(self, node):
+        # Look the file up again for each retrieval, but only once
+        # during it.
+        self.forget()
+        self.lookups.retrieving = True
+        try:
+            return SCons.CacheDir.CacheDir.retrieve(self, node)
+        finally:
+            self.lookups.retrieving = False
+            self.forget()
+
+    def exists(self, node, cachefile):
+        if getattr(self.lookups, 'retrieving', False):
+            # fetch() is about to use what this gets.
+            return self.lookup(cachefile) is not None
+        # Don't download the file just to see that it's there.
+        return self.head(cachefile)
+
+    def fetch(self, node, cachefile, env):
+        entry = self.lookup(cachefile)
+        if entry is None:
+            return False
+        contents, mode, link = entry
+        path = node.get_internal_path()
+        try:
+            if link is not None:
+                node.fs.symlink(link, path)
+            else:
+                # Like an entry of a cache directory, the file gets
+                # copied into place with env.copy_from_cache().
+                tempfile = path + '.tmp' + str(os.getpid())
+                try:
+                    with open(tempfile, 'wb') as f:
+                        shutil.copyfileobj(contents, f)
+                    env.copy_from_cache(tempfile, path)
+                finally:
+                    if os.path.exists(tempfile):
+                        os.unlink(tempfile)
+                if mode is not None:
+                    node.fs.chmod(path, int(mode, 8) | stat.S_IWRITE)
+        finally:
+            self.forget()
+        return True
+
+    def store(self, node, cachedir, cachefile):
+        self.forget()
+        if self.unavailable is not None:
+            return
+        fs = node.fs
+        path = node.get_internal_path()
+        try:
+            if fs.islink(path):
+                headers = {'X-SCons-Link' : quote(fs.readlink(path)),
+                           'Content-Length' : '0'}
+                body = b''
+            else:
+                st = fs.stat(path)
+                headers = {'X-SCons-Mode' : '%o' % stat.S_IMODE(st[stat.ST_MODE]),
+                           'Content-Length' : str(st[stat.ST_SIZE])}
+                body = open(path, 'rb')
+        except EnvironmentError:
+            msg = "Unable to copy %s to cache. Cache file is %s" % (str(node), cachefile)
+            SCons.Warnings.warn(SCons.Warnings.CacheWriteErrorWarning, msg)
+            return
+        conn = None
+        try:
+            try:
+                conn, response = self.request('PUT', cachefile, body, headers)
+                response.read()
+            finally:
+                if body:
+                    body.close()
+        except (EnvironmentError, httplib.HTTPException) as e:
+            if conn is not None:
+                conn.close()
+            self.give_up(e)
+            return
+        self.release(conn, response)
+        if response.status not in (200, 201, 204):
+            # Like any other failed push, this doesn't affect the build.
+            msg = "Unable to copy %s to cache. Cache server returned %d %s for %s" % \
+                  (str(node), response.status, response.reason, cachefile)
+            SCons.Warnings.warn(SCons.Warnings.CacheWriteErrorWarning, msg)
+
+
+class CacheRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles the GETs, HEADs and PUTs of the files in a CacheServer's
+    directory.
+    """
+
+    # So that connections are kept alive.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def cachefile(self):
+        """
+        Returns the file in the server's directory for the request, or
+        None if the request is for something outside of it.
+        """
+        names = [n for n in unquote(urlsplit(self.path).path).split('/') if n]
+        if not names:
+            return None
+        for name in names:
+            if name in ('.', '..') or os.sep in name or \
+               (os.altsep and os.altsep in name):
+                return None
+        path = os.path.join(self.server.directory, *names)
+        # The symbolic links that get pushed are only passed on, never
+        # followed (see get()), but they would be if a request went
+        # through one to a file that it's in.
+        root = os.path.realpath(self.server.directory)
+        dir = os.path.realpath(os.path.dirname(path))
+        if dir != root and not dir.startswith(root + os.sep):
+            return None
+        return path
+
+    def respond(self, code, headers={}, length=0):
+        self.send_response(code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(length))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def do_GET(self):
+        self.get(True)
+
+    def do_HEAD(self):
+        self.get(False)
+
+    def get(self, send_body):
+        path = self.cachefile()
+        if path is None:
+            self.respond(400)
+            return
+        if os.path.islink(path):
+            self.respond(200, {'X-SCons-Link' : quote(os.readlink(path))})
+            return
+        try:
+            f = open(path, 'rb')
+        except EnvironmentError:
+            self.respond(404)
+            return
+        try:
+            st = os.fstat(f.fileno())
+            headers = {'X-SCons-Mode' : '%o' % stat.S_IMODE(st.st_mode),
+                       'Content-Type' : 'application/octet-stream'}
+            self.respond(200, headers, st.st_size)
+            if send_body:
+                shutil.copyfileobj(f, self.wfile)
+        finally:
+            f.close()
+
+    def do_PUT(self):
+        path = self.cachefile()
+        length = int(self.headers.get('Content-Length') or 0)
+        if path is None:
+            # We're not reading the body.
+            self.close_connection = True
+            self.respond(400)
+            return
+        tempfile = '%s.tmp%d.%d' % (path, os.getpid(), threading.current_thread().ident)
+        try:
+            dir = os.path.dirname(path)
+            if not os.path.isdir(dir):
+                try:
+                    os.makedirs(dir)
+                except OSError:
+                    # Another request beat us to it.
+                    if not os.path.isdir(dir):
+                        raise
+            link = self.headers.get('X-SCons-Link')
+            with open(tempfile, 'wb') as f:
+                while length > 0:
+                    data = self.rfile.read(min(length, 64 * 1024))
+                    if not data:
+                        raise IOError("Incomplete request body")
+                    f.write(data)
+                    length = length - len(data)
+            if link is not None:
+                os.unlink(tempfile)
+                os.symlink(unquote(link), tempfile)
+            else:
+                mode = self.headers.get('X-SCons-Mode')
+                if mode is not None:
+                    os.chmod(tempfile, int(mode, 8))
+            if os.path.lexists(path):
+                os.unlink(path)
+            os.rename(tempfile, path)
+        except (EnvironmentError, ValueError):
+            if os.path.lexists(tempfile):
+                os.unlink(tempfile)
+            self.close_connection = True
+            self.respond(500)
+            return
+        self.respond(201)
+
+
+class CacheServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A reference HTTP cache server, which keeps the files in 'directory',
+    for trying out HTTP caches and for testing.  It doesn't limit who can
+    push files to it, so don't run it where untrusted hosts can reach it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory, address=('localhost', 0), verbose=False):
+        self.directory = directory
+        self.verbose = verbose
+        BaseHTTPServer.HTTPServer.__init__(self, address, CacheRequestHandler)
+
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description = 'Serve an SCons cache directory over HTTP')
+    parser.add_argument('directory', help='Path to the cache directory')
+    parser.add_argument('--host', default='localhost',
+                        help='Address to listen on (default: localhost)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on (default: 8080)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log the requests')
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    server = CacheServer(args.directory, (args.host, args.port), args.verbose)
+    print("Serving %s at %s" % (args.directory, server.url()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
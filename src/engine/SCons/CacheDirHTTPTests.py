@@ -0,0 +1,263 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+import os
+import shutil
+import stat
+import sys
+import threading
+import unittest
+
+from TestCmd import TestCmd
+import TestUnit
+
+import SCons.CacheDir
+import SCons.CacheDirHTTP
+import SCons.Node.FS
+import SCons.Warnings
+
+class Environment(object):
+    def __init__(self):
+        self.copied = []
+    def copy_from_cache(self, src, dst):
+        self.copied.append(dst)
+        shutil.copy2(src, dst)
+
+class HTTPCacheDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test = TestCmd(workdir='')
+        self.test.subdir('cache', 'build')
+        self.server = SCons.CacheDirHTTP.CacheServer(self.test.workpath('cache'))
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.1,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.cd = SCons.CacheDir.get_cachedir(self.server.url() + '/')
+        self.cwd = os.getcwd()
+        os.chdir(self.test.workpath('build'))
+        self.fs = SCons.Node.FS.FS()
+        self.env = Environment()
+        self.warnings = []
+        self.save_warn = SCons.Warnings.warn
+        SCons.Warnings.warn = lambda *args: self.warnings.append(args)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        SCons.Warnings.warn = self.save_warn
+        for conn in self.cd.connections:
+            conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def File(self, name, sig, contents=None):
+        node = self.fs.File(name)
+        node.cachesig = sig
+        if contents is not None:
+            self.test.write(['build', name], contents)
+        return node
+
+    def push(self, node):
+        cachedir, cachefile = self.cd.cachepath(node)
+        self.cd.store(node, cachedir, cachefile)
+        return cachefile
+
+    def fetch(self, node):
+        cachedir, cachefile = self.cd.cachepath(node)
+        if not self.cd.exists(node, cachefile):
+            return False
+        return self.cd.fetch(node, cachefile, self.env)
+
+    def test_get_cachedir(self):
+        """Test getting the backend for a URL"""
+        assert isinstance(self.cd, SCons.CacheDirHTTP.HTTPCacheDir), self.cd
+        assert self.cd.path == self.server.url(), self.cd.path
+        cd = SCons.CacheDir.get_cachedir('https://example.com/cache')
+        assert isinstance(cd, SCons.CacheDirHTTP.HTTPCacheDir), cd
+        try:
+            SCons.CacheDir.get_cachedir('ftp://example.com/cache')
+        except SCons.Errors.UserError:
+            pass
+        else:
+            self.fail("expected a UserError")
+
+    def test_cachepath(self):
+        """Test the URLs of the files in the cache"""
+        f1 = self.File('f1', 'abcdef')
+        result = self.cd.cachepath(f1)
+        url = self.server.url()
+        assert result == (url + '/AB', url + '/AB/abcdef'), result
+
+    def test_push_fetch(self):
+        """Test pushing files to the server and fetching them"""
+        f1 = self.File('f1', 'abcdef', 'f1 contents\n')
+        os.chmod(f1.get_internal_path(), 0o755)
+        cachefile = self.push(f1)
+        contents = self.test.read(['cache', 'AB', 'abcdef'], mode='r')
+        assert contents == 'f1 contents\n', contents
+        assert self.warnings == [], self.warnings
+
+        os.unlink(f1.get_internal_path())
+        assert self.fetch(f1)
+        contents = self.test.read(['build', 'f1'], mode='r')
+        assert contents == 'f1 contents\n', contents
+        assert self.env.copied == ['f1'], self.env.copied
+        assert os.listdir('.') == ['f1'], os.listdir('.')
+        mode = stat.S_IMODE(os.stat(f1.get_internal_path()).st_mode)
+        if sys.platform != 'win32':
+            assert mode == 0o755, oct(mode)
+
+        f2 = self.File('f2', '123456')
+        assert not self.fetch(f2)
+        assert not self.cd.fetch(f2, self.cd.cachepath(f2)[1], self.env)
+
+    def test_symlink(self):
+        """Test pushing symbolic links to the server and fetching them"""
+        if not hasattr(os, 'symlink'):
+            return
+        link = self.File('link', 'abcdef')
+        os.symlink('f1', link.get_internal_path())
+        self.push(link)
+        os.unlink(link.get_internal_path())
+        assert self.fetch(link)
+        assert os.readlink(link.get_internal_path()) == 'f1'
+
+    def test_lookup_once(self):
+        """Test that a retrieval looks the file up only once"""
+        f1 = self.File('f1', 'abcdef', 'f1 contents\n')
+        cachefile = self.push(f1)
+        requests = []
+        save_request = self.cd.request
+        def request(method, cachefile, *args):
+            requests.append(method)
+            return save_request(method, cachefile, *args)
+        self.cd.request = request
+        self.cd.lookups.retrieving = True
+        try:
+            for i in range(2):
+                assert self.cd.exists(f1, cachefile)
+            assert self.cd.fetch(f1, cachefile, self.env)
+            assert requests == ['GET'], requests
+            self.cd.forget()
+            assert self.cd.exists(f1, cachefile)
+            assert requests == ['GET', 'GET'], requests
+        finally:
+            self.cd.lookups.retrieving = False
+            self.cd.forget()
+
+    def test_exists_head(self):
+        """Test that seeing whether a file is there doesn't download it"""
+        f1 = self.File('f1', 'abcdef', 'f1 contents\n')
+        cachefile = self.push(f1)
+        f2 = self.File('f2', '123456')
+        requests = []
+        save_request = self.cd.request
+        def request(method, cachefile, *args):
+            requests.append(method)
+            return save_request(method, cachefile, *args)
+        self.cd.request = request
+        assert self.cd.exists(f1, cachefile)
+        assert not self.cd.exists(f2, self.cd.cachepath(f2)[1])
+        assert requests == ['HEAD', 'HEAD'], requests
+        assert len(self.cd.connections) == 1, self.cd.connections
+
+        # Fetching it still GETs it.
+        os.unlink(f1.get_internal_path())
+        assert self.cd.fetch(f1, cachefile, self.env)
+        assert requests == ['HEAD', 'HEAD', 'GET'], requests
+        contents = self.test.read(['build', 'f1'], mode='r')
+        assert contents == 'f1 contents\n', contents
+
+    def test_connection_pool(self):
+        """Test reusing connections to the server"""
+        files = [self.File('f%d' % i, 'ab%04d' % i, 'f%d\n' % i)
+                 for i in range(20)]
+        for f in files:
+            self.push(f)
+        assert len(self.cd.connections) == 1, self.cd.connections
+
+        # Fetch them from several threads at once.
+        results = []
+        def fetch(files):
+            for f in files:
+                self.cd.forget()
+                os.unlink(f.get_internal_path())
+                results.append(self.fetch(f))
+        threads = [threading.Thread(target=fetch, args=(files[i::4],))
+                   for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [True] * 20, results
+        assert 1 <= len(self.cd.connections) <= 4, self.cd.connections
+        for i, f in enumerate(files):
+            contents = self.test.read(['build', 'f%d' % i], mode='r')
+            assert contents == 'f%d\n' % i, contents
+
+    def test_unavailable(self):
+        """Test a server that can't be reached"""
+        self.server.shutdown()
+        self.server.server_close()
+        f1 = self.File('f1', 'abcdef', 'f1 contents\n')
+        self.cd.connections = []
+        assert not self.fetch(f1)
+        self.push(f1)
+        assert not self.fetch(f1)
+        assert len(self.warnings) == 1, self.warnings
+        assert self.warnings[0][0] is SCons.Warnings.CacheServerWarning, self.warnings
+
+    def test_server_paths(self):
+        """Test that the server only serves files in its directory"""
+        f1 = self.File('f1', 'abcdef', 'f1 contents\n')
+        self.cd.store(f1, None, self.cd.path + '/../f1')
+        assert self.warnings[0][0] is SCons.Warnings.CacheWriteErrorWarning, self.warnings
+        assert not os.path.exists(self.test.workpath('f1'))
+
+        # Nor does it follow a symbolic link that got pushed to it.
+        if not hasattr(os, 'symlink'):
+            return
+        self.test.subdir('secret')
+        self.test.write(['secret', 'f2'], 'secret\n')
+        link = self.File('link', 'abcdef')
+        os.symlink(self.test.workpath('secret'), link.get_internal_path())
+        self.push(link)
+        assert os.path.islink(self.test.workpath('cache', 'AB', 'abcdef'))
+        cachefile = self.cd.path + '/AB/abcdef/f2'
+        assert self.cd.lookup(cachefile) is None
+        f2 = self.File('f2', '123456', 'f2\n')
+        self.cd.store(f2, None, cachefile)
+        assert self.test.read(['secret', 'f2'], mode='r') == 'secret\n'
+        assert len(self.warnings) == 2, self.warnings
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(HTTPCacheDirTestCase, 'test_')
+    TestUnit.run(suite)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
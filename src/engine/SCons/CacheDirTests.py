@@ -23,8 +23,10 @@
 
 __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
+import json
 import os.path
 import shutil
+import stat
 import sys
 import unittest
 
@@ -32,6 +34,7 @@ from TestCmd import TestCmd
 import TestUnit
 
 import SCons.CacheDir
+import SCons.Warnings
 
 built_it = None
 
@@ -113,6 +116,26 @@ class CacheDirTestCase(BaseTestCase):
         finally:
             SCons.Util.MD5collect = save_collect
 
+    def test_cachepath_hash_format(self):
+        """Test the cachepath() method with a non-default hash format"""
+        def my_collect(list):
+            return list[0]
+        save_collect = SCons.Util.MD5collect
+        SCons.Util.MD5collect = my_collect
+
+        try:
+            SCons.Util.set_hash_format('sha256')
+            name = 'a_fake_bsig'
+            f6 = self.File("cd.f6", name)
+            result = self._CacheDir.cachepath(f6)
+            len = self._CacheDir.config['prefix_len']
+            dirname = os.path.join('cache', 'sha256', name.upper()[:len])
+            filename = os.path.join(dirname, name)
+            assert result == (dirname, filename), result
+        finally:
+            SCons.Util.set_hash_format('md5')
+            SCons.Util.MD5collect = save_collect
+
 class FileTestCase(BaseTestCase):
     """
     Test calling CacheDir code through Node.FS.File interfaces.
@@ -286,11 +309,225 @@ class FileTestCase(BaseTestCase):
         finally:
             SCons.CacheDir.CacheRetrieveSilent = save_CacheRetrieveSilent
 
+class PruneTestCase(unittest.TestCase):
+    """
+    Test the access-time index and pruning of size-limited caches.
+    """
+    def setUp(self):
+        self.test = TestCmd(workdir='')
+        self.test.subdir('cache', ['cache', 'AA'], ['cache', 'BB'])
+        self.test.write(['cache', 'config'],
+                        '{"prefix_len": 2, "max_size": 100}')
+        self.path = self.test.workpath('cache')
+        self.cd = SCons.CacheDir.CacheDir(self.path)
+        SCons.CacheDir.pushed_to.clear()
+
+    def push(self, name, size, atime):
+        """Puts an entry into the cache, and into its index as if it
+        got pushed at 'atime'."""
+        cachefile = os.path.join(self.path, name[:2], name)
+        with open(cachefile, 'wb') as f:
+            f.write(b'x' * size)
+        save_time = SCons.CacheDir.time.time
+        SCons.CacheDir.time.time = lambda: atime
+        try:
+            self.cd.record_access('push', cachefile, size)
+        finally:
+            SCons.CacheDir.time.time = save_time
+
+    def entries(self):
+        result = []
+        for dir in ('AA', 'BB'):
+            result.extend(os.listdir(os.path.join(self.path, dir)))
+        return sorted(result)
+
+    def usage(self):
+        with open(os.path.join(self.path, SCons.CacheDir.usage_name)) as f:
+            return json.load(f)
+
+    def test_config(self):
+        """Test reading the limits from the config"""
+        assert self.cd.max_size == 100, self.cd.max_size
+        assert self.cd.max_entries == 0, self.cd.max_entries
+        assert self.cd.is_limited()
+        assert not SCons.CacheDir.CacheDir(None).is_limited()
+
+    def test_record_access(self):
+        """Test recording accesses in the index"""
+        self.push('AA1', 10, 1000)
+        self.cd.record_access('get', os.path.join(self.path, 'AA', 'AA1'), 10)
+        index = self.test.read(['cache', SCons.CacheDir.index_name], mode='r')
+        lines = index.splitlines()
+        assert lines[0] == '1000 push 10 ' + os.path.join('AA', 'AA1'), lines
+        assert lines[1].split()[1:] == ['get', '10', os.path.join('AA', 'AA1')], lines
+        assert list(SCons.CacheDir.pushed_to.values()) == [self.cd]
+
+        self.test.write(['cache', 'config'], '{"prefix_len": 2}')
+        cd = SCons.CacheDir.CacheDir(self.path)
+        cd.record_access('push', os.path.join(self.path, 'BB', 'BB1'), 10)
+        index2 = self.test.read(['cache', SCons.CacheDir.index_name], mode='r')
+        assert index2 == index, index2
+
+    def test_prune(self):
+        """Test pruning the least recently used entries"""
+        self.push('AA1', 40, 1000)
+        self.push('BB1', 40, 1001)
+        self.push('AA2', 40, 1002)
+        self.cd.record_access('get', os.path.join(self.path, 'AA', 'AA1'), 40)
+
+        removed = SCons.CacheDir.prune(self.path, 100)
+        assert removed == 1, removed
+        assert self.entries() == ['AA1', 'AA2'], self.entries()
+        usage = self.usage()
+        assert usage['size'] == 80, usage
+        assert usage['entries'] == 2, usage
+
+        # The index got compacted.
+        entries, size, count, end = SCons.CacheDir.read_index(self.path)
+        assert sorted(entries.keys()) == [os.path.join('AA', 'AA1'),
+                                          os.path.join('AA', 'AA2')], entries
+        assert end == usage['index_size'], (end, usage)
+
+        removed = SCons.CacheDir.prune(self.path, 0, 1)
+        assert removed == 1, removed
+        assert self.entries() == ['AA1'], self.entries()
+
+    def test_prune_unindexed(self):
+        """Test pruning entries that aren't in the index"""
+        self.test.write(['cache', 'BB', 'BB1'], 'x' * 60)
+        os.utime(os.path.join(self.path, 'BB', 'BB1'), (500, 500))
+        self.test.write(['cache', 'BB', 'BB2.tmp1234'], 'x' * 60)
+        self.push('AA1', 60, 1000)
+
+        removed = SCons.CacheDir.prune(self.path, 100)
+        assert removed == 1, removed
+        assert self.entries() == ['AA1', 'BB2.tmp1234'], self.entries()
+        assert self.usage()['size'] == 60, self.usage()
+
+    def test_prune_caches(self):
+        """Test pruning the caches that got pushed to when they're full"""
+        self.push('AA1', 40, 1000)
+        SCons.CacheDir.prune(self.path, 100)
+        self.push('AA2', 40, 1001)
+        SCons.CacheDir.prune_caches()
+        assert self.entries() == ['AA1', 'AA2'], self.entries()
+        assert self.usage()['size'] == 40, self.usage()
+        assert SCons.CacheDir.pushed_to == {}, SCons.CacheDir.pushed_to
+
+        self.push('BB1', 40, 1002)
+        SCons.CacheDir.prune_caches()
+        assert self.entries() == ['AA2', 'BB1'], self.entries()
+        assert self.usage()['size'] == 80, self.usage()
+
+class CompressionTestCase(unittest.TestCase):
+    """
+    Test compressing the entries of a cache.
+    """
+    def setUp(self):
+        self.test = TestCmd(workdir='')
+        self.test.subdir('cache', 'build')
+        self.cwd = os.getcwd()
+        os.chdir(self.test.workpath('build'))
+        import SCons.Node.FS
+        self.fs = SCons.Node.FS.FS()
+        self.env = Environment(None)
+        self.env.copy_from_cache = shutil.copy2
+        self.env.get_source_decider = lambda: 'MD5'
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def CacheDir(self, compression):
+        self.test.write(['cache', 'config'],
+                        json.dumps({'prefix_len' : 2,
+                                    'compression' : compression}))
+        return SCons.CacheDir.CacheDir(self.test.workpath('cache'))
+
+    def File(self, name, sig, contents):
+        node = self.fs.File(name)
+        node.cachesig = sig
+        self.test.write(['build', name], contents)
+        return node
+
+    def push(self, cd, node):
+        cachedir, cachefile = cd.cachepath(node)
+        cd.store(node, cachedir, cachefile)
+        return cachefile
+
+    def retrieve(self, cd, node):
+        os.unlink(node.get_internal_path())
+        cachedir, cachefile = cd.cachepath(node)
+        assert cd.exists(node, cachefile)
+        assert cd.fetch(node, cachefile, self.env)
+        return self.test.read(['build', str(node)])
+
+    def test_compression(self):
+        """Test pushing compressed entries and retrieving them"""
+        contents = b'f1 contents\n' * 100
+        f1 = self.File('f1', 'abcdef', contents)
+        os.chmod('f1', 0o755)
+        for codec in sorted(SCons.CacheDir.codecs.keys()):
+            cd = self.CacheDir(codec)
+            cachefile = self.push(cd, f1)
+            suffix, open_codec = SCons.CacheDir.codecs[codec]
+            assert os.path.exists(cachefile + suffix), codec
+            assert not os.path.exists(cachefile), codec
+            assert os.path.getsize(cachefile + suffix) < len(contents), codec
+            with open_codec(cachefile + suffix, 'rb') as f:
+                assert f.read() == contents, codec
+            mtime = int(os.stat(cachefile + suffix).st_mtime) - 1000
+            os.utime(cachefile + suffix, (mtime, mtime))
+
+            result = self.retrieve(cd, f1)
+            assert result == contents, (codec, result)
+            # It gets the times of the entry...
+            assert os.stat('f1').st_mtime == mtime, codec
+            if sys.platform != 'win32':
+                mode = stat.S_IMODE(os.stat('f1').st_mode)
+                assert mode == 0o755, (codec, oct(mode))
+            assert os.listdir('.') == ['f1'], os.listdir('.')
+            # ...unless retrieved files should be newer.
+            self.env.get_source_decider = lambda: 'timestamp-newer'
+            self.retrieve(cd, f1)
+            self.env.get_source_decider = lambda: 'MD5'
+            assert os.stat('f1').st_mtime > mtime + 500, codec
+            os.unlink(cachefile + suffix)
+
+    def test_mixed(self):
+        """Test retrieving entries that got compressed differently"""
+        f1 = self.File('f1', 'abcdef', b'f1 contents\n')
+        f2 = self.File('f2', 'abcdef2', b'f2 contents\n')
+        self.push(self.CacheDir('none'), f1)
+        self.push(self.CacheDir('gzip'), f2)
+        for compression in ('none', 'gzip', 'bz2'):
+            cd = self.CacheDir(compression)
+            assert self.retrieve(cd, f1) == b'f1 contents\n', compression
+            assert self.retrieve(cd, f2) == b'f2 contents\n', compression
+
+    def test_unsupported(self):
+        """Test a codec that this Python doesn't have"""
+        warnings = []
+        save_warn = SCons.Warnings.warn
+        SCons.Warnings.warn = lambda *args: warnings.append(args)
+        try:
+            cd = self.CacheDir('unknown')
+            cd = self.CacheDir('unknown')
+        finally:
+            SCons.Warnings.warn = save_warn
+        assert cd.compression is None, cd.compression
+        assert len(warnings) == 1, warnings
+        assert warnings[0][0] is SCons.Warnings.CacheCompressionWarning
+        f1 = self.File('f1', 'abcdef', b'f1 contents\n')
+        cachefile = self.push(cd, f1)
+        assert os.path.exists(cachefile)
+
 if __name__ == "__main__":
     suite = unittest.TestSuite()
     tclasses = [
         CacheDirTestCase,
         FileTestCase,
+        PruneTestCase,
+        CompressionTestCase,
     ]
     for tclass in tclasses:
         names = unittest.getTestCaseNames(tclass, 'test_')
@@ -56,6 +56,7 @@ import SCons.Platform
 import SCons.SConf
 import SCons.SConsign
 import SCons.Subst
+import SCons.Taskmaster
 import SCons.Tool
 import SCons.Util
 import SCons.Warnings
@@ -928,6 +929,9 @@ class Base(SubstitutionEnvironment):
         # OverrideEnvironment or what have you.
         self.decide_target = default_decide_target
         self.decide_source = default_decide_source
+        # The name of the Decider() that decide_source is (see
+        # get_source_decider()).
+        self.source_decider = None
 
         self.copy_from_cache = default_copy_from_cache
 
@@ -1013,7 +1017,7 @@ class Base(SubstitutionEnvironment):
                 return self._last_CacheDir
         except AttributeError:
             pass
-        cd = SCons.CacheDir.CacheDir(path)
+        cd = SCons.CacheDir.get_cachedir(path)
         self._last_CacheDir_path = path
         self._last_CacheDir = cd
         return cd
@@ -1117,6 +1121,17 @@ class Base(SubstitutionEnvironment):
             self.tgt_sig_type = t
             return t
 
+    def get_source_decider(self):
+        """Returns the name of the Decider() that decides whether the
+        sources of this environment's targets changed ('MD5',
+        'MD5-timestamp', 'timestamp-newer' or 'timestamp-match'), or None
+        if it's a function of its own."""
+        if self.decide_source is default_decide_source:
+            env = SCons.Defaults.DefaultEnvironment()
+            if env is not self:
+                return env.get_source_decider()
+        return self.source_decider
+
     #######################################################################
     # Public methods for manipulating an Environment.  These begin with
     # upper-case letters.  The essential characteristic of methods in
@@ -1461,17 +1476,22 @@ class Base(SubstitutionEnvironment):
 
     def Decider(self, function):
         copy_function = self._copy2_from_cache
+        name = None
         if function in ('MD5', 'content'):
             if not SCons.Util.md5:
                 raise UserError("MD5 signatures are not available in this version of Python.")
             function = self._changed_content
+            name = 'MD5'
         elif function == 'MD5-timestamp':
             function = self._changed_timestamp_then_content
+            name = 'MD5-timestamp'
         elif function in ('timestamp-newer', 'make'):
             function = self._changed_timestamp_newer
             copy_function = self._copy_from_cache
+            name = 'timestamp-newer'
         elif function == 'timestamp-match':
             function = self._changed_timestamp_match
+            name = 'timestamp-match'
         elif not callable(function):
             raise UserError("Unknown Decider value %s" % repr(function))
 
@@ -1480,6 +1500,7 @@ class Base(SubstitutionEnvironment):
         # method, which would add self as an initial, fourth argument.
         self.decide_target = function
         self.decide_source = function
+        self.source_decider = name
 
         self.copy_from_cache = copy_function
 
@@ -2120,6 +2141,25 @@ class Base(SubstitutionEnvironment):
             t.add_prerequisite(plist)
         return tlist
 
+    def ResourcePool(self, name, size=None, target=[]):
+        """Sets the number of tasks in the named resource pool that may
+        be built at the same time to 'size' (if specified), and puts
+        the specified targets in the pool."""
+        name = self.subst(name)
+        pool = SCons.Taskmaster.get_resource_pool(name)
+        if size is not None:
+            try:
+                size = int(size)
+                if size < 1:
+                    raise ValueError
+            except ValueError:
+                raise SCons.Errors.UserError("A positive integer is required for the size of resource pool %s: %s" % (name, repr(size)))
+            pool.size = size
+        tlist = self.arg2nodes(target, self.fs.Entry)
+        for t in tlist:
+            t.attributes.resource_pool = name
+        return tlist
+
     def Scanner(self, *args, **kw):
         nargs = []
         for arg in args:
@@ -2180,8 +2220,10 @@ class Base(SubstitutionEnvironment):
             if not SCons.Util.md5:
                 raise UserError("MD5 signatures are not available in this version of Python.")
             self.decide_source = self._changed_content
+            self.source_decider = 'MD5'
         elif type == 'timestamp':
             self.decide_source = self._changed_timestamp_match
+            self.source_decider = 'timestamp-match'
         else:
             raise UserError("Unknown source signature type '%s'" % type)
 
@@ -2851,6 +2851,27 @@ def generate(env):
         finally:
             os.chdir(save)
 
+    def test_Decider(self):
+        """Test the name of the Decider() of an Environment"""
+        env = self.TestEnvironment()
+        default = SCons.Defaults.DefaultEnvironment().get_source_decider()
+        assert env.get_source_decider() == default, env.get_source_decider()
+        env.Decider('content')
+        assert env.get_source_decider() == 'MD5', env.get_source_decider()
+        env.Decider('MD5-timestamp')
+        r = env.get_source_decider()
+        assert r == 'MD5-timestamp', r
+        env.Decider('make')
+        r = env.get_source_decider()
+        assert r == 'timestamp-newer', r
+        env.Decider(lambda dependency, target, prev_ni: True)
+        assert env.get_source_decider() is None, env.get_source_decider()
+        clone = env.Clone()
+        clone.Decider('timestamp-match')
+        r = clone.get_source_decider()
+        assert r == 'timestamp-match', r
+        assert env.get_source_decider() is None, env.get_source_decider()
+
     def test_Depends(self):
         """Test the explicit Depends method."""
         env = self.TestEnvironment(FOO = 'xxx', BAR='yyy')
@@ -3148,6 +3169,35 @@ def generate(env):
         expect = ['/tmp/foo', '/tmp/rrr', '/tmp/sss/foo']
         assert env.fs.list == expect, env.fs.list
 
+    def test_ResourcePool(self):
+        """Test the ResourcePool() method"""
+        import SCons.Taskmaster
+        env = self.TestEnvironment(FOO='ggg', POOL='link')
+        t = env.ResourcePool('$POOL', 2)
+        assert t == [], t
+        pool = SCons.Taskmaster.resource_pools['link']
+        assert pool.size == 2, pool.size
+
+        t = env.ResourcePool('link', target=['r_a', 'r_$FOO'])
+        assert pool.size == 2, pool.size
+        assert t[0].get_internal_path() == 'r_a'
+        assert t[0].attributes.resource_pool == 'link'
+        assert t[1].get_internal_path() == 'r_ggg'
+        assert t[1].attributes.resource_pool == 'link'
+
+        t = env.ResourcePool('link', '3', 'r_b')
+        assert pool.size == 3, pool.size
+        assert t[0].attributes.resource_pool == 'link'
+
+        for size in [0, 'x']:
+            try:
+                env.ResourcePool('link', size)
+            except SCons.Errors.UserError:
+                pass
+            else:
+                self.fail("did not catch expected UserError")
+        assert pool.size == 3, pool.size
+
     def test_Scanner(self):
         """Test the Scanner() method"""
         def scan(node, env, target, arg):
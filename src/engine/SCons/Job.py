@@ -4,6 +4,26 @@ This module defines the Serial and Parallel classes that execute tasks to
 complete a build. The Jobs class provides a higher level interface to start,
 stop, and wait on jobs.
 
+A Parallel job also takes part in the GNU make jobserver protocol (see
+Jobserver), so that it shares its job slots with a make that runs SCons
+or with the make, ninja or cargo sub-builds that SCons runs.
+
+A Parallel job can also start the commands of its tasks without
+waiting for them, and wait for all of them in one thread (see
+CommandLoop), so that it needs fewer threads for high -j values.
+
+A Parallel job can also read the names of the files that source files
+include in worker threads, ahead of the Taskmaster (see Prescanner), so
+that the scans it runs don't wait for the files one at a time.
+
+A Parallel job can also compute the content signatures of the source
+files of its targets in worker threads before it starts (see
+SourceHasher), instead of one at a time as the Taskmaster gets to them.
+
+A Parallel job can also hand the builds of targets whose actions are all
+Python functions to a pool of worker processes (see ProcessPool), so that
+they don't serialize on the interpreter lock of the worker threads.
+
 """
 
 #
@@ -33,10 +53,31 @@ __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
 import SCons.compat
 
+import errno
 import os
+import pickle
+import select
+import shutil
 import signal
+import stat
+import sys
+import tempfile
+import time
 
+import SCons.Action
 import SCons.Errors
+import SCons.Executor
+import SCons.Node.FS
+import SCons.Platform.posix
+import SCons.Scanner
+import SCons.Util
+
+from SCons.compat import PICKLE_PROTOCOL
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
 
 # The default stack size (in kilobytes) of the threads used to execute
 # jobs in parallel.
@@ -51,6 +92,227 @@ default_stack_size = 256
 
 interrupt_msg = 'Build interrupted.'
 
+# How often (in seconds) a Parallel job that is holding back tasks
+# because the system load is too high checks whether the load dropped.
+
+load_check_interval = 1.0
+
+
+def get_load_average():
+    """Returns the system load average over the last minute, or None
+    if it isn't available on this platform."""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+# How often (in seconds) a Parallel job that is waiting for a jobserver
+# token checks whether one is available.
+
+jobserver_check_interval = 0.05
+
+# How often (in seconds) a CommandLoop checks whether its commands are
+# done, in case a command left behind a process that keeps the pipe it
+# watches open.
+
+command_check_interval = 0.5
+
+
+def command_loop_supported():
+    """Returns whether a CommandLoop can run commands on this platform."""
+    return os.name == 'posix' and hasattr(select, 'select')
+
+
+class _ReadWaiter(object):
+    """Waits for any of a set of file descriptors to become readable
+    (or to have their write ends closed).
+
+    This uses the selectors module, or poll() where that's not
+    available, since select() can't watch descriptors at or above
+    FD_SETSIZE, which a build with many jobs can get to.  select() is
+    only the fallback.
+    """
+
+    def __init__(self):
+        self.fds = set()
+        self.selector = None
+        self.poll = None
+        if selectors is not None:
+            self.selector = selectors.DefaultSelector()
+        elif hasattr(select, 'poll'):
+            self.poll = select.poll()
+
+    def register(self, fd):
+        self.fds.add(fd)
+        if self.selector is not None:
+            self.selector.register(fd, selectors.EVENT_READ)
+        elif self.poll is not None:
+            self.poll.register(fd, select.POLLIN)
+
+    def unregister(self, fd):
+        self.fds.discard(fd)
+        if self.selector is not None:
+            self.selector.unregister(fd)
+        elif self.poll is not None:
+            self.poll.unregister(fd)
+
+    def wait(self, timeout=None):
+        """Returns the set of the descriptors that are readable, waiting
+        at most 'timeout' seconds (or for as long as it takes, if it's
+        None)."""
+        if self.selector is not None:
+            return set([key.fd for key, events in self.selector.select(timeout)])
+        if self.poll is not None:
+            if timeout is not None:
+                timeout = timeout * 1000
+            return set([fd for fd, events in self.poll.poll(timeout)])
+        return set(select.select(list(self.fds), [], [], timeout)[0])
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+
+class Jobserver(object):
+    """A GNU make jobserver.
+
+    A jobserver is a pipe that holds one token (a single byte) for each
+    job that the processes sharing it may run in parallel, beyond the
+    one job that every process may always run.  A process that wants to
+    start another job reads a token from the pipe first, and writes it
+    back when the job is done.  GNU make hands the pipe to the commands
+    it runs through the --jobserver-auth flag in $MAKEFLAGS, and make,
+    ninja and cargo look for that flag when they start.
+
+    We read tokens without blocking from a file descriptor of our own,
+    so that the descriptors our commands share keep their flags.
+    """
+
+    def __init__(self, read_fd, write_fd, makeflags, fds=(), owned=(),
+                 server=False):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        # The -j and --jobserver-auth flags for the $MAKEFLAGS of our
+        # commands, and the file descriptors those flags refer to.
+        self.makeflags = makeflags
+        self.fds = list(fds)
+        self.owned = list(owned)
+        self.server = server
+
+    def acquire(self):
+        """Take a token from the jobserver, if one is available.
+        Returns the token, or None."""
+        try:
+            return os.read(self.read_fd, 1) or None
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return None
+            raise
+
+    def release(self, token):
+        """Give a token back to the jobserver."""
+        os.write(self.write_fd, token)
+
+    def close(self):
+        for fd in self.owned:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.owned = []
+
+
+def is_jobserver_flag(flag):
+    """Returns whether a word of $MAKEFLAGS is one of the flags that
+    describe a jobserver."""
+    return flag.startswith('-j') or flag.startswith('--jobserver-')
+
+def jobserver_client(makeflags):
+    """Returns a Jobserver for the jobserver that the --jobserver-auth
+    (or older --jobserver-fds) flag in 'makeflags' describes, or None
+    if there isn't one we can use.
+
+    The "fifo:PATH" style of make 4.4 works everywhere we have named
+    pipes.  The "R,W" style needs a non-blocking descriptor of our own
+    for the read end, which we can only open through /proc on Linux.
+    make closes the descriptors for commands it doesn't consider to be
+    recursive makes, so we also check that they still refer to pipes.
+    """
+    if os.name != 'posix':
+        return None
+    auth = None
+    flags = []
+    for flag in makeflags.split():
+        if is_jobserver_flag(flag):
+            flags.append(flag)
+        for prefix in ('--jobserver-auth=', '--jobserver-fds='):
+            if flag.startswith(prefix):
+                auth = flag[len(prefix):]
+    if not auth:
+        return None
+    makeflags = ' '.join(flags)
+    try:
+        if auth.startswith('fifo:'):
+            path = auth[len('fifo:'):]
+            read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                write_fd = os.open(path, os.O_WRONLY)
+            except OSError:
+                os.close(read_fd)
+                raise
+            return Jobserver(read_fd, write_fd, makeflags,
+                             owned=[read_fd, write_fd])
+        r, w = [int(fd) for fd in auth.split(',')]
+        for fd in (r, w):
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                return None
+        read_fd = os.open('/proc/self/fd/%d' % r,
+                          os.O_RDONLY | os.O_NONBLOCK)
+    except (OSError, ValueError):
+        return None
+    return Jobserver(read_fd, w, makeflags, fds=[r, w], owned=[read_fd])
+
+def jobserver_server(num):
+    """Returns a new Jobserver for 'num' jobs, or None if we can't make
+    one on this platform.
+
+    The jobserver is a named pipe that we remove right away, so that we
+    can open a non-blocking read end for ourselves and a blocking one
+    for our commands.
+    """
+    if os.name != 'posix' or not hasattr(os, 'mkfifo'):
+        return None
+    fds = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'jobserver')
+        os.mkfifo(path, 0o600)
+        fds.append(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+        fds.append(os.open(path, os.O_WRONLY))
+        fds.append(os.open(path, os.O_RDONLY))
+    except OSError:
+        for fd in fds:
+            os.close(fd)
+        return None
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    read_fd, write_fd, child_read_fd = fds
+    makeflags = '-j%d --jobserver-auth=%d,%d' % (num, child_read_fd, write_fd)
+    jobserver = Jobserver(read_fd, write_fd, makeflags,
+                          fds=[child_read_fd, write_fd], owned=fds,
+                          server=True)
+    for i in range(num - 1):
+        jobserver.release(b'+')
+    return jobserver
+
+def get_jobserver(num, server=False):
+    """Returns the Jobserver a parallel job with 'num' jobs should use:
+    the one of the make that runs us, if there is one, or else a new
+    one if 'server' is true.  Returns None if there's neither."""
+    jobserver = jobserver_client(os.environ.get('MAKEFLAGS', ''))
+    if jobserver is None and server:
+        jobserver = jobserver_server(num)
+    return jobserver
+
 
 class InterruptState(object):
    def __init__(self):
@@ -68,7 +330,9 @@ class Jobs(object):
     methods for starting, stopping, and waiting on all N jobs.
     """
 
-    def __init__(self, num, taskmaster):
+    def __init__(self, num, taskmaster, function_processes=False,
+                 max_load=0, jobserver=False, command_loop=False,
+                 prescan=False, hash_sources=False):
         """
         Create 'num' jobs using the given taskmaster.
 
@@ -76,21 +340,68 @@ class Jobs(object):
         otherwise a parallel job with 'num' worker threads will
         be used.
 
+        If 'function_processes' is true, a parallel job also runs the
+        Python function actions of its tasks in 'num' worker processes,
+        if the platform supports it.
+
+        If 'max_load' is greater than zero, a parallel job doesn't start
+        new tasks while others are running and the system load average
+        is at least 'max_load'.
+
+        A parallel job takes a token from the jobserver of the make that
+        runs SCons, if there is one, for each task beyond the first one.
+        If there isn't one and 'jobserver' is true, it becomes the
+        jobserver for the commands it runs instead.
+
+        If 'command_loop' is true, a parallel job waits for the commands
+        of its tasks in a single thread, if the platform supports it,
+        and only starts worker threads for the other tasks.
+
+        If 'prescan' is true, a parallel job also reads the names of the
+        files that source files include in 'num' worker threads, ahead
+        of their scans.
+
+        If 'hash_sources' is true, a parallel job first computes the
+        content signatures of the source files of the taskmaster's
+        targets in 'num' worker threads.
+
         The 'num_jobs' attribute will be set to the actual number of jobs
         allocated.  If more than one job is requested but the Parallel
         class can't do it, it gets reset to 1.  Wrapping interfaces that
         care should check the value of 'num_jobs' after initialization.
+        The 'function_processes' attribute is likewise set to whether
+        a process pool was actually started, the 'max_load' attribute
+        to the load average limit actually in effect, and the 'jobserver'
+        attribute to the Jobserver in use, if any, the 'command_loop'
+        attribute to whether a CommandLoop was started, the 'prescan'
+        attribute to whether a Prescanner was started, and the
+        'hash_sources' attribute to whether a SourceHasher was started.
         """
 
         self.job = None
+        self.function_processes = False
+        self.max_load = 0
+        self.jobserver = None
+        self.command_loop = False
+        self.prescan = False
+        self.hash_sources = False
         if num > 1:
             stack_size = explicit_stack_size
             if stack_size is None:
                 stack_size = default_stack_size
                 
             try:
-                self.job = Parallel(taskmaster, num, stack_size)
+                self.job = Parallel(taskmaster, num, stack_size,
+                                    function_processes, max_load,
+                                    jobserver, command_loop, prescan,
+                                    hash_sources)
                 self.num_jobs = num
+                self.function_processes = self.job.pp is not None
+                self.max_load = self.job.max_load
+                self.jobserver = self.job.jobserver
+                self.command_loop = self.job.cl is not None
+                self.prescan = self.job.ps is not None
+                self.hash_sources = self.job.sh is not None
             except NameError:
                 pass
         if self.job is None:
@@ -140,6 +451,7 @@ class Jobs(object):
         """
         def handler(signum, stack, self=self, parentpid=os.getpid()):
             if os.getpid() == parentpid:
+                self.job.taskmaster.interrupted = True
                 self.job.taskmaster.stop()
                 self.job.interrupted.set()
             else:
@@ -228,6 +540,38 @@ try:
 except ImportError:
     pass
 else:
+    # The multiprocessing module, once a build with --function-processes
+    # has imported it (see _import_multiprocessing()).
+    multiprocessing = None
+
+    def _import_multiprocessing():
+        """Returns the multiprocessing module, importing it the first
+        time, or None if it isn't available.
+
+        Python function actions can only be handed to worker processes
+        on platforms that can fork them with a copy of our Nodes.
+        """
+        global multiprocessing
+        if multiprocessing is not None or not hasattr(os, 'fork'):
+            return multiprocessing
+        # SCons.compat maps the pickle module to cPickle on Python 2,
+        # but the multiprocessing module there subclasses the pure-Python
+        # Pickler, so load the modules the Pool needs with that one in
+        # place (as a module of its own, not on top of cPickle).
+        save_pickle = sys.modules.get('pickle')
+        try:
+            if sys.version_info[0] == 2:
+                import imp
+                sys.modules.pop('pickle', None)
+                imp.load_module('pickle', *imp.find_module('pickle'))
+            import multiprocessing.pool
+            import multiprocessing.queues
+        except ImportError:
+            multiprocessing = None
+        finally:
+            sys.modules['pickle'] = save_pickle
+        return multiprocessing
+
     class Worker(threading.Thread):
         """A worker thread waits on a task to be posted to its request queue,
         dequeues the task, executes it, and posts a tuple including the task
@@ -263,18 +607,29 @@ else:
                     ok = True
 
                 self.resultsQueue.put((task, ok))
+                self.requestQueue.task_done()
 
     class ThreadPool(object):
         """This class is responsible for spawning and managing worker threads."""
 
-        def __init__(self, num, stack_size, interrupted):
+        def __init__(self, num, stack_size, interrupted, lazy=False):
             """Create the request and reply queues, and 'num' worker threads.
             
             One must specify the stack size of the worker threads. The
             stack size is specified in kilobytes.
+
+            If 'lazy' is true, the worker threads only get started when
+            there are more tasks in the pool than threads, which saves
+            threads when most tasks run elsewhere (see CommandLoop).
             """
             self.requestQueue = queue.Queue(0)
             self.resultsQueue = queue.Queue(0)
+            self.num = num
+            self.stack_size = stack_size
+            self.interrupted = interrupted
+            self.lazy = lazy
+            # A CommandLoop puts tasks in the pool too (see _PostBuild).
+            self.lock = threading.Lock()
 
             try:
                 prev_size = threading.stack_size(stack_size*1024) 
@@ -291,20 +646,43 @@ else:
 
             # Create worker threads
             self.workers = []
-            for _ in range(num):
-                worker = Worker(self.requestQueue, self.resultsQueue, interrupted)
-                self.workers.append(worker)
+            if not lazy:
+                for _ in range(num):
+                    self.start_worker()
 
             if 'prev_size' in locals():
                 threading.stack_size(prev_size)
 
+        def start_worker(self):
+            worker = Worker(self.requestQueue, self.resultsQueue,
+                            self.interrupted)
+            self.workers.append(worker)
+
         def put(self, task):
             """Put task into request queue."""
             self.requestQueue.put(task)
-
-        def get(self):
-            """Remove and return a result tuple from the results queue."""
-            return self.resultsQueue.get()
+            if not self.lazy:
+                return
+            with self.lock:
+                if len(self.workers) < self.num and \
+                   self.requestQueue.unfinished_tasks > len(self.workers):
+                    try:
+                        prev_size = threading.stack_size(self.stack_size*1024)
+                    except (AttributeError, ValueError):
+                        prev_size = None
+                    self.start_worker()
+                    if prev_size is not None:
+                        threading.stack_size(prev_size)
+
+        def get(self, timeout=None):
+            """Remove and return a result tuple from the results queue.
+
+            If a timeout (in seconds) is given and no result arrives
+            before it expires, return None."""
+            try:
+                return self.resultsQueue.get(True, timeout)
+            except queue.Empty:
+                return None
 
         def preparation_failed(self, task):
             self.resultsQueue.put((task, False))
@@ -338,6 +716,679 @@ else:
                 worker.join(1.0)
             self.workers = []
 
+    class CommandLoop(threading.Thread):
+        """This class is responsible for running the command actions of
+        tasks without a thread for each task.
+
+        The loop thread runs each task it is given up to the point where
+        a command has to be spawned, starts the command without waiting
+        for it, and then waits for all of its commands at once.  Each
+        command inherits the write end of a pipe of its own, which gets
+        closed when the command exits, so waiting comes down to waiting
+        for the read ends to become readable (see _ReadWaiter).  Only tasks whose targets are built
+        by nothing but command actions, spawned with the default POSIX
+        spawn function, are accepted; the others are still run by the
+        threads of a ThreadPool.
+        """
+
+        def __init__(self, resultsQueue, interrupted, finish=None):
+            """If 'finish' is given, it gets called with each task whose
+            targets got built, instead of the loop calling the task's
+            post_build() and posting its result itself, so that hashing
+            the targets and pushing them to a CacheDir don't hold up the
+            commands of other tasks (see Parallel)."""
+            threading.Thread.__init__(self)
+            self.setDaemon(1)
+            self.resultsQueue = resultsQueue
+            self.interrupted = interrupted
+            self.finish = finish
+            self.requestQueue = queue.Queue(0)
+            self.wakeup_read, self.wakeup_write = os.pipe()
+            self.waiter = _ReadWaiter()
+            self.waiter.register(self.wakeup_read)
+            # The state of the task of each running command, by the
+            # read end of the pipe we watch for the command.
+            self.running = {}
+            self.start()
+
+        def accepts(self, task):
+            """Returns whether the loop can run the task."""
+            if not SCons.Action.execute_actions:
+                return False
+            try:
+                node = task.targets[0]
+                if not isinstance(node, SCons.Node.FS.File):
+                    return False
+                executor = node.get_executor()
+                if not isinstance(executor, SCons.Executor.Executor) or \
+                   not executor._do_execute:
+                    return False
+                kw = executor.get_kw()
+                if 'chdir' in kw or 'execute' in kw:
+                    return False
+                env = executor.get_build_env()
+                if env.get('SPAWN') is not SCons.Platform.posix.subprocess_spawn:
+                    return False
+                actions = executor.get_action_list()
+            except Exception:
+                return False
+            for action in actions:
+                for act in getattr(action, 'list', [action]):
+                    if type(act) is not SCons.Action.CommandAction:
+                        return False
+                    if act.chdir:
+                        return False
+            return True
+
+        def put(self, task):
+            """Have the loop run the task."""
+            self.requestQueue.put(task)
+            os.write(self.wakeup_write, b'+')
+
+        def cleanup(self):
+            """Stop the loop once its commands are done."""
+            self.put(None)
+            self.join()
+            self.waiter.close()
+            os.close(self.wakeup_read)
+            os.close(self.wakeup_write)
+
+        def run(self):
+            stopping = False
+            while not stopping or self.running:
+                if self.running:
+                    timeout = command_check_interval
+                else:
+                    timeout = None
+                try:
+                    readable = self.waiter.wait(timeout)
+                except (select.error, OSError) as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if self.wakeup_read in readable:
+                    os.read(self.wakeup_read, 512)
+                    while True:
+                        try:
+                            task = self.requestQueue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if task is None:
+                            stopping = True
+                        else:
+                            self.start_task(task)
+                for fd, state in list(self.running.items()):
+                    if fd in readable:
+                        # The command closed the pipe by exiting.
+                        status = state.proc.wait()
+                    else:
+                        status = state.proc.poll()
+                        if status is None:
+                            continue
+                    del self.running[fd]
+                    self.waiter.unregister(fd)
+                    os.close(fd)
+                    self.command_done(state, status)
+
+        def start_task(self, task):
+            state = _CommandState(task)
+            try:
+                if self.interrupted():
+                    raise SCons.Errors.BuildError(
+                        task.targets[0], errstr=interrupt_msg)
+                # Task.execute() takes care of the CacheDir, and calls
+                # build() if the targets have to be built, and then
+                # post_build(), which has to wait for the commands.
+                task.build = lambda: self.next_command(state)
+                task.post_build = state.set_built
+                try:
+                    task.execute()
+                finally:
+                    del task.post_build
+            except:
+                task.exception_set()
+                self.resultsQueue.put((task, False))
+                return
+            if state.proc is None:
+                self.task_done(state)
+
+        def next_command(self, state):
+            """Start the next command of the task, printing the actions
+            as we get to them, like Executor and Action objects do."""
+            while not state.commands:
+                state.action_done()
+                if not state.actions:
+                    return
+                state.next_action()
+            cmd_line, state.ignore = state.commands.pop(0)
+            state.cmd_line = cmd_line
+            sentinel_read, sentinel_write = os.pipe()
+            try:
+                state.proc = SCons.Platform.posix.subprocess_spawn_start(
+                    state.shell, state.escape, cmd_line[0], cmd_line,
+                    state.ENV, keep_fds=[sentinel_write])
+            except:
+                os.close(sentinel_read)
+                raise
+            finally:
+                os.close(sentinel_write)
+            self.running[sentinel_read] = state
+            self.waiter.register(sentinel_read)
+
+        def command_done(self, state, status):
+            task = state.task
+            state.proc = None
+            try:
+                if status and not state.ignore:
+                    state.action_failed(status)
+                self.next_command(state)
+            except:
+                self.task_failed(task)
+                return
+            if state.proc is None:
+                task.execution_time = time.time() - state.start_time
+                self.task_done(state)
+
+        def task_done(self, state):
+            task = state.task
+            if state.built and self.finish is not None:
+                self.finish(task)
+                return
+            try:
+                if state.built:
+                    task.post_build()
+            except:
+                self.task_failed(task)
+                return
+            self.resultsQueue.put((task, True))
+
+        def task_failed(self, task):
+            try:
+                _raise_task_exception(task)
+            except:
+                task.exception_set()
+            self.resultsQueue.put((task, False))
+
+    class _PostBuild(object):
+        """Stands in for a task that a CommandLoop built, so that a
+        Worker of a ThreadPool calls the task's post_build() instead of
+        its execute().  Everything else goes to the task itself."""
+
+        def __init__(self, task):
+            self.task = task
+
+        def execute(self):
+            self.task.post_build()
+
+        def __getattr__(self, name):
+            return getattr(self.task, name)
+
+    class _CommandState(object):
+        """The progress of a task through the command actions that
+        build its targets, in a CommandLoop."""
+
+        def __init__(self, task):
+            self.task = task
+            self.executor = task.targets[0].get_executor()
+            self.env = self.executor.get_build_env()
+            self.kw = self.executor.get_kw()
+            self.actions = []
+            for action in self.executor.get_action_list():
+                self.actions.extend(getattr(action, 'list', [action]))
+            self.action = None
+            self.action_status = None
+            self.commands = []
+            self.proc = None
+            self.built = False
+            self.start_time = time.time()
+
+        def set_built(self):
+            """Stands in for the post_build() method of the task while
+            Task.execute() runs."""
+            self.built = True
+
+        def next_action(self):
+            """Print the next action, and get its commands."""
+            self.action = self.actions.pop(0)
+            self.action_status = None
+            self.action([], [], self.env, execute=0, **self.kw)
+            self.spawn, self.shell, self.escape, self.ENV, self.commands = \
+                self.action.get_commands([], [], self.env, self.executor)
+
+        def exitstatfunc(self):
+            return self.kw.get('exitstatfunc', self.action.exitstatfunc)
+
+        def action_failed(self, status):
+            """Handle a failed command like _ActionAction.__call__() and
+            execute_action_list() do.  Raises a BuildError unless the
+            action's exitstatfunc says otherwise, in which case the rest
+            of the action's commands are skipped."""
+            stat = self.exitstatfunc()(status)
+            if not stat:
+                self.commands = []
+                self.action_status = stat
+                return
+            msg = "Error %s" % status
+            raise SCons.Errors.BuildError(errstr=msg,
+                                          status=stat,
+                                          action=self.action,
+                                          command=self.cmd_line,
+                                          node=self.task.targets[0],
+                                          executor=self.executor)
+
+        def action_done(self):
+            """Check the exit status of an action whose commands are
+            all done."""
+            if self.action is None or self.action_status is not None:
+                return
+            self.action_status = stat = self.exitstatfunc()(0)
+            if stat:
+                raise SCons.Errors.BuildError(errstr="Error %s" % stat,
+                                              node=self.task.targets[0],
+                                              executor=self.executor,
+                                              action=self.action)
+
+    def _raise_task_exception(task):
+        """Raise the exception being handled the way Task.execute()
+        would have raised it."""
+        exc_value = sys.exc_info()[1]
+        if isinstance(exc_value, SystemExit):
+            raise SCons.Errors.ExplicitExit(task.targets[0], exc_value.code)
+        if isinstance(exc_value, (SCons.Errors.UserError,
+                                  SCons.Errors.BuildError)):
+            raise
+        buildError = SCons.Errors.convert_to_BuildError(exc_value)
+        buildError.node = task.targets[0]
+        buildError.exc_info = sys.exc_info()
+        raise buildError
+
+    def _process_init():
+        """
+        Initializes a worker process of a ProcessPool.
+
+        Interrupts are handled by the main SCons process, which stops
+        the build and lets the running actions finish, so the workers
+        ignore them instead of dying in the middle of a task.
+        """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def _process_build(abspath):
+        """
+        Builds the target File Node with the specified absolute path in
+        a worker process of a ProcessPool.
+
+        The worker was forked from the main SCons process after the
+        SConscript files were read, so it has its own copy of the Node
+        and of everything needed to run its actions.  Returns None on
+        success, a tuple of the BuildError attributes we can pass back
+        on failure, or False if the Node is unknown here (because it
+        was created after the fork) and has to be built by the caller.
+        """
+        node = SCons.Node.FS.get_default_fs().Entry(abspath).disambiguate()
+        if not node.has_builder():
+            return False
+        _process_forget(node)
+        try:
+            node.build()
+        except KeyboardInterrupt:
+            raise
+        except:
+            e = SCons.Errors.convert_to_BuildError(sys.exc_info()[1])
+            return (str(e.errstr), e.status, e.exitstatus, e.filename)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        return None
+
+    def _process_forget(node):
+        """
+        Forgets what a worker process of a ProcessPool remembers about
+        the files that building the target Node looks at.  The main SCons
+        process may have built (or removed) them since it forked the
+        worker, which only has the memoized exists()/stat() values and
+        directory listings from back then.
+        """
+        executor = node.get_executor()
+        dirs = set()
+        for n in executor.get_all_targets() + executor.get_all_children():
+            n.clear_memoized_values()
+            dir = getattr(n, 'dir', None)
+            if dir is not None:
+                dirs.add(dir)
+        for dir in dirs:
+            dir.clear_memoized_values()
+            try:
+                del dir.on_disk_entries
+            except AttributeError:
+                pass
+
+    class ProcessPool(object):
+        """This class is responsible for running the builds of targets
+        whose actions are all Python functions in a pool of worker
+        processes.
+
+        The worker processes are forked when the pool is created, which
+        must happen before any of the worker threads are started.  The
+        tasks are still dispatched to worker threads, which block while
+        a worker process builds the target.  Only tasks whose functions
+        can be pickled (that is, top-level functions in modules, or
+        picklable callable objects) are accepted, because those are the
+        functions that don't depend on state that only exists in the
+        main SCons process.
+        """
+
+        def __init__(self, num):
+            """Fork 'num' worker processes.  Raises ImportError if that
+            isn't supported here."""
+            if _import_multiprocessing() is None:
+                raise ImportError("No worker processes on this platform")
+            try:
+                context = multiprocessing.get_context('fork')
+            except AttributeError:
+                # Python 2 always forks on the platforms that can.
+                context = multiprocessing
+            self.pool = context.Pool(num, _process_init)
+            self.picklable = {}
+
+        def is_picklable(self, action):
+            # Actions aren't hashable on Python 3, so key by id() and
+            # keep a reference to the action so the id stays unique.
+            try:
+                return self.picklable[id(action)][1]
+            except KeyError:
+                pass
+            try:
+                pickle.dumps(action.execfunction, PICKLE_PROTOCOL)
+            except Exception:
+                result = False
+            else:
+                result = True
+            self.picklable[id(action)] = (action, result)
+            return result
+
+        def accepts(self, task):
+            """Returns whether the task's targets can be built in a worker
+            process."""
+            node = task.targets[0]
+            if not isinstance(node, SCons.Node.FS.File):
+                return False
+            try:
+                actions = node.get_executor().get_action_list()
+            except Exception:
+                return False
+            if not actions:
+                return False
+            for action in actions:
+                for act in getattr(action, 'list', [action]):
+                    if not isinstance(act, SCons.Action.FunctionAction):
+                        return False
+                    if not self.is_picklable(act):
+                        return False
+            return True
+
+        def prepare(self, task):
+            """Arrange for the task's targets to be built in a worker
+            process, if it's possible."""
+            if self.accepts(task):
+                task.build = lambda: self.build(task.targets[0])
+
+        def build(self, node):
+            """Build the node in a worker process, waiting for it to
+            finish.  This is called from the worker threads."""
+            result = self.pool.apply(_process_build, (node.get_abspath(),))
+            if result is False:
+                node.build()
+            elif result is not None:
+                errstr, status, exitstatus, filename = result
+                raise SCons.Errors.BuildError(node=node, errstr=errstr,
+                                              status=status,
+                                              exitstatus=exitstatus,
+                                              filename=filename)
+
+        def cleanup(self):
+            """Shut down the worker processes."""
+            self.pool.close()
+            self.pool.join()
+
+    class Prescanner(object):
+        """This class is responsible for reading the names of the files
+        that source files include in worker threads, ahead of the
+        Taskmaster, so that their scans (see SCons.Scanner.Classic) find
+        them ready.
+
+        The Taskmaster calls prescan() with the Nodes it's about to
+        evaluate, which are usually many more than the ones being built.
+        Only reading and searching the source files happens in the worker
+        threads: looking the included files up can create Nodes, which
+        isn't thread safe, so that's still left to the scans.
+
+        The most recently queued sources get read first, because the
+        Taskmaster evaluates the most recently found Nodes first.
+        """
+
+        def __init__(self, num, stack_size):
+            self.queue = queue.LifoQueue(0)
+            self.seen = set()
+
+            try:
+                prev_size = threading.stack_size(stack_size*1024)
+            except (AttributeError, ValueError):
+                # ThreadPool already warned about it.
+                prev_size = None
+
+            self.workers = []
+            for _ in range(num):
+                worker = threading.Thread(target=self.run)
+                worker.setDaemon(1)
+                worker.start()
+                self.workers.append(worker)
+
+            if prev_size is not None:
+                threading.stack_size(prev_size)
+
+        def run(self):
+            while True:
+                item = self.queue.get()
+                try:
+                    if item is None:
+                        # The "None" value is used as a sentinel by
+                        # cleanup().
+                        break
+                    node, path, scanner = item
+                    try:
+                        scanner.prescan(node, path)
+                    except Exception:
+                        # The scan will run into it again, and report it.
+                        pass
+                finally:
+                    self.queue.task_done()
+
+        def prescan(self, nodes):
+            """Queue the sources of the given target Nodes for reading."""
+            if SCons.Node.implicit_cache and \
+               not SCons.Node.implicit_deps_changed:
+                # The targets will mostly use their cached implicit
+                # dependencies instead of scanning their sources.
+                return
+            for node in nodes:
+                if not node.has_builder() or node.implicit is not None:
+                    continue
+                executor = node.get_executor()
+                try:
+                    env = executor.get_build_env()
+                    kw = executor.get_kw()
+                    initial_scanner = node.builder.source_scanner
+                    for source in executor.get_all_sources():
+                        if source in self.seen:
+                            continue
+                        self.seen.add(source)
+                        self.queue_source(source, env, initial_scanner, kw)
+                except Exception:
+                    # Leave any errors to the Taskmaster.
+                    pass
+
+        def queue_source(self, source, env, initial_scanner, kw):
+            source = source.disambiguate()
+            if not isinstance(source, SCons.Node.FS.File) or \
+               source.has_builder():
+                return
+            scanner = source._get_scanner(env, initial_scanner, None, kw)
+            if not isinstance(scanner, SCons.Scanner.Classic):
+                return
+            # Finding the file (in a Repository, or duplicated into a
+            # VariantDir) and whether it exists isn't thread safe, so
+            # the workers only get the path to read.
+            source = source.rfile()
+            if source.includes is None and source.exists():
+                self.queue.put((source, source.get_abspath(), scanner))
+
+        def cleanup(self):
+            """Shut down the worker threads, dropping the sources that
+            haven't been read yet."""
+            # The queue is last in, first out, so the workers get the
+            # sentinels before any sources that are left.
+            for _ in self.workers:
+                self.queue.put(None)
+            for worker in self.workers:
+                worker.join(1.0)
+            self.workers = []
+
+    class SourceHasher(object):
+        """This class is responsible for computing the content signatures
+        of the source files that the targets of a build depend on in
+        worker threads, before the Taskmaster starts evaluating them,
+        instead of one at a time when the Taskmaster gets to them.
+
+        Only reading and hashing the files happens in the worker threads.
+        Walking the Nodes and their stored signatures, which can create
+        Nodes and read .sconsign files, and setting the new signatures
+        happens in the calling thread.  Files whose stored or cached
+        signatures get_csig() would use (see File.get_max_drift_csig()
+        and File.get_cached_csig()) are left alone, as are the sources
+        of targets whose build Environment doesn't decide whether they
+        changed by their content (see get_source_decider()), and, with
+        Decider('MD5-timestamp'), the ones whose timestamps didn't change.
+        """
+
+        def __init__(self, num, stack_size, interrupted):
+            self.requestQueue = queue.Queue(0)
+            self.resultsQueue = queue.Queue(0)
+            self.interrupted = interrupted
+
+            try:
+                prev_size = threading.stack_size(stack_size*1024)
+            except (AttributeError, ValueError):
+                # ThreadPool already warned about it.
+                prev_size = None
+
+            self.workers = []
+            for _ in range(num):
+                worker = threading.Thread(target=self.run)
+                worker.setDaemon(1)
+                worker.start()
+                self.workers.append(worker)
+
+            if prev_size is not None:
+                threading.stack_size(prev_size)
+
+        def run(self):
+            chunksize = SCons.Node.FS.File.md5_chunksize*1024
+            while True:
+                item = self.requestQueue.get()
+                if item is None:
+                    # The "None" value is used as a sentinel by
+                    # cleanup().
+                    break
+                node, path = item
+                csig = None
+                if not self.interrupted():
+                    try:
+                        csig = SCons.Util.MD5filesignature(path, chunksize)
+                    except EnvironmentError:
+                        # get_csig() will run into it again, and decide.
+                        pass
+                self.resultsQueue.put((node, csig))
+
+        def sources(self, targets):
+            """Walk the Nodes that the given targets depend on, and return
+            the source files whose content signatures are needed.
+
+            Directories get scanned for their entries, as the Taskmaster
+            would, but nothing else does: the implicit dependencies of
+            the other Nodes are left to the Taskmaster."""
+            sources = []
+            seen = set()
+            stack = list(targets)
+            while stack:
+                node = stack.pop()
+                is_dir = isinstance(node, SCons.Node.FS.Dir)
+                try:
+                    # Directories are up to date by the state of their
+                    # entries, not by their signatures.
+                    decider = None
+                    if not is_dir and node.has_builder():
+                        decider = node.get_build_env().get_source_decider()
+                    children = node.children(scan=is_dir)
+                except Exception:
+                    # Leave any errors to the Taskmaster.
+                    continue
+                for child in children:
+                    if child in seen:
+                        continue
+                    try:
+                        if isinstance(child, SCons.Node.FS.Base) and \
+                           not child.has_builder():
+                            child = child.disambiguate()
+                        if child.has_builder() or \
+                           not isinstance(child, SCons.Node.FS.File):
+                            seen.add(child)
+                            stack.append(child)
+                            continue
+                        if decider not in ('MD5', 'MD5-timestamp'):
+                            # Another target may still need it.
+                            continue
+                        seen.add(child)
+                        if decider == 'MD5-timestamp' and \
+                           not child.changed_timestamp_match(
+                               None, child.get_stored_info().ninfo):
+                            # Its content only gets looked at if its
+                            # timestamp changed.
+                            continue
+                        if hasattr(child.get_ninfo(), 'csig') or \
+                           not child.rexists() or \
+                           child.get_max_drift_csig() is not None or \
+                           child.get_cached_csig() is not None:
+                            continue
+                    except Exception:
+                        continue
+                    sources.append(child)
+            return sources
+
+        def hash_sources(self, targets):
+            """Compute the content signatures of the source files that
+            the given targets depend on.  Returns the number of
+            signatures computed."""
+            count = 0
+            for node in self.sources(targets):
+                self.requestQueue.put((node, node.rfile().get_abspath()))
+                count = count + 1
+            computed = 0
+            for _ in range(count):
+                node, csig = self.resultsQueue.get()
+                if csig is not None:
+                    node.get_ninfo().csig = csig
+                    node.cache_csig(csig)
+                    computed = computed + 1
+            return computed
+
+        def cleanup(self):
+            """Shut down the worker threads."""
+            for _ in self.workers:
+                self.requestQueue.put(None)
+            for worker in self.workers:
+                worker.join(1.0)
+            self.workers = []
+
     class Parallel(object):
         """This class is used to execute tasks in parallel, and is somewhat 
         less efficient than Serial, but is appropriate for parallel builds.
@@ -345,7 +1396,10 @@ else:
         This class is thread safe.
         """
 
-        def __init__(self, taskmaster, num, stack_size):
+        def __init__(self, taskmaster, num, stack_size,
+                     function_processes=False, max_load=0,
+                     jobserver=False, command_loop=False, prescan=False,
+                     hash_sources=False):
             """Create a new parallel job given a taskmaster.
 
             The taskmaster's next_task() method should return the next
@@ -358,13 +1412,92 @@ else:
             Note: calls to taskmaster are serialized, but calls to
             execute() on distinct tasks are not serialized, because
             that is the whole point of parallel jobs: they can execute
-            multiple tasks simultaneously. """
+            multiple tasks simultaneously.
+
+            If function_processes is true, tasks whose actions are all
+            Python functions get built in a ProcessPool, if the platform
+            supports it.  The pool has to be created before the worker
+            threads, so that it doesn't fork them.
+
+            If max_load is greater than zero, no new tasks are started
+            while other tasks are running and the system load average
+            is at least max_load, like make's -l option.  It's ignored
+            if the platform can't report the load average.
+
+            If the make that runs us is a jobserver, a task beyond the
+            first is only started once we got a token for it.  If it
+            isn't and jobserver is true, we become the jobserver for
+            the commands we run, and take our own tokens the same way.
+            Either way, the jobserver is passed on to the commands
+            through $MAKEFLAGS in their ENV.
+
+            If command_loop is true, tasks that only run commands are
+            run by a CommandLoop, if the platform supports it, and the
+            worker threads only get started when they are needed.
+
+            If prescan is true, a Prescanner reads the sources of the
+            Nodes the taskmaster is about to evaluate while it's
+            running.
+
+            If hash_sources is true, a SourceHasher computes the content
+            signatures of the source files of the taskmaster's targets
+            before it starts. """
 
             self.taskmaster = taskmaster
             self.interrupted = InterruptState()
-            self.tp = ThreadPool(num, stack_size, self.interrupted)
+            self.pp = None
+            if function_processes:
+                try:
+                    self.pp = ProcessPool(num)
+                except (ImportError, OSError, ValueError):
+                    pass
+            self.tp = ThreadPool(num, stack_size, self.interrupted,
+                                 lazy=command_loop and command_loop_supported())
+            self.cl = None
+            if self.tp.lazy:
+                self.cl = CommandLoop(self.tp.resultsQueue, self.interrupted,
+                                      lambda task: self.tp.put(_PostBuild(task)))
+            self.ps = None
+            if prescan:
+                self.ps = Prescanner(num, stack_size)
+            self.sh = None
+            if hash_sources:
+                self.sh = SourceHasher(num, stack_size, self.interrupted)
 
             self.maxjobs = num
+            if max_load > 0 and get_load_average() is not None:
+                self.max_load = max_load
+            else:
+                self.max_load = 0
+            self.jobserver = get_jobserver(num, jobserver)
+            self.tokens = []
+
+        def load_too_high(self):
+            """Returns whether the system is too loaded to start another
+            task."""
+            if not self.max_load:
+                return False
+            load = get_load_average()
+            return load is not None and load >= self.max_load
+
+        def can_start(self, jobs):
+            """Returns whether we may start another task while 'jobs'
+            tasks are running, taking a jobserver token for it if we
+            need one."""
+            if self.load_too_high():
+                return False
+            if self.jobserver is not None and len(self.tokens) < jobs:
+                token = self.jobserver.acquire()
+                if token is None:
+                    return False
+                self.tokens.append(token)
+            return True
+
+        def release_tokens(self, jobs):
+            """Give back the jobserver tokens we don't need while 'jobs'
+            tasks are running."""
+            while len(self.tokens) > max(jobs - 1, 0):
+                self.jobserver.release(self.tokens.pop())
 
         def start(self):
             """Start the job. This will begin pulling tasks from the
@@ -373,11 +1506,34 @@ else:
             an exception), then the job will stop."""
 
             jobs = 0
-            
+
+            if self.jobserver is not None:
+                SCons.Action.jobserver_makeflags = self.jobserver.makeflags
+                SCons.Platform.posix.inherited_fds = self.jobserver.fds
+                poll_interval = min(load_check_interval,
+                                    jobserver_check_interval)
+            else:
+                poll_interval = load_check_interval
+
+            if self.sh is not None:
+                self.sh.hash_sources(self.taskmaster.original_top)
+                self.sh.cleanup()
+                self.sh = None
+
+            if self.ps is not None:
+                self.taskmaster.prescanner = self.ps
+
             while True:
                 # Start up as many available tasks as we're
-                # allowed to.
+                # allowed to.  We always start at least one, even if
+                # the system is too loaded or the jobserver has no
+                # tokens, so that the build can proceed.
+                throttled = False
                 while jobs < self.maxjobs:
+                    if jobs and not self.can_start(jobs):
+                        throttled = True
+                        break
+
                     task = self.taskmaster.next_task()
                     if task is None:
                         break
@@ -391,8 +1547,13 @@ else:
                         task.postprocess()
                     else:
                         if task.needs_execute():
+                            if self.pp is not None:
+                                self.pp.prepare(task)
                             # dispatch task
-                            self.tp.put(task)
+                            if self.cl is not None and self.cl.accepts(task):
+                                self.cl.put(task)
+                            else:
+                                self.tp.put(task)
                             jobs = jobs + 1
                         else:
                             task.executed()
@@ -403,8 +1564,21 @@ else:
                 # Let any/all completed tasks finish up before we go
                 # back and put the next batch of tasks on the queue.
                 while True:
-                    task, ok = self.tp.get()
+                    if throttled:
+                        # Don't wait for a running task to finish if
+                        # the load drops or a token becomes available
+                        # in the meantime.
+                        result = self.tp.get(poll_interval)
+                        if result is None:
+                            if not self.can_start(jobs):
+                                continue
+                            break
+                        task, ok = result
+                    else:
+                        task, ok = self.tp.get()
                     jobs = jobs - 1
+                    if self.jobserver is not None:
+                        self.release_tokens(jobs)
 
                     if ok:
                         task.executed()
@@ -426,6 +1600,18 @@ else:
                         break
 
             self.tp.cleanup()
+            if self.cl is not None:
+                self.cl.cleanup()
+            if self.ps is not None:
+                self.taskmaster.prescanner = None
+                self.ps.cleanup()
+            if self.pp is not None:
+                self.pp.cleanup()
+            if self.jobserver is not None:
+                self.release_tokens(0)
+                self.jobserver.close()
+                SCons.Action.jobserver_makeflags = None
+                SCons.Platform.posix.inherited_fds = []
             self.taskmaster.cleanup()
 
 # Local Variables:
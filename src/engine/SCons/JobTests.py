@@ -25,6 +25,7 @@ __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 import unittest
 import random
 import math
+import os
 import sys
 import time
 
@@ -305,7 +306,9 @@ class SerialTestCase(unittest.TestCase):
 class NoParallelTestCase(unittest.TestCase):
     def runTest(self):
         "test handling lack of parallel support"
-        def NoParallel(tm, num, stack_size):
+        def NoParallel(tm, num, stack_size, function_processes=False,
+                       max_load=0, jobserver=False, command_loop=False,
+                       prescan=False, hash_sources=False):
             raise NameError
         save_Parallel = SCons.Job.Parallel
         SCons.Job.Parallel = NoParallel
@@ -328,6 +331,205 @@ class NoParallelTestCase(unittest.TestCase):
         finally:
             SCons.Job.Parallel = save_Parallel
 
+class LoadAverageTestCase(unittest.TestCase):
+    def runTest(self):
+        "test not starting parallel jobs while the load is too high"
+
+        try:
+            import threading
+        except:
+            raise NoThreadsException()
+
+        loads = []
+        running = []
+        max_running = []
+
+        class SleepTask(Task):
+            def _do_something(self):
+                self.taskmaster.guard.acquire()
+                running.append(self.i)
+                max_running[0] = max(max_running[0], len(running))
+                self.taskmaster.guard.release()
+                if self.i == 1 and len(loads) > 1:
+                    # Let the load drop while the first task runs.
+                    time.sleep(0.05)
+                    del loads[0]
+                time.sleep(0.2)
+                self.taskmaster.guard.acquire()
+                running.remove(self.i)
+                self.taskmaster.guard.release()
+
+        def get_load_average():
+            return loads[0]
+
+        def run(load_list):
+            loads[:] = load_list
+            max_running[:] = [0]
+            taskmaster = Taskmaster(4, self, SleepTask)
+            jobs = SCons.Job.Jobs(4, taskmaster, max_load=2)
+            jobs.run()
+            self.failUnless(taskmaster.all_tasks_are_postprocessed(),
+                            "all the tests were not postprocessed")
+            return max_running[0]
+
+        save_get_load_average = SCons.Job.get_load_average
+        save_load_check_interval = SCons.Job.load_check_interval
+        SCons.Job.get_load_average = get_load_average
+        SCons.Job.load_check_interval = 0.01
+        try:
+            # The load is below the limit, so nothing is held back.
+            n = run([1.0])
+            assert n > 1, n
+
+            # The load stays above the limit, so only one task at a
+            # time gets started.
+            n = run([3.0])
+            assert n == 1, n
+
+            # The load drops while the first task is running, so the
+            # rest get started without waiting for it to finish.
+            n = run([3.0, 1.0])
+            assert n > 1, n
+
+            # The limit is ignored if the load average isn't available.
+            loads[:] = [None]
+            taskmaster = Taskmaster(4, self, SleepTask)
+            jobs = SCons.Job.Jobs(4, taskmaster, max_load=2)
+            assert jobs.max_load == 0, jobs.max_load
+            jobs = SCons.Job.Jobs(4, taskmaster)
+            assert jobs.max_load == 0, jobs.max_load
+        finally:
+            SCons.Job.get_load_average = save_get_load_average
+            SCons.Job.load_check_interval = save_load_check_interval
+
+
+class JobserverTestCase(unittest.TestCase):
+    def runTest(self):
+        "test sharing job slots through a make jobserver"
+
+        if os.name != 'posix':
+            return
+
+        # A jobserver we serve has a token for every job but one.
+        js = SCons.Job.jobserver_server(3)
+        try:
+            assert js.server
+            r, w = js.fds
+            assert js.makeflags == '-j3 --jobserver-auth=%d,%d' % (r, w), \
+                   js.makeflags
+            assert js.acquire() == b'+'
+            assert js.acquire() == b'+'
+            assert js.acquire() is None
+            js.release(b'+')
+            assert js.acquire() == b'+'
+            # Our commands read from a descriptor of their own.
+            js.release(b'+')
+            assert os.read(r, 1) == b'+'
+        finally:
+            js.close()
+
+        # The jobserver of a make that runs us, through inherited
+        # descriptors.
+        r, w = os.pipe()
+        try:
+            os.write(w, b'+')
+            makeflags = 'ks -j2 --jobserver-auth=%d,%d -- X=1' % (r, w)
+            js = SCons.Job.jobserver_client(makeflags)
+            assert js is not None
+            assert not js.server
+            assert js.makeflags == '-j2 --jobserver-auth=%d,%d' % (r, w), \
+                   js.makeflags
+            assert js.fds == [r, w], js.fds
+            assert js.acquire() == b'+'
+            assert js.acquire() is None
+            js.release(b'+')
+            js.close()
+            assert os.read(r, 1) == b'+'
+
+            # make closes the descriptors for commands it doesn't
+            # consider recursive.
+            os.close(w)
+            js = SCons.Job.jobserver_client('-j2 --jobserver-fds=%d,%d'
+                                            % (r, w))
+            assert js is None, js
+        finally:
+            os.close(r)
+
+        assert SCons.Job.jobserver_client('') is None
+        assert SCons.Job.jobserver_client('-j4') is None
+
+        # The jobserver of make 4.4 and later, through a named pipe.
+        test = TestCmd.TestCmd(workdir = '')
+        fifo = test.workpath('fifo')
+        os.mkfifo(fifo)
+        r = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        w = os.open(fifo, os.O_WRONLY)
+        try:
+            os.write(w, b'+')
+            js = SCons.Job.jobserver_client('-j2 --jobserver-auth=fifo:'
+                                            + fifo)
+            assert js is not None
+            assert js.fds == [], js.fds
+            assert js.acquire() == b'+'
+            assert js.acquire() is None
+            js.release(b'+')
+            js.close()
+            assert os.read(r, 1) == b'+'
+        finally:
+            os.close(r)
+            os.close(w)
+
+        # A parallel job only runs as many tasks at once as it gets
+        # tokens for, and gives them all back.
+        running = []
+        max_running = [0]
+
+        class SleepTask(Task):
+            def _do_something(self):
+                self.taskmaster.guard.acquire()
+                running.append(self.i)
+                max_running[0] = max(max_running[0], len(running))
+                self.taskmaster.guard.release()
+                time.sleep(0.1)
+                self.taskmaster.guard.acquire()
+                running.remove(self.i)
+                self.taskmaster.guard.release()
+
+        r, w = os.pipe()
+        save_MAKEFLAGS = os.environ.get('MAKEFLAGS')
+        os.environ['MAKEFLAGS'] = '-j2 --jobserver-auth=%d,%d' % (r, w)
+        try:
+            os.write(w, b'+')
+            taskmaster = Taskmaster(6, self, SleepTask)
+            jobs = SCons.Job.Jobs(4, taskmaster)
+            assert jobs.jobserver is not None
+            assert not jobs.jobserver.server
+            jobs.run()
+            self.failUnless(taskmaster.all_tasks_are_postprocessed(),
+                            "all the tests were not postprocessed")
+            assert max_running[0] == 2, max_running[0]
+            assert os.read(r, 1) == b'+'
+            os.close(r)
+            os.close(w)
+
+            # Without a make that runs us, we only serve a jobserver
+            # if asked to.
+            del os.environ['MAKEFLAGS']
+            taskmaster = Taskmaster(6, self, SleepTask)
+            jobs = SCons.Job.Jobs(4, taskmaster)
+            assert jobs.jobserver is None, jobs.jobserver
+            max_running[0] = 0
+            taskmaster = Taskmaster(6, self, SleepTask)
+            jobs = SCons.Job.Jobs(4, taskmaster, jobserver=True)
+            assert jobs.jobserver.server
+            jobs.run()
+            assert max_running[0] > 1, max_running[0]
+        finally:
+            if save_MAKEFLAGS is None:
+                os.environ.pop('MAKEFLAGS', None)
+            else:
+                os.environ['MAKEFLAGS'] = save_MAKEFLAGS
+
 
 class SerialExceptionTestCase(unittest.TestCase):
     def runTest(self):
@@ -371,6 +573,15 @@ import SCons.Taskmaster
 import SCons.Node
 import time
 
+import TestCmd
+
+import SCons.Action
+import SCons.Builder
+import SCons.Environment
+import SCons.Errors
+import SCons.Node.FS
+import SCons.Scanner
+
 class DummyNodeInfo(object):
     def update(self, obj):
         pass
@@ -511,6 +722,419 @@ class ParallelTaskTest(_SConsTaskTest):
 
 
 
+def write_pid(target, source, env):
+    """A picklable function action that records the building process."""
+    with open(str(target[0]), 'w') as f:
+        f.write(str(os.getpid()))
+
+def fail_action(target, source, env):
+    return 7
+
+def exists_action(target, source, env):
+    """A picklable function action that records if its source exists."""
+    with open(str(target[0]), 'w') as f:
+        f.write(str(bool(source[0].exists())))
+
+class ProcessPoolTestCase(unittest.TestCase):
+    def runTest(self):
+        "test building function actions in worker processes"
+        if SCons.Job._import_multiprocessing() is None:
+            return
+
+        test = TestCmd.TestCmd(workdir = '')
+        fs = SCons.Node.FS.get_default_fs()
+        env = SCons.Environment.Base(tools=[])
+        env.Append(BUILDERS = {
+            'Pid' : SCons.Builder.Builder(action=SCons.Action.Action(write_pid, None)),
+            'Fail' : SCons.Builder.Builder(action=SCons.Action.Action(fail_action, None)),
+            'Lambda' : SCons.Builder.Builder(action=lambda target, source, env: 0),
+            'Command' : SCons.Builder.Builder(action='touch $TARGET'),
+            'Exists' : SCons.Builder.Builder(action=SCons.Action.Action(exists_action, None)),
+        })
+        pid_node = env.Pid(test.workpath('pid.out'), [])[0]
+        fail_node = env.Fail(test.workpath('fail.out'), [])[0]
+        lambda_node = env.Lambda(test.workpath('lambda.out'), [])[0]
+        command_node = env.Command(test.workpath('command.out'), [])[0]
+        exists_node = env.Exists(test.workpath('exists.out'),
+                                 test.workpath('exists.in'))[0]
+        # The workers get forked with what we know about the source now.
+        assert not exists_node.sources[0].exists()
+
+        class DummyTask(object):
+            def __init__(self, node):
+                self.targets = [node]
+
+        pp = SCons.Job.ProcessPool(2)
+        try:
+            assert pp.accepts(DummyTask(pid_node))
+            assert pp.accepts(DummyTask(fail_node))
+            assert not pp.accepts(DummyTask(lambda_node))
+            assert not pp.accepts(DummyTask(command_node))
+            assert not pp.accepts(DummyTask(fs.Dir(test.workpath('dir'))))
+
+            task = DummyTask(pid_node)
+            pp.prepare(task)
+            task.build()
+            pid = int(test.read('pid.out', mode='r'))
+            assert pid != os.getpid(), pid
+
+            task = DummyTask(fail_node)
+            pp.prepare(task)
+            try:
+                task.build()
+            except SCons.Errors.BuildError as e:
+                assert e.node is fail_node, e.node
+                assert e.status == 7, e.status
+            else:
+                self.fail("did not catch expected BuildError")
+
+            # A worker doesn't go by what it knew about the files when
+            # it was forked.
+            test.write('exists.in', 'exists.in\n')
+            exists_node.sources[0].clear_memoized_values()
+            task = DummyTask(exists_node)
+            pp.prepare(task)
+            task.build()
+            assert test.read('exists.out', mode='r') == 'True'
+
+            # Tasks the pool doesn't accept keep their own build().
+            task = DummyTask(lambda_node)
+            pp.prepare(task)
+            assert not hasattr(task, 'build')
+        finally:
+            pp.cleanup()
+
+
+class ReadWaiterTestCase(unittest.TestCase):
+    def runTest(self):
+        "test waiting for file descriptors to become readable"
+        if not SCons.Job.command_loop_supported():
+            return
+
+        waiter = SCons.Job._ReadWaiter()
+        r1, w1 = os.pipe()
+        r2, w2 = os.pipe()
+        fds = [r1, w1, r2, w2]
+        try:
+            waiter.register(r1)
+            waiter.register(r2)
+            assert waiter.wait(0) == set(), waiter.wait(0)
+            os.write(w1, b'x')
+            assert waiter.wait(1.0) == set([r1])
+            # Closing the write end makes it readable, too.
+            os.close(w2)
+            fds.remove(w2)
+            assert waiter.wait(1.0) == set([r1, r2])
+            waiter.unregister(r1)
+            assert waiter.wait(1.0) == set([r2])
+            waiter.unregister(r2)
+
+            # Descriptors past what select() can handle work, too,
+            # unless select() is all there is.
+            if waiter.selector is None and waiter.poll is None:
+                return
+            try:
+                import resource
+                soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            except (ImportError, AttributeError, ValueError):
+                return
+            high = 1100
+            if soft != resource.RLIM_INFINITY and soft <= high:
+                return
+            os.dup2(r1, high)
+            fds.append(high)
+            waiter.register(high)
+            assert waiter.wait(1.0) == set([high])
+            waiter.unregister(high)
+        finally:
+            waiter.close()
+            for fd in fds:
+                os.close(fd)
+
+
+class CommandLoopTestCase(unittest.TestCase):
+    def runTest(self):
+        "test waiting for the commands of tasks in one thread"
+        if not SCons.Job.command_loop_supported():
+            return
+
+        test = TestCmd.TestCmd(workdir = '')
+        fs = SCons.Node.FS.get_default_fs()
+        env = SCons.Environment.Base(tools=[])
+        def Command(name, action):
+            builder = SCons.Builder.Builder(action=action)
+            return builder(env, test.workpath(name), [])[0]
+        touch_node = Command('touch.out', 'touch $TARGET')
+        list_node = Command('list.out', ['echo 1 > $TARGET',
+                                         '-exit 2',
+                                         'echo 2 >> $TARGET'])
+        fail_node = Command('fail.out', ['exit 3', 'touch $TARGET'])
+        sleep_nodes = [Command('sleep%d.out' % i, 'sleep 1 && touch $TARGET')
+                       for i in range(4)]
+        lambda_node = Command('lambda.out', lambda target, source, env: 0)
+        chdir_node = Command('chdir.out', SCons.Action.Action('touch $TARGET',
+                                                              chdir=1))
+
+        class CommandTask(object):
+            def __init__(self, node):
+                self.targets = [node]
+                self.exc_info = None
+                self.post_built = None
+            def execute(self):
+                self.build()
+                self.post_build()
+            def post_build(self):
+                # Only gets called once the commands are done.
+                self.post_built = os.path.exists(str(self.targets[0]))
+            def exception_set(self):
+                self.exc_info = sys.exc_info()
+
+        resultsQueue = SCons.Job.queue.Queue(0)
+        cl = SCons.Job.CommandLoop(resultsQueue, SCons.Job.InterruptState())
+        save_print_actions = SCons.Action.print_actions
+        SCons.Action.print_actions = 0
+        try:
+            assert cl.accepts(CommandTask(touch_node))
+            assert cl.accepts(CommandTask(list_node))
+            assert not cl.accepts(CommandTask(lambda_node))
+            assert not cl.accepts(CommandTask(chdir_node))
+            assert not cl.accepts(CommandTask(fs.Dir(test.workpath('dir'))))
+
+            def run(nodes):
+                tasks = [CommandTask(n) for n in nodes]
+                for task in tasks:
+                    cl.put(task)
+                results = {}
+                for _ in tasks:
+                    task, ok = resultsQueue.get(True, 10)
+                    results[task.targets[0]] = (task, ok)
+                return results
+
+            results = run([touch_node, list_node, fail_node])
+            assert results[touch_node][1], results[touch_node]
+            assert results[touch_node][0].post_built
+            assert os.path.exists(test.workpath('touch.out'))
+
+            # Ignored errors don't stop the rest of the commands.
+            assert results[list_node][1], results[list_node]
+            assert test.read('list.out', mode='r').split() == ['1', '2']
+
+            task, ok = results[fail_node]
+            assert not ok
+            e = task.exc_info[1]
+            assert isinstance(e, SCons.Errors.BuildError), e
+            assert e.status == 3, e.status
+            assert e.node is fail_node, e.node
+            assert not os.path.exists(test.workpath('fail.out'))
+            assert task.post_built is None, task.post_built
+
+            # The commands of different tasks run at the same time.
+            start = time.time()
+            results = run(sleep_nodes)
+            assert time.time() - start < 3, time.time() - start
+            for node in sleep_nodes:
+                assert results[node][1], results[node]
+
+            # With a finish function, that gets the built tasks
+            # instead of the loop calling their post_build().
+            finished = SCons.Job.queue.Queue(0)
+            fcl = SCons.Job.CommandLoop(resultsQueue,
+                                        SCons.Job.InterruptState(),
+                                        finish=finished.put)
+            try:
+                task = CommandTask(touch_node)
+                fcl.put(task)
+                assert finished.get(True, 10) is task
+                assert task.post_built is None, task.post_built
+                assert resultsQueue.empty()
+
+                # Failed tasks still go straight to the results.
+                task = CommandTask(fail_node)
+                fcl.put(task)
+                assert resultsQueue.get(True, 10) == (task, False)
+                assert finished.empty()
+            finally:
+                fcl.cleanup()
+        finally:
+            SCons.Action.print_actions = save_print_actions
+            cl.cleanup()
+
+        # Worker threads only get started for the tasks the loop
+        # doesn't run.
+        taskmaster = Taskmaster(num_tasks, self, RandomTask)
+        jobs = SCons.Job.Jobs(num_jobs, taskmaster, command_loop=True)
+        assert jobs.command_loop
+        assert jobs.job.tp.workers == [], jobs.job.tp.workers
+        tp = jobs.job.tp
+        started = []
+        def start_worker(start_worker=tp.start_worker):
+            started.append(1)
+            start_worker()
+        tp.start_worker = start_worker
+        jobs.run()
+        self.failUnless(taskmaster.all_tasks_are_executed(),
+                        "all the tests were not executed")
+        self.failUnless(taskmaster.all_tasks_are_postprocessed(),
+                        "all the tests were not postprocessed")
+        self.failIf(taskmaster.num_failed,
+                    "some task(s) failed to execute")
+        assert 0 < len(started) <= num_jobs, started
+
+class PrescannerTestCase(unittest.TestCase):
+    def runTest(self):
+        "test reading the includes of sources in worker threads"
+        try:
+            SCons.Job.Prescanner
+        except AttributeError:
+            return
+
+        test = TestCmd.TestCmd(workdir = '')
+        test.write('a.c', '#include "a.h"\n#include "b.h"\n')
+        test.write('b.c', 'int b;\n')
+        test.write('c.c', '#include "c.h"\n')
+        fs = SCons.Node.FS.get_default_fs()
+        env = SCons.Environment.Base(tools=[])
+        scanner = SCons.Scanner.Classic('Test', ['.c'], 'CPPPATH',
+                                        '^#include "([^"]*)"')
+        builder = SCons.Builder.Builder(action='touch $TARGET',
+                                        source_scanner=scanner)
+        def Build(target, sources):
+            return builder(env, test.workpath(target),
+                           [test.workpath(s) for s in sources])[0]
+        a_o = Build('a.o', ['a.c', 'b.c'])
+        c_o = Build('c.o', ['c.c'])
+        c_o.implicit = []
+        prog = SCons.Builder.Builder(action='touch $TARGET')(
+            env, test.workpath('prog'), [a_o])[0]
+        a_c = fs.File(test.workpath('a.c'))
+        b_c = fs.File(test.workpath('b.c'))
+        c_c = fs.File(test.workpath('c.c'))
+
+        ps = SCons.Job.Prescanner(2, SCons.Job.default_stack_size)
+        try:
+            ps.prescan([a_o, c_o, prog])
+            ps.queue.join()
+            assert a_c.includes == ['a.h', 'b.h'], a_c.includes
+            assert b_c.includes == [], b_c.includes
+            # Already scanned targets are skipped, and so are derived
+            # sources.
+            assert c_c.includes is None, c_c.includes
+            assert ps.seen == set([a_c, b_c, a_o]), ps.seen
+            assert a_o.includes is None, a_o.includes
+
+            # Sources only get read once.
+            a_c.includes = None
+            ps.prescan([a_o])
+            ps.queue.join()
+            assert a_c.includes is None, a_c.includes
+
+            # Sources get duplicated into a VariantDir before they're
+            # queued, not by the workers, and the ones that don't exist
+            # don't get queued.
+            test.subdir('src')
+            test.write(['src', 'e.c'], '#include "e.h"\n')
+            fs.VariantDir(test.workpath('build'), test.workpath('src'),
+                          duplicate=1)
+            e_o = Build('build/e.o', ['build/e.c', 'build/f.c'])
+            ps.queue.put = lambda item, put=ps.queue.put: \
+                           queued.append(item[1]) or put(item)
+            queued = []
+            ps.prescan([e_o])
+            del ps.queue.put
+            assert os.path.exists(test.workpath('build', 'e.c'))
+            assert queued == [test.workpath('build', 'e.c')], queued
+            ps.queue.join()
+            e_c = fs.File(test.workpath('build', 'e.c'))
+            assert e_c.includes == ['e.h'], e_c.includes
+        finally:
+            ps.cleanup()
+        assert ps.workers == [], ps.workers
+
+        # The scan uses the includes that were read ahead.
+        test.write('c.h', '')
+        a_c.includes = ['c.h']
+        deps = scanner(a_c, env, ())
+        assert deps == [fs.File(test.workpath('c.h'))], deps
+
+        taskmaster = Taskmaster(num_tasks, self, RandomTask)
+        jobs = SCons.Job.Jobs(num_jobs, taskmaster, prescan=True)
+        assert jobs.prescan
+        ps = jobs.job.ps
+        jobs.run()
+        self.failUnless(taskmaster.all_tasks_are_executed(),
+                        "all the tests were not executed")
+        assert taskmaster.prescanner is None, taskmaster.prescanner
+        assert ps.workers == [], ps.workers
+
+
+class SourceHasherTestCase(unittest.TestCase):
+    def runTest(self):
+        "test computing the content signatures of sources in worker threads"
+        try:
+            SCons.Job.SourceHasher
+        except AttributeError:
+            return
+
+        test = TestCmd.TestCmd(workdir = '')
+        test.write('a.in', 'a.in\n')
+        test.write('big.in', 'big.in\n' * 20000)
+        test.write('t.in', 't.in\n')
+        test.write('m.in', 'm.in\n')
+        fs = SCons.Node.FS.get_default_fs()
+        env = SCons.Environment.Base(tools=[])
+        env.Decider('MD5')
+        timestamp_env = SCons.Environment.Base(tools=[])
+        timestamp_env.Decider('timestamp-match')
+        mixed_env = SCons.Environment.Base(tools=[])
+        mixed_env.Decider('MD5-timestamp')
+        builder = SCons.Builder.Builder(action='touch $TARGET')
+        def Build(env, target, sources):
+            return builder(env, test.workpath(target),
+                           [test.workpath(s) for s in sources])[0]
+        a_out = Build(env, 'a.out', ['a.in', 'big.in', 'missing.in'])
+        t_out = Build(timestamp_env, 't.out', ['t.in'])
+        m_out = Build(mixed_env, 'm.out', ['m.in'])
+        prog = Build(env, 'prog', ['a.out', 't.out', 'm.out'])
+        a_in = fs.File(test.workpath('a.in'))
+        big_in = fs.File(test.workpath('big.in'))
+        t_in = fs.File(test.workpath('t.in'))
+        m_in = fs.File(test.workpath('m.in'))
+        missing_in = fs.File(test.workpath('missing.in'))
+
+        interrupted = SCons.Job.InterruptState()
+        sh = SCons.Job.SourceHasher(2, SCons.Job.default_stack_size,
+                                    interrupted)
+        try:
+            # Derived sources, missing sources and the sources of
+            # targets that don't decide by content are skipped.  With
+            # MD5-timestamp, a source without a stored timestamp counts
+            # as changed.
+            sources = sh.sources([prog])
+            assert set(sources) == set([a_in, big_in, m_in]), sources
+
+            assert sh.hash_sources([prog]) == 3
+            csig = a_in.get_ninfo().csig
+            assert csig == SCons.Util.MD5signature('a.in\n'), csig
+            csig = big_in.get_ninfo().csig
+            expect = SCons.Util.MD5signature('big.in\n' * 20000)
+            assert csig == expect, csig
+            assert not hasattr(t_in.get_ninfo(), 'csig')
+            assert not hasattr(missing_in.get_ninfo(), 'csig')
+
+            # Signatures that are already known aren't computed again.
+            assert sh.sources([prog]) == [], sh.sources([prog])
+
+            # Nothing gets hashed once the build is interrupted.
+            del a_in.get_ninfo().csig
+            interrupted.set()
+            assert sh.hash_sources([prog]) == 0
+            assert not hasattr(a_in.get_ninfo(), 'csig')
+        finally:
+            sh.cleanup()
+        assert sh.workers == [], sh.workers
+
+
+
 #---------------------------------------------------------------------
 
 def suite():
@@ -518,10 +1142,17 @@ def suite():
     suite.addTest(ParallelTestCase())
     suite.addTest(SerialTestCase())
     suite.addTest(NoParallelTestCase())
+    suite.addTest(LoadAverageTestCase())
+    suite.addTest(JobserverTestCase())
     suite.addTest(SerialExceptionTestCase())
     suite.addTest(ParallelExceptionTestCase())
     suite.addTest(SerialTaskTest())
     suite.addTest(ParallelTaskTest())
+    suite.addTest(ProcessPoolTestCase())
+    suite.addTest(ReadWaiterTestCase())
+    suite.addTest(CommandLoopTestCase())
+    suite.addTest(PrescannerTestCase())
+    suite.addTest(SourceHasherTestCase())
     return suite
 
 if __name__ == "__main__":
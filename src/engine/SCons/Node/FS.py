@@ -51,6 +51,7 @@ import SCons.Errors
 import SCons.Memoize
 import SCons.Node
 import SCons.Node.Alias
+import SCons.SConsign
 import SCons.Subst
 import SCons.Util
 import SCons.Warnings
@@ -365,6 +366,38 @@ else:
     def _my_normcase(x):
         return x.upper()
 
+# os.scandir() (or the scandir module it came from, on Python 2) reads
+# the types of the entries along with their names, so directory
+# listings can tell files from directories without a stat() per entry.
+try:
+    _scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+def _read_disk_entries(path):
+    """Returns a list of (name, kind) tuples for the entries of the
+    directory 'path', where kind is 'dir' or 'file' if the listing says
+    the entry is a directory or a regular file, and 'other' if it
+    doesn't.  Raises OSError if the directory can't be read.
+    """
+    if _scandir is None:
+        return [(name, 'other') for name in os.listdir(path)]
+    result = []
+    for entry in _scandir(path):
+        try:
+            if entry.is_dir():
+                kind = 'dir'
+            elif entry.is_file():
+                kind = 'file'
+            else:
+                kind = 'other'
+        except OSError:
+            kind = 'other'
+        result.append((entry.name, kind))
+    return result
 
 
 class DiskChecker(object):
@@ -381,6 +414,31 @@ class DiskChecker(object):
         else:
             self.func = self.ignore
 
+def decode_text(contents):
+    """
+    Decodes the bytes 'contents' of a text file, going by its BOM bytes
+    (see File.get_text_contents()).
+    """
+    # The behavior of various decode() methods and functions
+    # w.r.t. the initial BOM bytes is different for different
+    # encodings and/or Python versions.  ('utf-8' does not strip
+    # them, but has a 'utf-8-sig' which does; 'utf-16' seems to
+    # strip them; etc.)  Just sidestep all the complication by
+    # explicitly stripping the BOM before we decode().
+    if contents[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+        return contents[len(codecs.BOM_UTF8):].decode('utf-8')
+    if contents[:len(codecs.BOM_UTF16_LE)] == codecs.BOM_UTF16_LE:
+        return contents[len(codecs.BOM_UTF16_LE):].decode('utf-16-le')
+    if contents[:len(codecs.BOM_UTF16_BE)] == codecs.BOM_UTF16_BE:
+        return contents[len(codecs.BOM_UTF16_BE):].decode('utf-16-be')
+    try:
+        return contents.decode('utf-8')
+    except UnicodeDecodeError as e:
+        try:
+            return contents.decode('latin-1')
+        except UnicodeDecodeError as e:
+            return contents.decode('utf-8', error='backslashreplace')
+
 def do_diskcheck_match(node, predicate, errorfmt):
     result = predicate()
     try:
@@ -939,10 +997,29 @@ class Entry(Base):
     def disambiguate(self, must_exist=None):
         """
         """
-        if self.isdir():
+        # The listing of our directory usually knows what we are, which
+        # saves a stat() of our own.  Entries that showed up after the
+        # listing was read still get looked at directly, and so does
+        # anything that must exist, since the listing may be stale.
+        if must_exist:
+            path = self.get_abspath()
+            if self.fs.isdir(path):
+                kind = 'dir'
+            elif self.fs.isfile(path):
+                kind = 'file'
+            else:
+                kind = None
+        else:
+            kind = self.dir.entry_kind_on_disk(self.name)
+            if kind not in ('dir', 'file'):
+                if self.isdir():
+                    kind = 'dir'
+                elif self.isfile():
+                    kind = 'file'
+        if kind == 'dir':
             self.__class__ = Dir
             self._morph()
-        elif self.isfile():
+        elif kind == 'file':
             self.__class__ = File
             self._morph()
             self.clear()
@@ -1263,6 +1340,11 @@ class FS(LocalFS):
 
             needs_normpath = needs_normpath_match(p)
 
+            if needs_normpath is None and root is directory.root:
+                # There's nothing to normalize, so just look the names
+                # up from the top-level directory.
+                return directory._lookup_names(p, fsclass, create)
+
             # The path is relative to the top-level SCons directory.
             if p in ('', '.'):
                 p = directory.get_labspath()
@@ -1300,6 +1382,11 @@ class FS(LocalFS):
                 else:
                     directory = self._cwd
 
+                if needs_normpath is None and not drive:
+                    # There's nothing to normalize, so just look the
+                    # names up from the directory.
+                    return directory._lookup_names(p, fsclass, create)
+
                 if p in ('', '.'):
                     p = directory.get_labspath()
                 else:
@@ -1902,6 +1989,75 @@ class Dir(Base):
     def entry_abspath(self, name):
         return self._abspath + OS_SEP + name
 
+    def _lookup_names(self, p, klass, create=1):
+        """
+        Looks up a *normalized* '/'-separated path relative to this
+        directory, one name at a time, going down through the entries
+        of each directory on the way.  The directory Nodes are the only
+        index of the file system, so no string of a whole path has to
+        be kept (or hashed) for it.  Empty names are skipped.
+
+        If a Node for the specified "p" doesn't already exist, and
+        "create" is specified, the Node may be created after finding or
+        creating the parent directory or directories.
+        """
+        # The usual case, of a Node that already exists.  Anything on the
+        # way that isn't a directory yet has no entries.
+        node = self
+        try:
+            for k in _my_normcase(p).split('/'):
+                if k:
+                    node = node.entries[k]
+        except (KeyError, AttributeError):
+            pass
+        else:
+            # There is already a Node for this path name.  Allow it to
+            # complain if we were looking for an inappropriate type.
+            node.must_be_same(klass)
+            return node
+
+        names = [name for name in p.split('/') if name]
+        last = len(names) - 1
+        result = self
+        created = False
+        for i, name in enumerate(names):
+            # Everything we go through on the way has to be a directory.
+            dir_node = result
+            dir_node.must_be_same(Dir)
+            k = _my_normcase(name)
+            try:
+                result = dir_node.entries[k]
+            except KeyError:
+                if not create:
+                    msg = "No such file or directory: '%s' in '%s' (and create is False)" % (p, str(self))
+                    raise SCons.Errors.UserError(msg)
+                # There is no Node for this path name, and we're allowed
+                # to create it.
+                if i == last:
+                    result = klass(name, dir_node, self.fs)
+                else:
+                    result = Dir(name, dir_node, self.fs)
+
+                # Double-check on disk (as configured) that the Node we
+                # created matches whatever is out there in the real world.
+                result.diskcheck_match()
+
+                # Key the entry with the Node's own (intern'ed) name
+                # where we can, so that the directory doesn't keep a
+                # copy of it.
+                if k == name:
+                    k = result.name
+                dir_node.entries[k] = result
+                dir_node.implicit = None
+                created = True
+            else:
+                created = False
+        if not created:
+            # There is already a Node for this path name.  Allow it to
+            # complain if we were looking for an inappropriate type.
+            result.must_be_same(klass)
+        return result
+
     def entry_labspath(self, name):
         return self._labspath + '/' + name
 
@@ -1911,36 +2067,62 @@ class Dir(Base):
     def entry_tpath(self, name):
         return self._tpath + OS_SEP + name
 
-    def entry_exists_on_disk(self, name):
+    def scan_disk_entries(self):
+        """ Reads the file/dir entries of the current directory from
+            disk, and remembers their names and kinds for
+            entry_exists_on_disk() and entry_kind_on_disk().  Returns
+            the (name, kind) tuples of the entries.
+        """
+        try:
+            entries = _read_disk_entries(self._abspath)
+        except OSError:
+            entries = []
+        d = {}
+        for name, kind in entries:
+            d[_my_normcase(name)] = kind
+        self.on_disk_entries = d
+        return entries
+
+    def entry_kind_on_disk(self, name):
         """ Searches through the file/dir entries of the current
-            directory, and returns True if a physical entry with the given
-            name could be found.
+            directory, and returns 'dir' or 'file' if the directory
+            listing says that the physical entry with the given name is
+            a directory or a regular file, 'other' if it doesn't say,
+            and None if no entry with that name could be found.
 
-            @see rentry_exists_on_disk
+            The directory is only read once, so the Nodes of all its
+            entries can be looked up, and told apart, without a
+            system call each.
         """
         try:
             d = self.on_disk_entries
         except AttributeError:
-            d = {}
-            try:
-                entries = os.listdir(self._abspath)
-            except OSError:
-                pass
-            else:
-                for entry in map(_my_normcase, entries):
-                    d[entry] = True
-            self.on_disk_entries = d
+            self.scan_disk_entries()
+            d = self.on_disk_entries
         if sys.platform == 'win32' or sys.platform == 'cygwin':
             name = _my_normcase(name)
-            result = d.get(name)
-            if result is None:
+            try:
+                return d[name]
+            except KeyError:
                 # Belt-and-suspenders for Windows:  check directly for
                 # 8.3 file names that don't show up in os.listdir().
-                result = os.path.exists(self._abspath + OS_SEP + name)
+                if os.path.exists(self._abspath + OS_SEP + name):
+                    result = 'other'
+                else:
+                    result = None
                 d[name] = result
-            return result
+                return result
         else:
-            return name in d
+            return d.get(name)
+
+    def entry_exists_on_disk(self, name):
+        """ Searches through the file/dir entries of the current
+            directory, and returns True if a physical entry with the given
+            name could be found.
+
+            @see rentry_exists_on_disk
+        """
+        return self.entry_kind_on_disk(name) is not None
 
     def rentry_exists_on_disk(self, name):
         """ Searches through the file/dir entries of the current
@@ -2187,10 +2369,10 @@ class Dir(Base):
                 # entries for all Nodes in repositories or variant dirs.
                 for name in node_names: selfEntry(name)
             if ondisk:
-                try:
-                    disk_names = os.listdir(dir._abspath)
-                except os.error:
-                    continue
+                # Re-read the directory, since SConscript files may have
+                # created entries since it was last read, and keep the
+                # result for later entry_exists_on_disk() calls.
+                disk_names = [name for name, kind in dir.scan_disk_entries()]
                 names.extend(disk_names)
                 if not strings:
                     # We're going to return corresponding Nodes in
@@ -2234,7 +2416,7 @@ class RootDir(Dir):
     this directory.
     """
 
-    __slots__ = ['_lookupDict']
+    __slots__ = ()
 
     def __init__(self, drive, fs):
         if SCons.Debug.track_instances: logInstanceCreation(self, 'Node.FS.RootDir')
@@ -2279,16 +2461,7 @@ class RootDir(Dir):
         self._morph()
 
         self.duplicate = 0
-        self._lookupDict = {}
-
-        self._lookupDict[''] = self
-        self._lookupDict['/'] = self
         self.root = self
-        # The // entry is necessary because os.path.normpath()
-        # preserves double slashes at the beginning of a path on Posix
-        # platforms.
-        if not has_unc:
-            self._lookupDict['//'] = self
 
     def _morph(self):
         """Turn a file system Node (either a freshly initialized directory
@@ -2347,38 +2520,13 @@ class RootDir(Dir):
         use the FS.Entry(), FS.Dir() or FS.File() methods.
 
         The caller is responsible for making sure we're passed a
-        normalized absolute path; we merely let Python's dictionary look
-        up and return the One True Node.FS object for the path.
-
-        If a Node for the specified "p" doesn't already exist, and
-        "create" is specified, the Node may be created after recursive
-        invocation to find or create the parent directory or directories.
+        normalized absolute path, which we look up with
+        _lookup_names().  Empty names are skipped there, which takes
+        care of the root directory itself and of the double slash at
+        the beginning of a path that os.path.normpath() preserves on
+        Posix platforms.
         """
-        k = _my_normcase(p)
-        try:
-            result = self._lookupDict[k]
-        except KeyError:
-            if not create:
-                msg = "No such file or directory: '%s' in '%s' (and create is False)" % (p, str(self))
-                raise SCons.Errors.UserError(msg)
-            # There is no Node for this path name, and we're allowed
-            # to create it.
-            dir_name, file_name = p.rsplit('/',1)
-            dir_node = self._lookup_abs(dir_name, Dir)
-            result = klass(file_name, dir_node, self.fs)
-
-            # Double-check on disk (as configured) that the Node we
-            # created matches whatever is out there in the real world.
-            result.diskcheck_match()
-
-            self._lookupDict[k] = result
-            dir_node.entries[_my_normcase(file_name)] = result
-            dir_node.implicit = None
-        else:
-            # There is already a Node for this path name.  Allow it to
-            # complain if we were looking for an inappropriate type.
-            result.must_be_same(klass)
-        return result
+        return self._lookup_names(p, klass, create)
 
     def __str__(self):
         return self._abspath
@@ -2600,7 +2748,7 @@ class File(Base):
 
     def _morph(self):
         """Turn a file system node into a File object."""
-        self.scanner_paths = {}
+        self.scanner_paths = None
         if not hasattr(self, '_local'):
             self._local = 0
         if not hasattr(self, 'released_target_info'):
@@ -2639,26 +2787,7 @@ class File(Base):
         based upon the BOM bytes, and then decodes the contents so that
         it's a valid python string.
         """
-        contents = self.get_contents()
-        # The behavior of various decode() methods and functions
-        # w.r.t. the initial BOM bytes is different for different
-        # encodings and/or Python versions.  ('utf-8' does not strip
-        # them, but has a 'utf-8-sig' which does; 'utf-16' seems to
-        # strip them; etc.)  Just sidestep all the complication by
-        # explicitly stripping the BOM before we decode().
-        if contents[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
-            return contents[len(codecs.BOM_UTF8):].decode('utf-8')
-        if contents[:len(codecs.BOM_UTF16_LE)] == codecs.BOM_UTF16_LE:
-            return contents[len(codecs.BOM_UTF16_LE):].decode('utf-16-le')
-        if contents[:len(codecs.BOM_UTF16_BE)] == codecs.BOM_UTF16_BE:
-            return contents[len(codecs.BOM_UTF16_BE):].decode('utf-16-be')
-        try:
-            return contents.decode('utf-8')
-        except UnicodeDecodeError as e:
-            try:
-                return contents.decode('latin-1')
-            except UnicodeDecodeError as e:
-                return contents.decode('utf-8', error='backslashreplace')
+        return decode_text(self.get_contents())
 
 
     def get_content_hash(self):
@@ -3134,6 +3263,26 @@ class File(Base):
 
         return None
 
+    def get_cached_csig(self):
+        """
+        Returns the content signature that the content signature cache
+        (see SCons.SConsign.CSigCache) has for the current contents of
+        this file, or None.
+        """
+        cache = SCons.SConsign.csig_cache
+        if cache is None or not self.rexists():
+            return None
+        return cache.get(self.rfile().stat())
+
+    def cache_csig(self, csig):
+        """
+        Stores the content signature of the current contents of this
+        file in the content signature cache, if there is one.
+        """
+        cache = SCons.SConsign.csig_cache
+        if cache is not None and self.rexists():
+            cache.set(self.rfile().stat(), csig)
+
     def get_csig(self):
         """
         Generate a node's content signature, the digested signature
@@ -3150,6 +3299,13 @@ class File(Base):
             pass
 
         csig = self.get_max_drift_csig()
+        if csig is None and self._built_csig is not None:
+            # post_build() hashed the contents it just built.
+            csig = self._built_csig
+            self.cache_csig(csig)
+        self._built_csig = None
+        if csig is None:
+            csig = self.get_cached_csig()
         if csig is None:
 
             try:
@@ -3166,6 +3322,7 @@ class File(Base):
             else:
                 if not csig:
                     csig = SCons.Util.MD5signature(contents)
+                self.cache_csig(csig)
 
         ninfo.csig = csig
 
@@ -3179,6 +3336,27 @@ class File(Base):
         SCons.Node.Node.builder_set(self, builder)
         self.changed_since_last_build = 5
 
+    def post_build(self):
+        """Called just after this File node is successfully built,
+        before built().
+
+        Pushes the file to a CacheDir, and computes the content
+        signature of its new contents, which get_csig() picks up once
+        built() has cleared the node.  Unlike push_to_cache(), this
+        doesn't clear the memoized values, and it goes to the file
+        system directly instead of through them.
+        """
+        path = self.get_abspath()
+        if not os.path.exists(path):
+            return
+        if not self.cached and not self.nocache:
+            self.get_build_env().get_CacheDir().push(self)
+        try:
+            self._built_csig = SCons.Util.MD5filesignature(path,
+                chunksize=SCons.Node.FS.File.md5_chunksize*1024)
+        except EnvironmentError:
+            self._built_csig = None
+
     def built(self):
         """Called just after this File node is successfully built.
 
@@ -1813,6 +1813,50 @@ class FSTestCase(_tempdirTestCase):
         d = root._lookup_abs('/tmp/foo-nonexistent/nonexistent-dir', SCons.Node.FS.Dir)
         assert d.__class__ == SCons.Node.FS.Dir, str(d.__class__)
 
+        assert root._lookup_abs('', SCons.Node.FS.Dir) is root
+        assert root._lookup_abs('/', SCons.Node.FS.Dir) is root
+        x = root._lookup_abs('//tmp/foo-nonexistent', SCons.Node.FS.Entry)
+        assert x is d.dir, x
+
+        f = root._lookup_abs('/tmp/foo-nonexistent/file', SCons.Node.FS.File)
+        assert f.dir is d.dir, f.dir
+        try:
+            root._lookup_abs('/tmp/foo-nonexistent/file/sub', SCons.Node.FS.File)
+        except TypeError:
+            pass
+        else:
+            self.fail("did not catch expected TypeError")
+        try:
+            root._lookup_abs('/tmp/foo-nonexistent/new', SCons.Node.FS.File,
+                             create=0)
+        except SCons.Errors.UserError:
+            pass
+        else:
+            self.fail("did not catch expected UserError")
+
+    def test_lookup_names(self):
+        """Exercise the _lookup_names function"""
+        fs = self.fs
+
+        top = fs.Dir('#')
+        f = top._lookup_names('sub/dir/file', SCons.Node.FS.File)
+        assert f is fs.File('sub/dir/file'), f
+        assert f.dir is fs.Dir('sub/dir'), f.dir
+        assert top._lookup_names('', SCons.Node.FS.Dir) is top
+        assert top._lookup_names('.', SCons.Node.FS.Dir) is top
+
+        # An Entry on the way gets turned into a directory.
+        e = fs.Entry('entry')
+        g = top._lookup_names('entry/file', SCons.Node.FS.File)
+        assert e.__class__ is SCons.Node.FS.Dir, e.__class__
+        assert g.dir is e, g.dir
+
+        # The directory keys its entry with the Node's own name.
+        sub = fs.Dir('sub')
+        for key, node in sub.entries.items():
+            if key not in ('.', '..') and key == node.name:
+                assert key is node.name, key
+
     def test_lookup_uncpath(self):
         """Testing looking up a UNC path on Windows"""
         if sys.platform not in ('win32',):
@@ -2060,6 +2104,73 @@ class DirTestCase(_tempdirTestCase):
         if os.path.normcase("TeSt") != os.path.normpath("TeSt") or sys.platform == "cygwin":
             assert d.entry_exists_on_disk('case-insensitive')
 
+    def test_entry_kind_on_disk(self):
+        """Test the Dir.entry_kind_on_disk() method
+        """
+        test = self.test
+
+        does_not_exist = self.fs.Dir('does_not_exist')
+        assert does_not_exist.entry_kind_on_disk('foo') is None
+
+        test.subdir('k', ['k', 'subdir'])
+        test.write(['k', 'file'], "k/file\n")
+
+        k = self.fs.Dir('k')
+        if SCons.Node.FS._scandir is None:
+            expect_dir, expect_file = 'other', 'other'
+        else:
+            expect_dir, expect_file = 'dir', 'file'
+        kind = k.entry_kind_on_disk('subdir')
+        assert kind == expect_dir, kind
+        kind = k.entry_kind_on_disk('file')
+        assert kind == expect_file, kind
+        assert k.entry_kind_on_disk('does_not_exist') is None
+
+        # The listing is read once, until the directory gets scanned
+        # again.
+        test.write(['k', 'new'], "k/new\n")
+        assert not k.entry_exists_on_disk('new')
+        entries = sorted(k.scan_disk_entries())
+        assert entries == [('file', expect_file),
+                           ('new', expect_file),
+                           ('subdir', expect_dir)], entries
+        assert k.entry_exists_on_disk('new')
+
+        # Entries the listing knows about get disambiguated without
+        # a stat() of their own.
+        stats = []
+        def stat(path, stats=stats, real_stat=self.fs.stat):
+            stats.append(path)
+            return real_stat(path)
+        self.fs.stat = stat
+        try:
+            d = self.fs.Entry('k/subdir').disambiguate()
+            assert isinstance(d, SCons.Node.FS.Dir), d
+            f = self.fs.Entry('k/file').disambiguate()
+            assert isinstance(f, SCons.Node.FS.File), f
+        finally:
+            del self.fs.stat
+        if SCons.Node.FS._scandir is not None:
+            assert stats == [], stats
+
+        # Entries that must exist are looked at directly, in case the
+        # listing is out of date.
+        test.write(['k', 'was_file'], "k/was_file\n")
+        k.scan_disk_entries()
+        os.unlink(test.workpath('k', 'was_file'))
+        test.subdir(['k', 'was_file'])
+        e = self.fs.Entry('k/was_file').disambiguate(must_exist=1)
+        assert isinstance(e, SCons.Node.FS.Dir), e
+        test.subdir(['k', 'gone'])
+        k.scan_disk_entries()
+        os.rmdir(test.workpath('k', 'gone'))
+        try:
+            self.fs.Entry('k/gone').disambiguate(must_exist=1)
+        except SCons.Errors.UserError:
+            pass
+        else:
+            raise Exception("did not catch expected UserError")
+
     def test_rentry_exists_on_disk(self):
         """Test the Dir.rentry_exists_on_disk() method
         """
@@ -2455,6 +2566,48 @@ class FileTestCase(_tempdirTestCase):
         assert not build_f1.exists(), "%s did not realize that %s disappeared" % (build_f1, src_f1)
         assert not os.path.exists(build_f1.get_abspath()), "%s did not get removed after %s was removed" % (build_f1, src_f1)
 
+    def test_csig_cache(self):
+        """Test the File.get_csig() method with a content signature cache"""
+        import SCons.SConsign
+        test = self.test
+        test.write('f1', "f1\n")
+        test.write('f2', "f2\n")
+        old = time.time() - 10
+        os.utime(test.workpath('f1'), (old, old))
+
+        class FakeCache(object):
+            def __init__(self):
+                self.cache = {}
+            def get(self, st):
+                return self.cache.get(st.st_ino)
+            def set(self, st, csig):
+                self.cache[st.st_ino] = csig
+
+        cache = FakeCache()
+        save_csig_cache = SCons.SConsign.csig_cache
+        SCons.SConsign.csig_cache = cache
+        try:
+            f1 = self.fs.File('f1')
+            csig = f1.get_csig()
+            assert csig == SCons.Util.MD5signature("f1\n"), csig
+            ino = os.stat(test.workpath('f1')).st_ino
+            assert cache.cache == {ino : csig}, cache.cache
+
+            # Another Node of the same file uses the cached signature.
+            cache.cache[ino] = 'cached'
+            f1.clear()
+            f1.ninfo = f1.new_ninfo()
+            assert f1.get_cached_csig() == 'cached'
+            assert f1.get_csig() == 'cached', f1.get_csig()
+
+            assert self.fs.File('f3').get_cached_csig() is None
+        finally:
+            SCons.SConsign.csig_cache = save_csig_cache
+
+        f2 = self.fs.File('f2')
+        assert f2.get_cached_csig() is None
+        f2.cache_csig('unused')
+
 
 
 class GlobTestCase(_tempdirTestCase):
@@ -457,6 +457,35 @@ class NodeTestCase(unittest.TestCase):
         assert n.cleared, n.cleared
         assert n.ninfo.updated, n.ninfo.cleared
 
+    def test_post_build(self):
+        """Test the post_build() method"""
+        class SubNodeInfo(SCons.Node.NodeInfoBase):
+            __slots__ = ('updated',)
+            def update(self, node):
+                self.updated = getattr(self, 'updated', 0) + 1
+        class SubNode(SCons.Node.Node):
+            def clear(self):
+                self.cleared = getattr(self, 'cleared', 0) + 1
+            def push_to_cache(self):
+                self.pushed = getattr(self, 'pushed', 0) + 1
+
+        n = SubNode()
+        n.ninfo = SubNodeInfo()
+        n.post_build()
+        assert n.pushed == 1, n.pushed
+        # Clearing the node and updating its info is left to built().
+        assert not hasattr(n, 'cleared'), n.cleared
+        assert not hasattr(n.ninfo, 'updated'), n.ninfo.updated
+        n.built()
+        assert n.cleared == 1, n.cleared
+        assert n.ninfo.updated == 1, n.ninfo.updated
+
+        # Nodes retrieved from a CacheDir don't get pushed back.
+        n = SubNode()
+        n.cached = 1
+        n.post_build()
+        assert not hasattr(n, 'pushed'), n.pushed
+
     def test_push_to_cache(self):
         """Test the base push_to_cache() method"""
         n = SCons.Node.Node()
@@ -1322,6 +1351,25 @@ class NodeTestCase(unittest.TestCase):
         r = n1.add_to_waiting_parents(n2)
         assert r == 0, r
 
+    def test_shared_empty_sets(self):
+        """Test that Nodes share empty sets until they add to them"""
+        n1 = SCons.Node.Node()
+        n2 = SCons.Node.Node()
+        n3 = SCons.Node.Node()
+        attrs = ['sources_set', 'depends_set', 'ignore_set',
+                 'waiting_parents', 'waiting_s_e']
+        for attr in attrs:
+            assert getattr(n1, attr) is getattr(n2, attr), attr
+
+        n1.add_source([n3])
+        n1.add_dependency([n3])
+        n1.add_ignore([n3])
+        n1.add_to_waiting_parents(n3)
+        n1.add_to_waiting_s_e(n3)
+        for attr in attrs:
+            assert getattr(n1, attr) == set([n3]), attr
+            assert getattr(n2, attr) == set(), attr
+
 
 class NodeListTestCase(unittest.TestCase):
     def test___str__(self):
@@ -111,6 +111,13 @@ Annotate = do_nothing
 # clean builds and update runs (see release_target_info).
 interactive = False
 
+# The empty set that Nodes share until something gets added to one of
+# their sets of sources, dependencies, ignored dependencies, waiting
+# parents or waiting side effects.  Most Nodes (source files) never get
+# anything added to any of them, and an empty set of their own would
+# cost each of them a couple of hundred bytes.
+_empty_set = frozenset()
+
 def is_derived_none(node):
     raise NotImplementedError
 
@@ -444,9 +451,19 @@ class BuildInfoBase(object):
     that's specific to the type of Node) and direct attributes for the
     generic build stuff we have to track:  sources, explicit dependencies,
     implicit dependencies, and action information.
+
+    The wall-clock time it took to execute the action is kept in
+    bexectime.  The Taskmaster only sets it on the stored build
+    information of Nodes it actually built, so merging a fresh
+    BuildInfo into the stored one keeps the time of the last real
+    build.
+
+    Likewise, bfailed is only set on the stored build information of
+    Nodes that failed to build, and removed once they're built.
     """
     __slots__ = ("bsourcesigs", "bdependsigs", "bimplicitsigs", "bactsig",
-                 "bsources", "bdepends", "bact", "bimplicit", "__weakref__")
+                 "bsources", "bdepends", "bact", "bimplicit", "bexectime",
+                 "bfailed", "__weakref__")
     current_version_id = 2
 
     def __init__(self):
@@ -538,6 +555,7 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
                  'changed_since_last_build',
                  'store_info',
                  'pseudo',
+                 '_built_csig',
                  '_tags',
                  '_func_is_derived',
                  '_func_exists',
@@ -565,16 +583,16 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
         # a class.  (Of course, we could always still do that in the
         # future if we had a good reason to...).
         self.sources = []       # source files used to build node
-        self.sources_set = set()
+        self.sources_set = _empty_set
         self._specific_sources = False
         self.depends = []       # explicit dependencies (from Depends)
-        self.depends_set = set()
+        self.depends_set = _empty_set
         self.ignore = []        # dependencies to ignore
-        self.ignore_set = set()
+        self.ignore_set = _empty_set
         self.prerequisites = None
         self.implicit = None    # implicit (scanned) dependencies (None means not scanned yet)
-        self.waiting_parents = set()
-        self.waiting_s_e = set()
+        self.waiting_parents = _empty_set
+        self.waiting_s_e = _empty_set
         self.ref_count = 0
         self.wkids = None       # Kids yet to walk, when it's an array
 
@@ -593,6 +611,7 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
         self.linked = 0 # is this node linked to the variant directory?
         self.changed_since_last_build = 0
         self.store_info = 0
+        self._built_csig = None
         self._tags = None
         self._func_is_derived = 1
         self._func_exists = 1
@@ -752,6 +771,20 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
             e.node = self
             raise
 
+    def post_build(self):
+        """Called just after this node is successfully built, before
+        built() gets called.
+
+        This is called from multiple threads in a parallel build, so
+        that the thread that built the node can push it to a CacheDir
+        (and, for files, hash its new contents).  Only do thread safe
+        stuff here.  In particular, the memoized values of the node and
+        the .sconsign entries only get updated by built(), in the thread
+        that walks the dependency graph.
+        """
+        if not self.cached:
+            self.push_to_cache()
+
     def built(self):
         """Called just after this node is successfully built."""
 
@@ -806,6 +839,8 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
     #
 
     def add_to_waiting_s_e(self, node):
+        if self.waiting_s_e is _empty_set:
+            self.waiting_s_e = set()
         self.waiting_s_e.add(node)
 
     def add_to_waiting_parents(self, node):
@@ -819,6 +854,8 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
         wp = self.waiting_parents
         if node in wp:
             return 0
+        if wp is _empty_set:
+            wp = self.waiting_parents = set()
         wp.add(node)
         return 1
 
@@ -826,7 +863,7 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
         """Clean up anything we don't need to hang onto after we've
         been built."""
         self.executor_cleanup()
-        self.waiting_parents = set()
+        self.waiting_parents = _empty_set
 
     def clear(self):
         """Completely clear a Node of all its cached state (so that it
@@ -1232,6 +1269,8 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
 
     def add_dependency(self, depend):
         """Adds dependencies."""
+        if self.depends_set is _empty_set:
+            self.depends_set = set()
         try:
             self._add_child(self.depends, self.depends_set, depend)
         except TypeError as e:
@@ -1251,6 +1290,8 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
 
     def add_ignore(self, depend):
         """Adds dependencies to ignore."""
+        if self.ignore_set is _empty_set:
+            self.ignore_set = set()
         try:
             self._add_child(self.ignore, self.ignore_set, depend)
         except TypeError as e:
@@ -1265,6 +1306,8 @@ class Node(object, with_metaclass(NoSlotsPyPy)):
         """Adds sources."""
         if self._specific_sources:
             return
+        if self.sources_set is _empty_set:
+            self.sources_set = set()
         try:
             self._add_child(self.sources, self.sources_set, source)
         except TypeError as e:
@@ -60,17 +60,48 @@ def escape(arg):
     return '"' + arg + '"'
 
 
+# File descriptors that commands inherit besides stdin, stdout and
+# stderr, such as those of a make jobserver (see SCons.Job.Jobserver).
+inherited_fds = []
+
+def _close_fds_args(keep_fds=()):
+    """Returns the subprocess.Popen() arguments that close all file
+    descriptors except inherited_fds and keep_fds in the child."""
+    fds = list(inherited_fds) + list(keep_fds)
+    if not fds:
+        return {'close_fds' : True}
+    if sys.version_info[0] >= 3:
+        return {'close_fds' : True, 'pass_fds' : fds}
+    # Python 2 has no pass_fds, so close the others ourselves.
+    keep = sorted(fds)
+    def close_fds():
+        low = 3
+        for fd in keep:
+            os.closerange(low, fd)
+            low = fd + 1
+        os.closerange(low, subprocess.MAXFD)
+    return {'close_fds' : False, 'preexec_fn' : close_fds}
+
+def start_subprocess(l, env, keep_fds=()):
+    return subprocess.Popen(l, env = env, **_close_fds_args(keep_fds))
+
 def exec_subprocess(l, env):
-    proc = subprocess.Popen(l, env = env, close_fds = True)
-    return proc.wait()
+    return start_subprocess(l, env).wait()
 
 def subprocess_spawn(sh, escape, cmd, args, env):
     return exec_subprocess([sh, '-c', ' '.join(args)], env)
 
+def subprocess_spawn_start(sh, escape, cmd, args, env, keep_fds=()):
+    """Starts the command like subprocess_spawn() does, but returns
+    the subprocess.Popen object instead of waiting for it.  The
+    command also inherits the file descriptors in keep_fds."""
+    return start_subprocess([sh, '-c', ' '.join(args)], env, keep_fds)
+
 def exec_popen3(l, env, stdout, stderr):
-    proc = subprocess.Popen(l, env = env, close_fds = True,
+    proc = subprocess.Popen(l, env = env,
                             stdout = stdout,
-                            stderr = stderr)
+                            stderr = stderr,
+                            **_close_fds_args())
     return proc.wait()
 
 def piped_env_spawn(sh, escape, cmd, args, env, stdout, stderr):
@@ -35,8 +35,11 @@ import SCons.compat
 
 import os
 import pickle
+import sys
+import time
 
 import SCons.dblite
+import SCons.Util
 import SCons.Warnings
 
 from SCons.compat import PICKLE_PROTOCOL
@@ -62,11 +65,65 @@ DataBase = {}
 DB_Module = SCons.dblite
 DB_Name = ".sconsign"
 DB_sync_list = []
+# The names of the entries that this build changed in each directory
+# that it wrote to a database, by the path it wrote them under (see
+# merge_entries()).
+DB_changed = {}
+
+
+def sconsign_filename(name):
+    """
+    Returns the name of the .sconsign file or database 'name' for the
+    hash format of the content signatures (see SCons.Util.hash_format),
+    so that signatures of different hash formats never get mixed up.
+    MD5 signatures keep the plain name.
+    """
+    if SCons.Util.hash_format == 'md5':
+        return name
+    return name + '_' + SCons.Util.hash_format
+
+
+# The entries of a directory get pickled one at a time, and the pickled
+# entries get stored in a dictionary tagged with this format name, so
+# that reading a directory's signature information only unpickles an
+# entry (and converts it, see get_entry()) if the build asks for it.
+# Older versions stored a pickled dictionary of the entries themselves,
+# which can still be read.
+ENTRIES_FORMAT = 'SConsign-entries-1'
+
+def encode_entries(entries, encoded=None):
+    """
+    Returns the data to store for a directory's 'entries', which
+    must have been converted with convert_to_sconsign(), plus the
+    already pickled entries in 'encoded'.
+    """
+    data = dict(encoded or {})
+    for key, entry in entries.items():
+        data[key] = pickle.dumps(entry, PICKLE_PROTOCOL)
+    return pickle.dumps((ENTRIES_FORMAT, data), PICKLE_PROTOCOL)
+
+def decode_entries(data):
+    """
+    Reads the stored 'data' of a directory's entries, in either
+    format.  Returns a dictionary of the entries that got unpickled
+    (with the older format, all of them, which still need to be
+    converted with convert_from_sconsign()), and a dictionary of the
+    pickled entries that haven't been.  Raises TypeError if 'data'
+    isn't the entries of a directory.
+    """
+    entries = pickle.loads(data)
+    if isinstance(entries, dict):
+        return entries, {}
+    if not isinstance(entries, tuple) or len(entries) != 2 or \
+       entries[0] != ENTRIES_FORMAT or not isinstance(entries[1], dict):
+        raise TypeError("unknown format of sconsign entries")
+    return {}, entries[1]
 
 
 def Get_DataBase(dir):
     global DataBase, DB_Module, DB_Name
     top = dir.fs.Top
+    name = sconsign_filename(DB_Name)
     if not os.path.isabs(DB_Name) and top.repositories:
         mode = "c"
         for d in [top] + top.repositories:
@@ -74,31 +131,225 @@ def Get_DataBase(dir):
                 try:
                     return DataBase[d], mode
                 except KeyError:
-                    path = d.entry_abspath(DB_Name)
+                    path = d.entry_abspath(name)
                     try: db = DataBase[d] = DB_Module.open(path, mode)
                     except (IOError, OSError): pass
                     else:
                         if mode != "r":
                             DB_sync_list.append(db)
+                            set_merge(db)
                         return db, mode
             mode = "r"
     try:
         return DataBase[top], "c"
     except KeyError:
-        db = DataBase[top] = DB_Module.open(DB_Name, "c")
+        db = DataBase[top] = DB_Module.open(name, "c")
         DB_sync_list.append(db)
+        set_merge(db)
         return db, "c"
     except TypeError:
         print("DataBase =", DataBase)
         raise
 
+def set_merge(db):
+    """
+    Has the database 'db' call merge_entries() for the directories that
+    another SCons process wrote to it while this build was running, if
+    it can (like SCons.dblite does, see its merge attribute).
+    """
+    if hasattr(db, 'merge'):
+        db.merge = merge_entries
+
+def merge_entries(path, data, other_data):
+    """
+    Merges the entries of the directory 'path' that this build is
+    writing to the database ('data') with the ones that another SCons
+    process wrote to it since this build read it ('other_data'), and
+    returns the result.  The entries that this build changed come from
+    'data', and the rest from 'other_data', so that processes building
+    different files in a directory don't lose each other's entries.
+    """
+    return merge_changed(DB_changed.get(path), data, other_data)
+
+def merge_changed(changed, data, other_data):
+    """
+    Merges the encoded entries of a directory that this build is writing
+    ('data') with the ones that another SCons process wrote ('other_data')
+    and returns the result, taking the names in 'changed' from 'data' (see
+    merge_entries()).
+    """
+    if not changed:
+        return data
+    try:
+        entries, encoded = decode_entries(data)
+        other_entries, other_encoded = decode_entries(other_data)
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        return data
+    if other_entries:
+        # It's in the older format, and can't be merged entry by entry.
+        return data
+    for name in changed:
+        try:
+            other_encoded[name] = encoded[name]
+        except KeyError:
+            pass
+    return encode_entries({}, other_encoded)
+
+def file_stat(f):
+    """
+    Returns what identifies the contents of the file 'f' (a name or an
+    open file), so that we can tell if another process wrote it since,
+    or None if there's no such file.
+    """
+    try:
+        if SCons.Util.is_String(f):
+            st = os.stat(f)
+        else:
+            st = os.fstat(f.fileno())
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime, st.st_ctime)
+
+
+# The cache of content signatures that all the files of the build share
+# (see CSigCache and CSigCacheFile()), or None if there isn't one.
+csig_cache = None
+
+# How long (in seconds) a file has to be left alone after it was changed
+# before its content signature gets cached.  Two changes that close
+# together could leave the file with the same times, since file systems
+# don't record them with unlimited precision.
+racy_interval = 2.0
+
+# How many content signatures a cache keeps.  When a build leaves it
+# with more, it's pruned down to the ones that build used.
+csig_cache_max_entries = 200000
+
+
+class CSigCache(object):
+    """
+    A persistent cache of the content signatures of files, keyed by
+    the device, inode number, size and modification and change times
+    of each file, and the hash format (see SCons.Util.hash_format).
+
+    Unlike the signatures in the .sconsign entries, which belong to the
+    Node that depends on a file, the cache is shared by every Node of the
+    file, so a file that's used in many places, or linked into a new
+    VariantDir, only gets hashed once.  A cache can also be shared by
+    different builds, or trees, since it doesn't depend on file names.
+
+    Every change of a file adds an entry, so once a cache has more
+    than csig_cache_max_entries, sync() drops the entries that this
+    build didn't look up or set.  Trees that share a cache and use
+    more files than that between them should each get their own.
+    """
+
+    def __init__(self, name, dbm_module=None):
+        if dbm_module is None:
+            dbm_module = SCons.dblite
+        self.name = name
+        self.dbm_module = dbm_module
+        self.db = dbm_module.open(name, "c")
+        self.changed = False
+        # The keys of the entries that this build used.
+        self.seen = set()
+
+    def key(self, st):
+        """Returns the key of the file with the os.stat() result 'st',
+        or None if the file can't be told apart from others this way."""
+        if not st or not st.st_ino:
+            # Windows doesn't always have inode numbers.
+            return None
+        try:
+            times = '%d %d' % (st.st_mtime_ns, st.st_ctime_ns)
+        except AttributeError:
+            times = '%r %r' % (st.st_mtime, st.st_ctime)
+        return '%s %d %d %d %s' % (SCons.Util.hash_format,
+                                   st.st_dev, st.st_ino, st.st_size, times)
+
+    def get(self, st):
+        """Returns the cached content signature of the file with the
+        os.stat() result 'st', or None."""
+        key = self.key(st)
+        if key is None:
+            return None
+        try:
+            csig = SCons.Util.to_str(self.db[key])
+        except KeyError:
+            return None
+        self.seen.add(key)
+        return csig
+
+    def set(self, st, csig):
+        """Caches the content signature of the file with the os.stat()
+        result 'st', unless it changed within the last racy_interval
+        seconds."""
+        key = self.key(st)
+        if key is None or not csig:
+            return
+        if time.time() - max(st.st_mtime, st.st_ctime) < racy_interval:
+            return
+        self.db[key] = SCons.Util.to_bytes(csig)
+        self.seen.add(key)
+        self.changed = True
+
+    def sync(self):
+        if not self.changed:
+            return
+        self.changed = False
+        if len(self.db) > csig_cache_max_entries:
+            self.prune()
+        try:
+            syncmethod = self.db.sync
+        except AttributeError:
+            pass # Not all dbm modules have sync() methods.
+        else:
+            syncmethod()
+
+    def prune(self):
+        """Replaces the database with one that only has the entries
+        that this build used."""
+        keep = []
+        for key in self.seen:
+            try:
+                keep.append((key, self.db[key]))
+            except KeyError:
+                pass
+        try:
+            closemethod = self.db.close
+        except AttributeError:
+            pass # Not all dbm modules have close() methods.
+        else:
+            closemethod()
+        self.db = self.dbm_module.open(self.name, "n")
+        for key, value in keep:
+            self.db[key] = value
+
+
+def CSigCacheFile(name, dbm_module=None):
+    """
+    Arrange for the content signatures of all files to be cached in the
+    named database file (see CSigCache), or for them not to be cached if
+    the name is None.
+    """
+    global csig_cache
+    if csig_cache is not None:
+        csig_cache.sync()
+    if name is None:
+        csig_cache = None
+    else:
+        csig_cache = CSigCache(name, dbm_module)
+
 
 def Reset():
     """Reset global state.  Used by unit tests that end up using
     SConsign multiple times to get a clean slate for each test."""
-    global sig_files, DB_sync_list
+    global sig_files, DB_sync_list, DB_changed
     sig_files = []
     DB_sync_list = []
+    DB_changed = {}
 
 normcase = os.path.normcase
 
@@ -120,6 +371,8 @@ def write():
             pass # Not all dbm modules have close() methods.
         else:
             closemethod()
+    if csig_cache is not None:
+        csig_cache.sync()
 
 
 class SConsignEntry(object):
@@ -174,8 +427,13 @@ class Base(object):
     methods for fetching and storing the individual bits of information
     that make up signature entry.
     """
+
+    # The directory Node that the entries belong to, if any.
+    dir = None
+
     def __init__(self):
         self.entries = {}
+        self.encoded = {}
         self.dirty = False
         self.to_be_merged = {}
 
@@ -183,13 +441,50 @@ class Base(object):
         """
         Fetch the specified entry attribute.
         """
-        return self.entries[filename]
+        try:
+            return self.entries[filename]
+        except KeyError:
+            return self.decode_entry(filename)
+
+    def decode_entry(self, filename):
+        """
+        Unpickles the specified entry, the first time it's asked for,
+        and converts it for the directory it belongs to (if any).
+        Raises KeyError if there's no such entry, or if it can't be
+        read.
+        """
+        data = self.encoded.pop(filename)
+        try:
+            entry = pickle.loads(data)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            SCons.Warnings.warn(SCons.Warnings.CorruptSConsignWarning,
+                                "Ignoring corrupt sconsign entry : %s (%s)\n"%(filename, e))
+            raise KeyError(filename)
+        if self.dir:
+            entry.convert_from_sconsign(self.dir, filename)
+        self.entries[filename] = entry
+        return entry
+
+    def all_entries(self):
+        """
+        Returns the dictionary of all the entries, after unpickling
+        the ones that haven't been yet.
+        """
+        for filename in list(self.encoded.keys()):
+            try:
+                self.decode_entry(filename)
+            except KeyError:
+                pass
+        return self.entries
 
     def set_entry(self, filename, obj):
         """
         Set the entry.
         """
         self.entries[filename] = obj
+        self.encoded.pop(filename, None)
         self.dirty = True
 
     def do_not_set_entry(self, filename, obj):
@@ -217,6 +512,7 @@ class Base(object):
             else:
                 ninfo.merge(node.get_ninfo())
             self.entries[key] = entry
+            self.encoded.pop(key, None)
         self.to_be_merged = {}
 
 
@@ -243,10 +539,7 @@ class DB(Base):
             pass
         else:
             try:
-                self.entries = pickle.loads(rawentries)
-                if not isinstance(self.entries, dict):
-                    self.entries = {}
-                    raise TypeError
+                self.entries, self.encoded = decode_entries(rawentries)
             except KeyboardInterrupt:
                 raise
             except Exception as e:
@@ -263,13 +556,21 @@ class DB(Base):
             self.set_entry = self.do_not_set_entry
             self.store_info = self.do_not_store_info
 
+        # The names of the entries that this build changed.
+        self.changed = set()
+
         global sig_files
         sig_files.append(self)
 
+    def set_entry(self, filename, obj):
+        Base.set_entry(self, filename, obj)
+        self.changed.add(filename)
+
     def write(self, sync=1):
         if not self.dirty:
             return
 
+        self.changed.update(self.to_be_merged.keys())
         self.merge()
 
         db, mode = Get_DataBase(self.dir)
@@ -281,7 +582,8 @@ class DB(Base):
         path = normcase(self.dir.get_internal_path())
         for key, entry in self.entries.items():
             entry.convert_to_sconsign()
-        db[path] = pickle.dumps(self.entries, PICKLE_PROTOCOL)
+        db[path] = encode_entries(self.entries, self.encoded)
+        DB_changed[path] = self.changed
 
         if sync:
             try:
@@ -303,12 +605,10 @@ class Dir(Base):
         if not fp:
             return
 
-        self.entries = pickle.load(fp)
-        if not isinstance(self.entries, dict):
-            self.entries = {}
-            raise TypeError
+        self.entries, self.encoded = decode_entries(fp.read())
 
         if dir:
+            self.dir = dir
             for key, entry in self.entries.items():
                 entry.convert_from_sconsign(dir, key)
 
@@ -323,24 +623,58 @@ class DirFile(Dir):
         """
 
         self.dir = dir
-        self.sconsign = os.path.join(dir.get_internal_path(), '.sconsign')
-
+        self.sconsign = os.path.join(dir.get_internal_path(),
+                                     sconsign_filename('.sconsign'))
+
+        # Like the .sconsign database, the file can be written by SCons
+        # processes building different targets of the directory at the
+        # same time, so it gets locked, and write() merges the entries
+        # this build changed with the ones the other processes wrote.
+        self.lock_name = self.sconsign + '.lock'
+        # The names of the entries that this build changed, and what the
+        # file looked like when we read it (see file_stat()).
+        self.changed = set()
+        self.stat = None
+
+        lock = self.lock()
         try:
-            fp = open(self.sconsign, 'rb')
-        except IOError:
-            fp = None
+            try:
+                fp = open(self.sconsign, 'rb')
+            except IOError:
+                fp = None
+            else:
+                self.stat = file_stat(fp)
 
-        try:
-            Dir.__init__(self, fp, dir)
-        except KeyboardInterrupt:
-            raise
-        except:
-            SCons.Warnings.warn(SCons.Warnings.CorruptSConsignWarning,
-                                "Ignoring corrupt .sconsign file: %s"%self.sconsign)
+            try:
+                Dir.__init__(self, fp, dir)
+            except KeyboardInterrupt:
+                raise
+            except:
+                SCons.Warnings.warn(SCons.Warnings.CorruptSConsignWarning,
+                                    "Ignoring corrupt .sconsign file: %s"%self.sconsign)
+            if fp:
+                fp.close()
+        finally:
+            SCons.Util.unlock_file(self.lock_name, lock)
 
         global sig_files
         sig_files.append(self)
 
+    def lock(self):
+        """
+        Locks the .sconsign file against other SCons processes, if we
+        can.  We may not be able to create the lock file in a directory
+        that isn't writable, and then just go ahead without it.
+        """
+        try:
+            return SCons.Util.lock_file(self.lock_name)
+        except (IOError, OSError):
+            return None
+
+    def set_entry(self, filename, obj):
+        Dir.set_entry(self, filename, obj)
+        self.changed.add(filename)
+
     def write(self, sync=1):
         """
         Write the .sconsign file to disk.
@@ -357,8 +691,29 @@ class DirFile(Dir):
         if not self.dirty:
             return
 
+        self.changed.update(self.to_be_merged.keys())
         self.merge()
 
+        lock = self.lock()
+        try:
+            self._write()
+        finally:
+            SCons.Util.unlock_file(self.lock_name, lock)
+
+    def _write(self):
+        for key, entry in self.entries.items():
+            entry.convert_to_sconsign()
+        data = encode_entries(self.entries, self.encoded)
+        if file_stat(self.sconsign) != self.stat:
+            # Another process wrote the file since we read it.
+            try:
+                with open(self.sconsign, 'rb') as fp:
+                    other_data = fp.read()
+            except IOError:
+                pass
+            else:
+                data = merge_changed(self.changed, data, other_data)
+
         temp = os.path.join(self.dir.get_internal_path(), '.scons%d' % os.getpid())
         try:
             file = open(temp, 'wb')
@@ -369,15 +724,17 @@ class DirFile(Dir):
                 fname = self.sconsign
             except IOError:
                 return
-        for key, entry in self.entries.items():
-            entry.convert_to_sconsign()
-        pickle.dump(self.entries, file, PICKLE_PROTOCOL)
+        file.write(data)
         file.close()
         if fname != self.sconsign:
             try:
                 mode = os.stat(self.sconsign)[0]
-                os.chmod(self.sconsign, 0o666)
-                os.unlink(self.sconsign)
+                if sys.platform == 'win32':
+                    # Windows doesn't allow renaming if the file exists.
+                    # Elsewhere, the rename replaces the file in one go,
+                    # so that other processes always find it.
+                    os.chmod(self.sconsign, 0o666)
+                    os.unlink(self.sconsign)
             except (IOError, OSError):
                 # Try to carry on in the face of either OSError
                 # (things like permission issues) or IOError (disk
@@ -400,6 +757,8 @@ class DirFile(Dir):
             os.unlink(temp)
         except (IOError, OSError):
             pass
+        self.stat = file_stat(self.sconsign)
+        self.changed = set()
 
 ForDirectory = DB
 
@@ -418,6 +777,11 @@ def File(name, dbm_module=None):
         DB_Name = name
         if not dbm_module is None:
             DB_Module = dbm_module
+            if hasattr(dbm_module, 'corruption_warning'):
+                # A module like SCons.dblite (SCons.dblog, say), so
+                # ignore corrupt databases with a warning the same way.
+                dbm_module.ignore_corrupt_dbfiles = 1
+                dbm_module.corruption_warning = corrupt_dblite_warning
 
 # Local Variables:
 # tab-width:4
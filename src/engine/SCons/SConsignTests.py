@@ -24,7 +24,9 @@
 __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
 import os
+import pickle
 import sys
+import time
 import unittest
 
 import TestCmd
@@ -33,6 +35,7 @@ import TestUnit
 import SCons.dblite
 
 import SCons.SConsign
+import SCons.Warnings
 
 class BuildInfo(object):
     def merge(self, object):
@@ -264,6 +267,101 @@ class SConsignDBTestCase(SConsignTestCase):
 
             SCons.SConsign.DataBase = save_DataBase
 
+class EntriesFormatTestCase(SConsignTestCase):
+
+    def test_encode_decode(self):
+        """Test encoding and decoding the entries of a directory"""
+        aaa = DummySConsignEntry('aaa')
+        data = SCons.SConsign.encode_entries({'aaa' : aaa},
+                                             {'bbb' : b'bbb data'})
+        entries, encoded = SCons.SConsign.decode_entries(data)
+        assert entries == {}, entries
+        assert sorted(encoded.keys()) == ['aaa', 'bbb'], encoded
+        assert encoded['bbb'] == b'bbb data', encoded['bbb']
+        e = pickle.loads(encoded['aaa'])
+        assert e.name == 'aaa', e.name
+
+        # The format of older versions, a dictionary of the entries.
+        data = pickle.dumps({'aaa' : aaa})
+        entries, encoded = SCons.SConsign.decode_entries(data)
+        assert list(entries.keys()) == ['aaa'], entries
+        assert encoded == {}, encoded
+
+        for bad in [['aaa'], ('unknown', {}), (SCons.SConsign.ENTRIES_FORMAT, [])]:
+            try:
+                SCons.SConsign.decode_entries(pickle.dumps(bad))
+            except TypeError:
+                pass
+            else:
+                self.fail("did not catch expected TypeError for %s" % bad)
+
+    def test_lazy_entries(self):
+        """Test that entries only get decoded when they're asked for"""
+        f = SCons.SConsign.DirFile(DummyNode('.'))
+        f.set_entry('aaa', DummySConsignEntry('aaa'))
+        f.set_entry('bbb', DummySConsignEntry('bbb'))
+        f.write()
+
+        f = SCons.SConsign.DirFile(DummyNode('.'))
+        assert f.entries == {}, f.entries
+        assert sorted(f.encoded.keys()) == ['aaa', 'bbb'], f.encoded
+        bbb_data = f.encoded['bbb']
+
+        e = f.get_entry('aaa')
+        assert e.name == 'aaa', e.name
+        assert e.c_from_s, e.__dict__
+        assert f.get_entry('aaa') is e
+        assert list(f.encoded.keys()) == ['bbb'], f.encoded
+        try:
+            f.get_entry('ccc')
+        except KeyError:
+            pass
+        else:
+            self.fail("did not catch expected KeyError")
+
+        # Entries that were never decoded get written back as they were.
+        f.set_entry('ccc', DummySConsignEntry('ccc'))
+        f.write()
+        data = open(f.sconsign, 'rb').read()
+        entries, encoded = SCons.SConsign.decode_entries(data)
+        assert sorted(encoded.keys()) == ['aaa', 'bbb', 'ccc'], encoded
+        assert encoded['bbb'] == bbb_data
+
+        f = SCons.SConsign.DirFile(DummyNode('.'))
+        entries = f.all_entries()
+        assert sorted(entries.keys()) == ['aaa', 'bbb', 'ccc'], entries
+        assert f.encoded == {}, f.encoded
+
+    def test_old_format(self):
+        """Test reading entries in the format of older versions"""
+        self.test.write('.sconsign',
+                        pickle.dumps({'aaa' : DummySConsignEntry('aaa')}))
+        f = SCons.SConsign.DirFile(DummyNode('.'))
+        assert list(f.entries.keys()) == ['aaa'], f.entries
+        assert f.encoded == {}, f.encoded
+        e = f.get_entry('aaa')
+        assert e.c_from_s, e.__dict__
+
+    def test_corrupt_entry(self):
+        """Test that an entry that can't be decoded is ignored"""
+        SCons.Warnings.enableWarningClass(SCons.Warnings.CorruptSConsignWarning)
+        save_warn = SCons.Warnings.warn
+        warnings = []
+        SCons.Warnings.warn = lambda cls, msg: warnings.append(msg)
+        try:
+            f = SCons.SConsign.Base()
+            f.encoded['aaa'] = b'not a pickle'
+            try:
+                f.get_entry('aaa')
+            except KeyError:
+                pass
+            else:
+                self.fail("did not catch expected KeyError")
+            assert len(warnings) == 1, warnings
+            assert f.encoded == {}, f.encoded
+        finally:
+            SCons.Warnings.warn = save_warn
+
 class SConsignDirFileTestCase(SConsignTestCase):
 
     def test_SConsignDirFile(self):
@@ -292,6 +390,133 @@ class SConsignDirFileTestCase(SConsignTestCase):
         assert e.name == 'bbb', e.name
         assert e.arg == 'bbb arg', e.arg
 
+    def test_write_merge(self):
+        """Test writing a .sconsign file that another process wrote to"""
+        self.test.subdir('dir')
+        f = SCons.SConsign.DirFile(DummyNode('dir'))
+        f.set_entry('foo', DummySConsignEntry('foo'))
+
+        # Another process writes another entry of the directory.
+        other = SCons.SConsign.DirFile(DummyNode('dir'))
+        other.set_entry('bar', DummySConsignEntry('bar'))
+        other.write()
+
+        f.write()
+        assert not os.path.exists(f.lock_name), f.lock_name
+
+        with open(f.sconsign, 'rb') as fp:
+            entries, encoded = SCons.SConsign.decode_entries(fp.read())
+        assert sorted(encoded.keys()) == ['bar', 'foo'], encoded
+        assert pickle.loads(encoded['foo']).name == 'foo'
+        assert pickle.loads(encoded['bar']).name == 'bar'
+
+    def test_sconsign_filename(self):
+        """Test the .sconsign file name for each hash format"""
+        assert SCons.SConsign.sconsign_filename('.sconsign') == '.sconsign'
+        try:
+            SCons.Util.set_hash_format('sha256')
+            name = SCons.SConsign.sconsign_filename('.sconsign')
+            assert name == '.sconsign_sha256', name
+        finally:
+            SCons.Util.set_hash_format('md5')
+
+
+class CSigCacheTestCase(SConsignTestCase):
+
+    def test_CSigCache(self):
+        """Test caching content signatures by the stat() of the files"""
+        class Stat(object):
+            def __init__(self, ino, mtime, size=10):
+                self.st_dev = 1
+                self.st_ino = ino
+                self.st_size = size
+                self.st_mtime = mtime
+                self.st_ctime = mtime
+
+        old = time.time() - 100
+        name = self.test.workpath('csigs')
+        cache = SCons.SConsign.CSigCache(name)
+        assert cache.get(Stat(1, old)) is None
+
+        cache.set(Stat(1, old), 'csig1')
+        assert cache.get(Stat(1, old)) == 'csig1', cache.get(Stat(1, old))
+        # Any change of the size or times of the file is a miss.
+        assert cache.get(Stat(1, old, 11)) is None
+        assert cache.get(Stat(1, old + 1)) is None
+        assert cache.get(Stat(2, old)) is None
+
+        # Files that were just changed, or can't be told apart by their
+        # inode numbers, don't get cached.
+        now = time.time()
+        cache.set(Stat(3, now), 'csig3')
+        assert cache.get(Stat(3, now)) is None
+        cache.set(Stat(0, old), 'csig0')
+        assert cache.get(Stat(0, old)) is None
+
+        # Each hash format has its own signatures.
+        try:
+            SCons.Util.set_hash_format('sha256')
+            assert cache.get(Stat(1, old)) is None
+        finally:
+            SCons.Util.set_hash_format('md5')
+
+        cache.sync()
+        assert not cache.changed
+        cache = SCons.SConsign.CSigCache(name)
+        assert cache.get(Stat(1, old)) == 'csig1', cache.get(Stat(1, old))
+
+    def test_prune(self):
+        """Test pruning a content signature cache that got too big"""
+        class Stat(object):
+            def __init__(self, ino, mtime):
+                self.st_dev = 1
+                self.st_ino = ino
+                self.st_size = 10
+                self.st_mtime = mtime
+                self.st_ctime = mtime
+
+        old = time.time() - 100
+        name = self.test.workpath('csigs')
+        save_max_entries = SCons.SConsign.csig_cache_max_entries
+        SCons.SConsign.csig_cache_max_entries = 3
+        try:
+            cache = SCons.SConsign.CSigCache(name)
+            for ino in range(1, 4):
+                cache.set(Stat(ino, old), 'csig%d' % ino)
+            cache.sync()
+            assert len(cache.db) == 3, len(cache.db)
+
+            # The next build only uses two of the files, and changes one.
+            cache = SCons.SConsign.CSigCache(name)
+            assert cache.get(Stat(1, old)) == 'csig1'
+            cache.set(Stat(2, old + 1), 'csig2 new')
+            assert len(cache.db) == 4, len(cache.db)
+            cache.sync()
+
+            cache = SCons.SConsign.CSigCache(name)
+            assert len(cache.db) == 2, len(cache.db)
+            assert cache.get(Stat(1, old)) == 'csig1'
+            assert cache.get(Stat(2, old + 1)) == 'csig2 new'
+            assert cache.get(Stat(2, old)) is None
+            assert cache.get(Stat(3, old)) is None
+        finally:
+            SCons.SConsign.csig_cache_max_entries = save_max_entries
+
+    def test_CSigCacheFile(self):
+        """Test setting the content signature cache file"""
+        name = self.test.workpath('csigs')
+        assert SCons.SConsign.csig_cache is None
+        try:
+            SCons.SConsign.CSigCacheFile(name)
+            cache = SCons.SConsign.csig_cache
+            assert cache.name == name, cache.name
+            cache.set(os.stat(name + '.dblite'), 'csig')
+            SCons.SConsign.write()
+            assert not cache.changed
+        finally:
+            SCons.SConsign.CSigCacheFile(None)
+        assert SCons.SConsign.csig_cache is None
+
 
 class SConsignFileTestCase(SConsignTestCase):
 
@@ -379,6 +604,46 @@ class writeTestCase(SConsignTestCase):
 
         assert fake_dbm.sync_count == 1, fake_dbm.sync_count
 
+    def test_write_merge(self):
+        """Test writing a database that another process wrote to"""
+
+        test = self.test
+        file = test.workpath('sconsign_merge')
+
+        save_sync_list = SCons.SConsign.DB_sync_list
+        save_changed = SCons.SConsign.DB_changed
+        SCons.SConsign.DataBase = {}
+        SCons.SConsign.DB_sync_list = []
+        SCons.SConsign.DB_changed = {}
+        try:
+            SCons.SConsign.File(file, SCons.dblite)
+
+            f = SCons.SConsign.DB(DummyNode('dir'))
+            f.set_entry('foo', DummySConsignEntry('foo'))
+
+            # Another process writes another entry of the directory.
+            other = SCons.dblite.open(file, "w")
+            entries = {'bar' : DummySConsignEntry('bar')}
+            other['dir'] = SCons.SConsign.encode_entries(entries)
+            other.sync()
+
+            SCons.SConsign.write()
+
+            db = SCons.dblite.open(file, "r")
+            entries, encoded = SCons.SConsign.decode_entries(db['dir'])
+            assert sorted(encoded.keys()) == ['bar', 'foo'], encoded
+            assert pickle.loads(encoded['foo']).name == 'foo'
+            assert pickle.loads(encoded['bar']).name == 'bar'
+
+            # Reset() forgets what was changed, so that the next build
+            # (with --interactive) doesn't merge it again.
+            assert SCons.SConsign.DB_changed, SCons.SConsign.DB_changed
+            SCons.SConsign.Reset()
+            assert SCons.SConsign.DB_changed == {}, SCons.SConsign.DB_changed
+        finally:
+            SCons.SConsign.DB_sync_list = save_sync_list
+            SCons.SConsign.DB_changed = save_changed
+
 
 
 if __name__ == "__main__":
@@ -387,6 +652,8 @@ if __name__ == "__main__":
         BaseTestCase,
         SConsignDBTestCase,
         SConsignDirFileTestCase,
+        EntriesFormatTestCase,
+        CSigCacheTestCase,
         SConsignFileTestCase,
         writeTestCase,
     ]
@@ -24,6 +24,7 @@ __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
 import SCons.Node.FS
 import SCons.Scanner
+import SCons.Util
 
 def only_dirs(nodes):
     is_Dir = lambda n: isinstance(n.disambiguate(), SCons.Node.FS.Dir)
@@ -62,6 +63,13 @@ skip_entry_list = [
    '.sconsign.db',
 ]
 
+# The same files for the other hash formats (see
+# SCons.SConsign.sconsign_filename()).
+skip_entry_list = skip_entry_list + [
+    skip.replace('.sconsign', '.sconsign_' + hash_format, 1)
+    for hash_format in SCons.Util.hash_formats if hash_format != 'md5'
+    for skip in skip_entry_list[2:]]
+
 for skip in skip_entry_list:
     skip_entry[skip] = 1
     skip_entry[SCons.Node.FS._my_normcase(skip)] = 1
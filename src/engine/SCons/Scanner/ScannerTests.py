@@ -28,6 +28,7 @@ import collections
 import sys
 import unittest
 
+import TestCmd
 import TestUnit
 
 import SCons.Scanner
@@ -559,6 +560,30 @@ class ClassicTestCase(unittest.TestCase):
         ret = s.function(n, env, ('foo5',))
         assert ret == ['jkl', 'mno'], ret
 
+    def test_prescan(self):
+        """Test the Scanner.Classic prescan() method"""
+        class MyNode(object):
+            def __init__(self):
+                self.includes = None
+            def exists(self):
+                raise AssertionError("exists() called")
+            def get_text_contents(self):
+                raise AssertionError("get_text_contents() called")
+
+        test = TestCmd.TestCmd(workdir = '')
+        test.write('f1', 'my_inc abc\nmy_inc def\n')
+        s = SCons.Scanner.Classic("t", ['.suf'], 'MYPATH', '^my_inc (\S+)')
+
+        # It only reads the names of the includes, from the file.
+        n = MyNode()
+        s.prescan(n, test.workpath('f1'))
+        assert n.includes == ['abc', 'def'], n.includes
+
+        # A file that can't be read is left to scan().
+        n = MyNode()
+        s.prescan(n, test.workpath('does_not_exist'))
+        assert n.includes is None, n.includes
+
     def test_recursive(self):
         """Test the Scanner.Classic class recursive flag"""
         nodes = [1, 2, 3, 4]
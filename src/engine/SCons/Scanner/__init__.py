@@ -312,6 +312,17 @@ class Current(Base):
         kw['scan_check'] = current_check
         Base.__init__(self, *args, **kw)
 
+class _Contents(object):
+    """
+    The text of a source file that Classic.prescan() read, which stands
+    in for its Node when looking for the names of the included files.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def get_text_contents(self):
+        return self.text
+
 class Classic(Current):
     """
     A Scanner subclass to contain the common logic for classic CPP-style
@@ -357,16 +368,40 @@ class Classic(Current):
     def find_include_names(self, node):
         return self.cre.findall(node.get_text_contents())
 
-    def scan(self, node, path=()):
-
+    def get_include_names(self, node):
         # cache the includes list in node so we only scan it once:
-        if node.includes is not None:
-            includes = node.includes
-        else:
+        if node.includes is None:
             includes = self.find_include_names(node)
             # Intern the names of the include files. Saves some memory
             # if the same header is included many times.
             node.includes = list(map(SCons.Util.silent_intern, includes))
+        return node.includes
+
+    def prescan(self, node, path):
+        """Reads the names of the files a node includes from the file
+        'path' ahead of the scan, so that scan() finds them cached in
+        the node.
+
+        This is called from worker threads in a parallel build (see
+        SCons.Job.Prescanner), so only do thread safe stuff here.
+        The node has to be left alone apart from setting its includes:
+        whether it exists (and its duplication into a VariantDir) gets
+        settled before it's queued, finding the included files can
+        create Nodes, and so on, so that's left to scan().
+        """
+        try:
+            with open(path, 'rb') as f:
+                contents = f.read()
+        except EnvironmentError:
+            # scan() reports it, if it still can't be read.
+            return
+        text = SCons.Node.FS.decode_text(contents)
+        includes = self.find_include_names(_Contents(text))
+        node.includes = list(map(SCons.Util.silent_intern, includes))
+
+    def scan(self, node, path=()):
+
+        includes = self.get_include_names(node)
 
         # This is a hand-coded DSU (decorate-sort-undecorate, or
         # Schwartzian transform) pattern.  The sort key is the raw name
@@ -161,6 +161,11 @@ version                 Prints SCons version information.
         import SCons.SConsign
         import SCons.Script.Main
 
+        monitor = self.monitor
+        if monitor is not None:
+            for node in monitor.start_build():
+                self.clear_node(node)
+
         options = copy.deepcopy(self.options)
 
         options, targets = self.parser.parse_args(argv[1:], values=options)
@@ -247,13 +252,17 @@ version                 Prints SCons version information.
             while n:
                 n = walker.get_next()
 
+        # If we're watching the source files for changes, the ones that
+        # didn't change keep their cached information.
+        if monitor is not None:
+            monitor.finish_build()
+
         for node in list(seen_nodes.keys()):
-            # Call node.clear() to clear most of the state
-            node.clear()
-            # node.clear() doesn't reset node.state, so call
-            # node.set_state() to reset it manually
-            node.set_state(SCons.Node.no_state)
-            node.implicit = None
+            if monitor is not None and monitor.keep(node):
+                node.set_state(SCons.Node.no_state)
+                node.implicit = None
+            else:
+                self.clear_node(node)
 
             # Debug:  Uncomment to verify that all Taskmaster reference
             # counts have been reset to zero.
@@ -261,9 +270,21 @@ version                 Prints SCons version information.
             #    from SCons.Debug import Trace
             #    Trace('node %s, ref_count %s !!!\n' % (node, node.ref_count))
 
+        if monitor is not None:
+            monitor.watch(list(seen_nodes.keys()))
+
         SCons.SConsign.Reset()
         SCons.Script.Main.progress_display("scons: done clearing node information.")
 
+    def clear_node(self, node):
+        import SCons.Node
+        # Call node.clear() to clear most of the state
+        node.clear()
+        # node.clear() doesn't reset node.state, so call
+        # node.set_state() to reset it manually
+        node.set_state(SCons.Node.no_state)
+        node.implicit = None
+
     def do_clean(self, argv):
         """\
         clean [TARGETS]         Clean (remove) the specified TARGETS
@@ -360,14 +381,19 @@ version                 Prints SCons version information.
         """
         sys.stdout.write(self.parser.version + '\n')
 
-def interact(fs, parser, options, targets, target_top):
+def interact(fs, parser, options, targets, target_top, monitor=None):
     c = SConsInteractiveCmd(prompt = 'scons>>> ',
                             fs = fs,
                             parser = parser,
                             options = options,
                             targets = targets,
-                            target_top = target_top)
-    c.cmdloop()
+                            target_top = target_top,
+                            monitor = monitor)
+    try:
+        c.cmdloop()
+    finally:
+        if monitor is not None:
+            monitor.close()
 
 # Local Variables:
 # tab-width:4
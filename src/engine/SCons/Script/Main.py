@@ -65,6 +65,7 @@ import SCons.Util
 import SCons.Warnings
 
 import SCons.Script.Interactive
+import SCons.Script.Monitor
 
 
 def fetch_win32_parallel_msg():
@@ -202,7 +203,11 @@ class BuildTask(SCons.Taskmaster.OutOfDateTask):
         global this_build_status
         if self.options.ignore_errors:
             SCons.Taskmaster.OutOfDateTask.executed(self)
-        elif self.options.keep_going:
+            return
+        # Remember the failure for --schedule=failed-first.
+        for t in self.targets:
+            self.record_failure(t)
+        if self.options.keep_going:
             SCons.Taskmaster.OutOfDateTask.fail_continue(self)
             exit_status = status
             this_build_status = status
@@ -865,6 +870,9 @@ def _main(parser):
     if options.diskcheck:
         SCons.Node.FS.set_diskcheck(options.diskcheck)
 
+    if options.hash_format:
+        SCons.Util.set_hash_format(options.hash_format)
+
     # Next, we want to create the FS object that represents the outside
     # world's file system, as that's central to a lot of initialization.
     # To do this, however, we need to be in the directory from which we
@@ -1094,8 +1102,15 @@ def _main(parser):
     platform = SCons.Platform.platform_module()
 
     if options.interactive:
+        monitor = None
+        if options.watch:
+            monitor = SCons.Script.Monitor.get_monitor()
+            if monitor is None:
+                msg = "watching files for changes is unsupported on this platform;\n" + \
+                      "\tignoring --watch option.\n"
+                SCons.Warnings.warn(SCons.Warnings.NoWatchSupportWarning, msg)
         SCons.Script.Interactive.interact(fs, OptionsParser, options,
-                                          targets, target_top)
+                                          targets, target_top, monitor)
 
     else:
 
@@ -1121,12 +1136,18 @@ def _build_targets(fs, options, targets, target_top):
     if options.diskcheck:
         SCons.Node.FS.set_diskcheck(options.diskcheck)
 
+    if options.hash_format:
+        SCons.Util.set_hash_format(options.hash_format)
+
     SCons.CacheDir.cache_enabled = not options.cache_disable
     SCons.CacheDir.cache_readonly = options.cache_readonly
     SCons.CacheDir.cache_debug = options.cache_debug
     SCons.CacheDir.cache_force = options.cache_force
     SCons.CacheDir.cache_show = options.cache_show
 
+    if options.csig_cache and SCons.SConsign.csig_cache is None:
+        SCons.SConsign.CSigCacheFile(os.path.abspath(options.csig_cache))
+
     if options.no_exec:
         CleanTask.execute = CleanTask.show
     else:
@@ -1246,7 +1267,9 @@ def _build_targets(fs, options, targets, target_top):
         tmtrace = open(options.taskmastertrace_file, 'w')
     else:
         tmtrace = None
-    taskmaster = SCons.Taskmaster.Taskmaster(nodes, task_class, order, tmtrace)
+    taskmaster = SCons.Taskmaster.Taskmaster(nodes, task_class, order, tmtrace,
+                                             critical_path='critical-path' in options.schedule,
+                                             failed_first='failed-first' in options.schedule)
 
     # Let the BuildTask objects get at the options to respond to the
     # various print_* settings, tree_printer list, etc.
@@ -1257,7 +1280,10 @@ def _build_targets(fs, options, targets, target_top):
     # to check if python configured with threads.
     global num_jobs
     num_jobs = options.num_jobs
-    jobs = SCons.Job.Jobs(num_jobs, taskmaster)
+    jobs = SCons.Job.Jobs(num_jobs, taskmaster, options.function_processes,
+                          options.load_average, options.jobserver,
+                          options.command_loop, options.prescan,
+                          hash_sources=task_class is not CleanTask)
     if num_jobs > 1:
         msg = None
         if sys.platform == 'win32':
@@ -1267,6 +1293,22 @@ def _build_targets(fs, options, targets, target_top):
                   "\tignoring -j or num_jobs option.\n"
         if msg:
             SCons.Warnings.warn(SCons.Warnings.NoParallelSupportWarning, msg)
+        elif options.function_processes and not jobs.function_processes:
+            msg = "function processes are unsupported on this platform;\n" + \
+                  "\tignoring --function-processes option.\n"
+            SCons.Warnings.warn(SCons.Warnings.NoParallelSupportWarning, msg)
+        if jobs.num_jobs > 1 and options.load_average > 0 and not jobs.max_load:
+            msg = "the load average is unavailable on this platform;\n" + \
+                  "\tignoring -l or load_average option.\n"
+            SCons.Warnings.warn(SCons.Warnings.NoParallelSupportWarning, msg)
+        if jobs.num_jobs > 1 and options.jobserver and not jobs.jobserver:
+            msg = "make jobservers are unsupported on this platform;\n" + \
+                  "\tignoring --jobserver option.\n"
+            SCons.Warnings.warn(SCons.Warnings.NoParallelSupportWarning, msg)
+        if jobs.num_jobs > 1 and options.command_loop and not jobs.command_loop:
+            msg = "command loops are unsupported on this platform;\n" + \
+                  "\tignoring --command-loop option.\n"
+            SCons.Warnings.warn(SCons.Warnings.NoParallelSupportWarning, msg)
 
     memory_stats.append('before building targets:')
     count_stats.append(('pre-', 'build'))
@@ -1293,6 +1335,7 @@ def _build_targets(fs, options, targets, target_top):
             if jobs.were_interrupted():
                 progress_display("scons: writing .sconsign file.")
             SCons.SConsign.write()
+            SCons.CacheDir.prune_caches()
 
     progress_display("scons: " + opening_message)
     jobs.run(postfunc = jobs_postfunc)
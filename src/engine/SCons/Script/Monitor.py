@@ -0,0 +1,279 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+__doc__ = """
+Watching source files for changes between interactive builds.
+
+Interactive mode clears the cached information of every Node after
+each build, so that the next build looks at the file system again.
+A ChangeMonitor watches the directories of the source files with
+Linux inotify instead, so that the Nodes of the source files that
+haven't changed since they were last looked at keep their cached
+information (their stat() results, content signatures and the names
+of the files they include), and the next build doesn't stat, hash or
+read them again.
+"""
+
+import errno
+import os
+import struct
+import sys
+
+import SCons.Node.FS
+
+# inotify_add_watch() event masks, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_CLOEXEC = 0o2000000
+
+# Anything that can change the contents or times of the files in a
+# directory, or replace them.
+watch_mask = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | \
+             IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | \
+             IN_ONLYDIR
+
+# The events after which a watch, and so everything in its directory,
+# can't be trusted any more.
+lost_mask = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+_event_header = struct.Struct('iIII')
+
+
+def _fsencode(path):
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding() or 'utf-8')
+
+def _fsdecode(name):
+    if sys.version_info[0] == 2:
+        return name
+    return name.decode(sys.getfilesystemencoding() or 'utf-8',
+                       'surrogateescape')
+
+
+class Inotify(object):
+    """A non-blocking Linux inotify instance, through ctypes.
+
+    Raises EnvironmentError if inotify isn't available.
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise EnvironmentError(errno.ENOSYS,
+                                   "inotify is only available on Linux")
+        try:
+            import ctypes
+            import ctypes.util
+            libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+            self.libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self.libc.inotify_init1
+        except (ImportError, OSError, AttributeError) as e:
+            raise EnvironmentError(errno.ENOSYS, str(e))
+        self.fd = init(os.O_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise EnvironmentError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=watch_mask):
+        """Returns the watch descriptor for the directory 'path', or
+        None if it can't be watched (it isn't a directory, or there
+        are no more watches)."""
+        wd = self.libc.inotify_add_watch(self.fd, _fsencode(path), mask)
+        if wd < 0:
+            return None
+        return wd
+
+    def read_events(self):
+        """Returns a list of the (wd, mask, name) tuples of the events
+        that are waiting, without blocking."""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not buf:
+                break
+            offset = 0
+            while offset + _event_header.size <= len(buf):
+                wd, mask, cookie, length = \
+                    _event_header.unpack_from(buf, offset)
+                offset = offset + _event_header.size
+                name = buf[offset:offset + length].rstrip(b'\0')
+                offset = offset + length
+                events.append((wd, mask, _fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class ChangeMonitor(object):
+    """Keeps track of which source files changed between interactive
+    builds, and which source file Nodes may keep their cached
+    information.
+
+    A Node is only kept if every directory its file can come from (see
+    paths()) was already being watched before the build that looked at
+    it started, and nothing happened to the file since.  Everything else,
+    including the Nodes of directories and of built files, still gets
+    cleared after every build.  If the kernel drops events, or a watched
+    directory goes away, the Nodes that may be affected are cleared.
+    """
+
+    def __init__(self, inotify):
+        self.inotify = inotify
+        # The build number of each watched directory when its watch
+        # was added, and the directories of each watch descriptor.
+        self.watched = {}
+        self.wd_dirs = {}
+        self.build = 0
+        # The Nodes that were kept after the last build.
+        self.kept = set()
+        self.changed_paths = set()
+        self.changed_dirs = set()
+        self.overflow = False
+
+    def paths(self, node):
+        """Returns the paths of the files that the cached information
+        of a source file Node depends on: its own, and those of its
+        source directory and Repository counterparts."""
+        paths = set([node.get_abspath()])
+        for other in (node.srcnode(), node.rfile()):
+            if other is not node:
+                paths.add(other.get_abspath())
+        return paths
+
+    def poll(self):
+        """Reads the events that are waiting."""
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+            dirs = self.wd_dirs.get(wd, [])
+            if mask & lost_mask:
+                for dir in dirs:
+                    self.changed_dirs.add(dir)
+                    self.watched.pop(dir, None)
+                self.wd_dirs.pop(wd, None)
+            elif name:
+                for dir in dirs:
+                    self.changed_paths.add(os.path.join(dir, name))
+
+    def is_changed(self, node):
+        if self.overflow:
+            return True
+        for path in self.paths(node):
+            if path in self.changed_paths or \
+               os.path.dirname(path) in self.changed_dirs:
+                return True
+        return False
+
+    def start_build(self):
+        """Gets ready for a build.  Returns the kept Nodes whose files
+        changed since they were kept, which need to be cleared."""
+        self.poll()
+        changed = [node for node in self.kept if self.is_changed(node)]
+        for node in changed:
+            self.kept.discard(node)
+        self.changed_paths = set()
+        self.changed_dirs = set()
+        self.overflow = False
+        self.build = self.build + 1
+        return changed
+
+    def finish_build(self):
+        """Reads the events of the build that just finished, so that
+        keep() can tell which files changed during it."""
+        self.poll()
+
+    def keep(self, node):
+        """Returns whether 'node' may keep its cached information for
+        the next build, and remembers it if so."""
+        if not isinstance(node, SCons.Node.FS.File) or node.has_builder():
+            self.kept.discard(node)
+            return False
+        for path in self.paths(node):
+            if self.watched.get(os.path.dirname(path), self.build) \
+               >= self.build:
+                # Something may have happened to the file before we
+                # started watching its directory.
+                self.kept.discard(node)
+                return False
+        if self.is_changed(node):
+            self.kept.discard(node)
+            return False
+        self.kept.add(node)
+        return True
+
+    def watch(self, nodes):
+        """Watches the directories of the given source file Nodes."""
+        for node in nodes:
+            if not isinstance(node, SCons.Node.FS.File) or \
+               node.has_builder():
+                continue
+            for path in self.paths(node):
+                dir = os.path.dirname(path)
+                if dir in self.watched:
+                    continue
+                wd = self.inotify.add_watch(dir)
+                if wd is None:
+                    continue
+                self.watched[dir] = self.build
+                self.wd_dirs.setdefault(wd, []).append(dir)
+
+    def close(self):
+        self.inotify.close()
+        self.kept = set()
+
+
+def get_monitor():
+    """Returns a new ChangeMonitor, or None if this platform can't
+    watch files for changes."""
+    try:
+        return ChangeMonitor(Inotify())
+    except EnvironmentError:
+        return None
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,182 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+ 
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+import os
+import unittest
+
+import TestCmd
+import TestUnit
+
+import SCons.Node.FS
+import SCons.Script.Monitor
+from SCons.Script.Monitor import IN_MODIFY, IN_DELETE_SELF, IN_Q_OVERFLOW
+
+
+class FakeInotify(object):
+    def __init__(self):
+        self.wds = {}
+        self.events = []
+        self.closed = False
+    def add_watch(self, path):
+        wd = len(self.wds) + 1
+        self.wds[path] = wd
+        return wd
+    def read_events(self):
+        events = self.events
+        self.events = []
+        return events
+    def close(self):
+        self.closed = True
+
+
+class ChangeMonitorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test = TestCmd.TestCmd(workdir='')
+        self.test.subdir('src')
+        self.test.write(['src', 'foo.c'], "foo.c\n")
+        self.test.write(['src', 'bar.c'], "bar.c\n")
+        self.fs = SCons.Node.FS.FS(self.test.workpath(''))
+        self.foo = self.fs.File('src/foo.c')
+        self.bar = self.fs.File('src/bar.c')
+        self.inotify = FakeInotify()
+        self.monitor = SCons.Script.Monitor.ChangeMonitor(self.inotify)
+        self.src = self.test.workpath('src')
+
+    def build(self, *nodes):
+        """Goes through a build that looks at the given Nodes, and
+        returns the Nodes that were kept after it."""
+        m = self.monitor
+        m.start_build()
+        m.finish_build()
+        kept = [n for n in nodes if m.keep(n)]
+        m.watch(nodes)
+        return kept
+
+    def test_keep(self):
+        """Test that source files are only kept once watched"""
+        assert self.build(self.foo, self.bar) == []
+        assert self.inotify.wds == {self.src: 1}, self.inotify.wds
+        assert self.build(self.foo, self.bar) == [self.foo, self.bar]
+        assert self.build(self.foo) == [self.foo]
+
+    def test_keep_built(self):
+        """Test that built files and directories are never kept"""
+        env_node = self.fs.File('src/foo.o')
+        env_node.builder_set(object())
+        dir = self.fs.Dir('src')
+        self.build(env_node, dir)
+        assert self.inotify.wds == {}, self.inotify.wds
+        assert self.build(env_node, dir) == []
+
+    def test_changed(self):
+        """Test that changed kept Nodes are returned to be cleared"""
+        self.build(self.foo, self.bar)
+        self.build(self.foo, self.bar)
+        self.inotify.events.append((1, IN_MODIFY, 'foo.c'))
+        assert self.monitor.start_build() == [self.foo]
+        assert self.monitor.kept == set([self.bar])
+        # The cleared Node gets looked at again by this build, so it
+        # can be kept after it.
+        self.monitor.finish_build()
+        assert self.monitor.keep(self.foo)
+        assert self.monitor.keep(self.bar)
+
+    def test_changed_during_build(self):
+        """Test that files that change during a build aren't kept"""
+        self.build(self.foo, self.bar)
+        m = self.monitor
+        m.start_build()
+        self.inotify.events.append((1, IN_MODIFY, 'bar.c'))
+        m.finish_build()
+        assert m.keep(self.foo)
+        assert not m.keep(self.bar)
+
+    def test_lost_watch(self):
+        """Test that a directory that goes away clears its Nodes"""
+        self.build(self.foo, self.bar)
+        self.build(self.foo, self.bar)
+        self.inotify.events.append((1, IN_DELETE_SELF, ''))
+        changed = self.monitor.start_build()
+        assert sorted(changed) == sorted([self.foo, self.bar]), changed
+        assert self.src not in self.monitor.watched
+        self.monitor.finish_build()
+        assert not self.monitor.keep(self.foo)
+
+    def test_overflow(self):
+        """Test that dropped events clear every kept Node"""
+        self.build(self.foo, self.bar)
+        self.build(self.foo, self.bar)
+        self.inotify.events.append((-1, IN_Q_OVERFLOW, ''))
+        changed = self.monitor.start_build()
+        assert sorted(changed) == sorted([self.foo, self.bar]), changed
+
+    def test_close(self):
+        """Test closing a ChangeMonitor"""
+        self.build(self.foo)
+        self.build(self.foo)
+        self.monitor.close()
+        assert self.inotify.closed
+        assert self.monitor.kept == set()
+
+
+class InotifyTestCase(unittest.TestCase):
+
+    def test_events(self):
+        """Test reading inotify events"""
+        try:
+            inotify = SCons.Script.Monitor.Inotify()
+        except EnvironmentError:
+            return
+        test = TestCmd.TestCmd(workdir='')
+        try:
+            wd = inotify.add_watch(test.workpath(''))
+            assert wd is not None
+            assert inotify.read_events() == []
+            test.write('file', "file\n")
+            events = inotify.read_events()
+            names = [name for w, mask, name in events if w == wd]
+            assert 'file' in names, events
+            assert inotify.add_watch(test.workpath('file')) is None
+        finally:
+            inotify.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite()
+    tclasses = [
+        ChangeMonitorTestCase,
+        InotifyTestCase,
+    ]
+    for tclass in tclasses:
+        names = unittest.getTestCaseNames(tclass, 'test_')
+        suite.addTests(list(map(tclass, names)))
+    TestUnit.run(suite)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -45,6 +45,8 @@ SUPPRESS_HELP           = optparse.SUPPRESS_HELP
 
 diskcheck_all = SCons.Node.FS.diskcheck_types()
 
+schedule_options = ["critical-path", "failed-first"]
+
 def diskcheck_convert(value):
     if value is None:
         return []
@@ -128,15 +130,23 @@ class SConsValues(optparse.Values):
 
     settable = [
         'clean',
+        'command_loop',
+        'csig_cache',
         'diskcheck',
         'duplicate',
+        'function_processes',
+        'hash_format',
         'help',
         'implicit_cache',
+        'jobserver',
+        'load_average',
         'max_drift',
         'md5_chunksize',
         'no_exec',
         'num_jobs',
+        'prescan',
         'random',
+        'schedule',
         'stack_size',
         'warn',
         'silent'
@@ -156,6 +166,11 @@ class SConsValues(optparse.Values):
                     raise ValueError
             except ValueError:
                 raise SCons.Errors.UserError("A positive integer is required: %s"%repr(value))
+        elif name == 'load_average':
+            try:
+                value = float(value)
+            except ValueError:
+                raise SCons.Errors.UserError("A number is required: %s"%repr(value))
         elif name == 'max_drift':
             try:
                 value = int(value)
@@ -181,6 +196,19 @@ class SConsValues(optparse.Values):
                 # Set this right away so it can affect the rest of the
                 # file/Node lookups while processing the SConscript files.
                 SCons.Node.FS.set_diskcheck(value)
+        elif name == 'hash_format':
+            try:
+                value = str(value)
+            except ValueError:
+                raise SCons.Errors.UserError("A string is required: %s"%repr(value))
+            if 'hash_format' not in self.__dict__:
+                # No --hash-format= option was specified on the command
+                # line.  Set this right away, before any signatures get
+                # computed while processing the SConscript files.
+                try:
+                    SCons.Util.set_hash_format(value)
+                except ValueError as e:
+                    raise SCons.Errors.UserError(str(e))
         elif name == 'stack_size':
             try:
                 value = int(value)
@@ -191,6 +219,12 @@ class SConsValues(optparse.Values):
                 value = int(value)
             except ValueError:
                 raise SCons.Errors.UserError("An integer is required: %s"%repr(value))
+        elif name == 'schedule':
+            if SCons.Util.is_String(value):
+                value = value.split(',')
+            for v in value:
+                if v not in schedule_options:
+                    raise SCons.Errors.UserError("Not a valid schedule value: %s" % v)
         elif name == 'warn':
             if SCons.Util.is_String(value):
                 value = [value]
@@ -613,6 +647,11 @@ def Parser(version):
                   action="store_true",
                   help="Print build actions for files from CacheDir.")
 
+    op.add_option('--command-loop',
+                  dest='command_loop', default=False,
+                  action="store_true",
+                  help="Wait for the commands of parallel jobs in one thread.")
+
     def opt_invalid(group, value, options):
         errmsg  = "`%s' is not a valid %s option type, try:\n" % (value, group)
         return errmsg + "    %s" % ", ".join(options)
@@ -628,6 +667,13 @@ def Parser(version):
                   help = opt_config_help,
                   metavar="MODE")
 
+    op.add_option('--csig-cache',
+                  nargs=1, type="string",
+                  dest="csig_cache", default=None,
+                  action="store",
+                  help="Cache the content signatures of files in FILE.",
+                  metavar="FILE")
+
     op.add_option('-D',
                   dest="climb_up", default=None,
                   action="store_const", const=2,
@@ -712,6 +758,11 @@ def Parser(version):
                   action="append",
                   help="Read FILE as the top-level SConstruct file.")
 
+    op.add_option('--function-processes',
+                  dest='function_processes', default=False,
+                  action="store_true",
+                  help="Run Python function actions in N processes with -j N.")
+
     op.add_option('-h', '--help',
                   dest="help", default=False,
                   action="store_true",
@@ -721,6 +772,23 @@ def Parser(version):
                   action="help",
                   help="Print this message and exit.")
 
+    def opt_hash_format(option, opt, value, parser):
+        try:
+            SCons.Util.set_hash_format(value)
+        except ValueError as e:
+            raise OptionValueError(str(e))
+        setattr(parser.values, option.dest, value)
+
+    opt_hash_format_help = "Set the hash format of content signatures: %s." \
+                           % ", ".join(SCons.Util.hash_formats)
+
+    op.add_option('--hash-format',
+                  nargs=1, type="string",
+                  dest='hash_format', default=None,
+                  action="callback", callback=opt_hash_format,
+                  help=opt_hash_format_help,
+                  metavar="FORMAT")
+
     op.add_option('-i', '--ignore-errors',
                   dest='ignore_errors', default=False,
                   action="store_true",
@@ -764,11 +832,23 @@ def Parser(version):
                   help="Allow N jobs at once.",
                   metavar="N")
 
+    op.add_option('--jobserver',
+                  dest="jobserver", default=False,
+                  action="store_true",
+                  help="Share job slots with commands through a make jobserver.")
+
     op.add_option('-k', '--keep-going',
                   dest='keep_going', default=False,
                   action="store_true",
                   help="Keep going when a target can't be made.")
 
+    op.add_option('-l', '--load-average', '--max-load',
+                  nargs=1, type="float",
+                  dest="load_average", default=0,
+                  action="store",
+                  help="Don't start multiple jobs unless load is below N.",
+                  metavar="N")
+
     op.add_option('--max-drift',
                   nargs=1, type="int",
                   dest='max_drift', default=SCons.Node.FS.default_max_drift,
@@ -793,6 +873,11 @@ def Parser(version):
                   action="store_true",
                   help="Don't search or use the usual site_scons dir.")
 
+    op.add_option('--prescan',
+                  dest='prescan', default=False,
+                  action="store_true",
+                  help="Read the includes of sources ahead of parallel jobs.")
+
     op.add_option('--profile',
                   nargs=1,
                   dest="profile_file", default=None,
@@ -820,6 +905,22 @@ def Parser(version):
                   action="store_true",
                   help="Don't print commands.")
 
+    def opt_schedule(option, opt, value, parser):
+        for v in value.split(','):
+            if v not in schedule_options:
+                raise OptionValueError(opt_invalid('schedule', v, schedule_options))
+            parser.values.schedule.append(v)
+
+    opt_schedule_help = "Choose the order in which ready targets are built: %s." \
+                        % ", ".join(schedule_options)
+
+    op.add_option('--schedule',
+                  nargs=1, type="string",
+                  dest="schedule", default=[],
+                  action="callback", callback=opt_schedule,
+                  help=opt_schedule_help,
+                  metavar="MODE")
+
     op.add_option('--site-dir',
                   nargs=1,
                   dest='site_dir', default=None,
@@ -900,6 +1001,12 @@ def Parser(version):
                   help="Enable or disable warnings.",
                   metavar="WARNING-SPEC")
 
+    op.add_option('--watch',
+                  dest="watch", default=False,
+                  action="store_true",
+                  help="Watch source files for changes between "
+                       "interactive builds.")
+
     op.add_option('-Y', '--repository', '--srcdir',
                   nargs=1,
                   dest="repository", default=[],
@@ -915,14 +1022,6 @@ def Parser(version):
         msg = "Warning:  the %s option is not yet implemented\n" % opt
         sys.stderr.write(msg)
 
-    op.add_option('-l', '--load-average', '--max-load',
-                  nargs=1, type="float",
-                  dest="load_average", default=0,
-                  action="callback", callback=opt_not_yet,
-                  # action="store",
-                  # help="Don't start multiple jobs unless load is below "
-                  #      "LOAD-AVERAGE."
-                  help=SUPPRESS_HELP)
     op.add_option('--list-actions',
                   dest="list_actions",
                   action="callback", callback=opt_not_yet,
@@ -340,6 +340,7 @@ GlobalDefaultEnvironmentFunctions = [
     'PyPackageDir',
     'Repository',
     'Requires',
+    'ResourcePool',
     'SConsignFile',
     'SideEffect',
     'SourceCode',
@@ -57,8 +57,10 @@ __doc__ = """
 __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
 from itertools import chain
+import heapq
 import operator
 import sys
+import time
 import traceback
 
 import SCons.Errors
@@ -118,6 +120,30 @@ def dump_stats():
 
 
 
+class ResourcePool(object):
+    """
+    A named limit on the number of tasks that get built at the same
+    time, for tasks that use a lot of some resource (like the memory
+    used by linkers).  A pool without a size doesn't limit anything.
+    """
+    def __init__(self, name, size=None):
+        self.name = name
+        self.size = size
+
+resource_pools = {}
+
+def get_resource_pool(name):
+    """Returns the ResourcePool with the specified name, creating it
+    (without a size) if it doesn't exist yet."""
+    try:
+        return resource_pools[name]
+    except KeyError:
+        pool = ResourcePool(name)
+        resource_pools[name] = pool
+        return pool
+
+
+
 class Task(object):
     """
     Default SCons build engine task.
@@ -142,6 +168,7 @@ class Task(object):
         self.targets = targets
         self.top = top
         self.node = node
+        self.post_built = False
         self.exc_clear()
 
     def trace_message(self, method, node, description='node'):
@@ -252,7 +279,10 @@ class Task(object):
                         t.fs.unlink(t.get_internal_path())
                     except (IOError, OSError):
                         pass
-                self.targets[0].build()
+                start_time = time.time()
+                self.build()
+                self.execution_time = time.time() - start_time
+                self.post_build()
             else:
                 for t in cached_targets:
                     t.cached = 1
@@ -269,6 +299,102 @@ class Task(object):
             buildError.exc_info = sys.exc_info()
             raise buildError
 
+    def build(self):
+        """
+        Builds the targets of this task that couldn't be retrieved
+        from a CacheDir.
+
+        Like execute(), this is called from multiple threads in a
+        parallel build.  Job classes that run the actions elsewhere
+        replace it on the task (see SCons.Job.ProcessPool).
+        """
+        self.targets[0].build()
+
+    def post_build(self):
+        """
+        Finishes up the targets of this task after they were built,
+        before executed() gets called.
+
+        Like execute(), this is called from multiple threads in a
+        parallel build.  Pushing the targets to a CacheDir and hashing
+        their new contents happen here, so that they don't hold up the
+        thread that walks the dependency graph.  Everything else,
+        including all updates of the .sconsign, still happens in
+        executed().
+        """
+        for t in self.targets:
+            if t.get_state() == NODE_EXECUTING:
+                t.post_build()
+        self.post_built = True
+
+    def record_execution_time(self, node):
+        """
+        Records the wall-clock time it took to build our targets in
+        the stored build information of the specified target Node,
+        so that it ends up in the .sconsign file for critical-path
+        scheduling of later builds.
+
+        This must be called after the Node's built() and visited()
+        methods, which replace its build information; targets that
+        were retrieved from a CacheDir keep the time of their last
+        real build.
+        """
+        try:
+            seconds = self.execution_time
+        except AttributeError:
+            return
+        try:
+            node.get_stored_info().binfo.bexectime = seconds
+        except AttributeError:
+            pass
+
+    def record_failure(self, node):
+        """
+        Records that building the specified target Node failed in its
+        stored build information, so that failed-first scheduling of
+        later builds starts with it.
+
+        Nothing else of the stored build information changes, so the
+        Node stays out of date, and the entry goes straight to the
+        .sconsign file, because the Node doesn't get stored otherwise.
+
+        Nothing gets recorded when the build was interrupted, because
+        then the Node didn't really fail.
+        """
+        if self.tm.interrupted:
+            return
+        exc_type = self.exception[0]
+        if not isinstance(exc_type, type):
+            exc_type = exc_type.__class__
+        if issubclass(exc_type, (KeyboardInterrupt, SystemExit)):
+            return
+        if not (node.has_builder() and getattr(node, 'store_info', 0) and
+                SCons.Node.do_store_info):
+            return
+        try:
+            entry = node.get_stored_info()
+            entry.binfo.bfailed = 1
+            node.dir.sconsign().set_entry(node.name, entry)
+        except AttributeError:
+            pass
+
+    def clear_failure(self, node):
+        """
+        Removes a failure recorded by record_failure() from the stored
+        build information of the specified target Node, once it's been
+        built or found up-to-date.
+
+        Like record_execution_time(), this must be called after the
+        Node's visited() method, which merges its new build information
+        into the stored one.
+        """
+        try:
+            binfo = node.get_stored_info().binfo
+            if getattr(binfo, 'bfailed', None):
+                del binfo.bfailed
+        except AttributeError:
+            pass
+
     def executed_without_callbacks(self):
         """
         Called when the task has been successfully executed
@@ -308,15 +434,18 @@ class Task(object):
                 for side_effect in t.side_effects:
                     side_effect.set_state(NODE_NO_STATE)
                 t.set_state(NODE_EXECUTED)
-                if not t.cached:
+                if not t.cached and not self.post_built:
                     t.push_to_cache()
                 t.built()
                 t.visited()
+                self.record_execution_time(t)
+                self.clear_failure(t)
                 if (not print_prepare and
                     (not hasattr(self, 'options') or not self.options.debug_includes)):
                     t.release_target_info()
             else:
                 t.visited()
+                self.clear_failure(t)
 
     executed = executed_with_callbacks
 
@@ -460,6 +589,9 @@ class Task(object):
 
         pending_children = self.tm.pending_children
         parents = {}
+        # Parents that were waiting on a side effect rather than on
+        # their children, and so have to walk their children again.
+        se_parents = set()
         for t in targets:
             # A node can only be in the pending_children set if it has
             # some waiting_parents.
@@ -478,6 +610,7 @@ class Task(object):
                         s.set_state(NODE_NO_STATE)
                         for p in s.waiting_parents:
                             parents[p] = parents.get(p, 0) + 1
+                            se_parents.add(p)
                     for p in s.waiting_s_e:
                         if p.ref_count == 0:
                             self.tm.candidates.append(p)
@@ -488,11 +621,15 @@ class Task(object):
                                              p,
                                              'adjusted parent ref count'))
             if p.ref_count == 0:
+                if p not in se_parents:
+                    self.tm.children_done.add(p)
                 self.tm.candidates.append(p)
 
         for t in targets:
             t.postprocess()
 
+        self.tm.release_resource_pool(self.node)
+
     # Exception handling subsystem.
     #
     # Exceptions that occur while walking the DAG or examining Nodes
@@ -606,7 +743,13 @@ class Taskmaster(object):
     The Taskmaster for walking the dependency DAG.
     """
 
-    def __init__(self, targets=[], tasker=None, order=None, trace=None):
+    # How many ready Nodes critical-path and failed-first scheduling
+    # queue up before handing out the one with the highest priority,
+    # instead of walking all the candidates first.
+    ready_lookahead = 64
+
+    def __init__(self, targets=[], tasker=None, order=None, trace=None,
+                 critical_path=False, failed_first=False):
         self.original_top = targets
         self.top_targets_left = targets[:]
         self.top_targets_left.reverse()
@@ -620,7 +763,37 @@ class Taskmaster(object):
         self.message = None
         self.trace = trace
         self.next_candidate = self.find_next_candidate
+        # Set by SCons.Job when a signal stops the build.
+        self.interrupted = False
         self.pending_children = set()
+        # The Nodes whose children we already walked, and that were put
+        # back on the candidates list because the last of the children
+        # they were waiting for is done.
+        self.children_done = set()
+        self.critical_path = critical_path
+        self.failed_first = failed_first
+        # Both kinds of scheduling pick the next Node to evaluate from
+        # a queue of all the ready Nodes.
+        self.queue_ready = critical_path or failed_first
+        # The heap of (priority..., count, node) entries, and the
+        # current entry of each queued Node (see queue_ready_node()).
+        self.ready_queue = []
+        self.ready_entries = {}
+        self.ready_count = 0
+        self.downstream_time = {}
+        self.exec_times = {}
+        self.failures = {}
+        self.failed_path = set()
+        # The number of tasks we handed out that are in each resource
+        # pool, the ready Nodes waiting for room in each pool, and the
+        # pool of the Node of each task we handed out.
+        self.pool_running = {}
+        self.pool_waiting = {}
+        self.pool_reserved = {}
+        # Reads the sources of the Nodes added to the candidates list
+        # ahead of their scans, if the Job sets one (see
+        # SCons.Job.Prescanner).
+        self.prescanner = None
 
     def find_next_candidate(self):
         """
@@ -670,6 +843,196 @@ class Taskmaster(object):
             candidates = self.candidates
             self.candidates = []
             self.will_not_build(candidates)
+        if self.ready_queue:
+            ready = [entry[-1] for entry in self.ready_queue
+                     if self.ready_entries.get(entry[-1]) is entry]
+            self.ready_queue = []
+            self.ready_entries = {}
+            self.will_not_build(ready)
+        while self.pool_waiting:
+            pool, waiting = self.pool_waiting.popitem()
+            self.will_not_build(waiting)
+        self.children_done = set()
+        return None
+
+    def resource_pool(self, node):
+        """
+        Returns the ResourcePool of the specified Node's targets, or
+        None.
+
+        A target is in the pool it was put in with the ResourcePool()
+        environment method, or else the pool named by the
+        $RESOURCE_POOL construction variable of its build environment.
+        """
+        executor = node.get_executor()
+        if executor is None:
+            return None
+        for t in executor.get_all_targets():
+            name = getattr(t.attributes, 'resource_pool', None)
+            if name is None and t.has_builder():
+                name = t.get_build_env().get('RESOURCE_POOL')
+            if name:
+                return get_resource_pool(name)
+        return None
+
+    def reserve_resource_pool(self, node):
+        """
+        Takes a place in its resource pool for a ready Node we're about
+        to hand out a task for.  Returns False if the pool is full, in
+        which case the Node waits until a task of the pool is done.
+        """
+        pool = self.resource_pool(node)
+        if pool is None:
+            return True
+        running = self.pool_running.get(pool, 0)
+        if pool.size is not None and running >= pool.size:
+            self.pool_waiting.setdefault(pool, []).append(node)
+            return False
+        self.pool_running[pool] = running + 1
+        self.pool_reserved[node] = pool
+        return True
+
+    def release_resource_pool(self, node):
+        """
+        Gives back the place in its resource pool the task of the
+        specified Node had, and puts the Nodes waiting for room in the
+        pool back on the candidates list.
+        """
+        pool = self.pool_reserved.pop(node, None)
+        if pool is None:
+            return
+        self.pool_running[pool] = self.pool_running[pool] - 1
+        waiting = self.pool_waiting.pop(pool, None)
+        if waiting:
+            waiting.reverse()
+            self.candidates.extend(waiting)
+
+    def recorded_execution_time(self, node):
+        """
+        Returns the wall-clock time (in seconds) that building the
+        specified Node took the last time it was actually built, as
+        recorded in its stored build information, or 0 if we don't
+        know.
+        """
+        try:
+            return self.exec_times[node]
+        except KeyError:
+            pass
+        seconds = 0
+        if node.has_builder():
+            try:
+                seconds = node.get_stored_info().binfo.bexectime
+            except AttributeError:
+                pass
+        self.exec_times[node] = seconds
+        return seconds
+
+    def critical_path_time(self, node):
+        """
+        Returns the length (in seconds of recorded build time) of the
+        longest path from the specified Node up through the parents
+        we've walked so far to a top-level target, including the
+        Node's own build time.
+        """
+        return (self.recorded_execution_time(node) +
+                self.downstream_time.get(node, 0))
+
+    def recorded_failure(self, node):
+        """
+        Returns whether building the specified Node failed the last
+        time, as recorded in its stored build information.
+        """
+        try:
+            return self.failures[node]
+        except KeyError:
+            pass
+        failed = False
+        if node.has_builder():
+            try:
+                failed = bool(node.get_stored_info().binfo.bfailed)
+            except AttributeError:
+                pass
+        self.failures[node] = failed
+        return failed
+
+    def on_failed_path(self, node):
+        """
+        Returns whether the specified Node failed the last time it was
+        built, or is a prerequisite of a Node we walked that did.
+        """
+        return node in self.failed_path or self.recorded_failure(node)
+
+    def add_failed_path(self, node):
+        """
+        Marks the specified Node as a prerequisite of a Node that failed
+        the last time, moving it up the queue of ready Nodes if it's
+        already there.
+        """
+        if node in self.failed_path:
+            return
+        self.failed_path.add(node)
+        if node in self.ready_entries:
+            self.queue_ready_node(node)
+
+    def add_ready_node(self, node):
+        """
+        Adds a Node whose children are all up-to-date to the queue of
+        ready Nodes, ordered by whether it's on the path to a Node that
+        failed the last time (with failed-first scheduling), and then
+        by the length of its critical path (with critical-path
+        scheduling).
+        """
+        if node in self.ready_entries:
+            return
+        self.queue_ready_node(node)
+
+    def queue_ready_node(self, node):
+        """
+        Puts a ready Node on the queue with its current priority.  This
+        is also how a queued Node moves up when its priority goes up:
+        its old entry stays in the heap, and next_ready_node() skips it.
+        """
+        failed = self.failed_first and self.on_failed_path(node)
+        path_time = 0
+        if self.critical_path:
+            path_time = self.critical_path_time(node)
+        # The running count keeps the order stable among Nodes with
+        # the same priority (in particular when nothing has been
+        # recorded yet), and keeps heapq from ever comparing Nodes.
+        self.ready_count = self.ready_count + 1
+        entry = (not failed, -path_time, self.ready_count, node)
+        self.ready_entries[node] = entry
+        heapq.heappush(self.ready_queue, entry)
+
+    def next_ready_node(self):
+        """
+        Returns the queued ready Node with the highest priority (see
+        add_ready_node()), or None if there isn't one.
+
+        Nodes that were found ready while walking the candidates list
+        haven't been made ready yet, so two of them can share a side
+        effect.  We therefore re-check side effects here and put Nodes
+        that have to wait back on the waiting list.
+        """
+        while self.ready_queue:
+            entry = heapq.heappop(self.ready_queue)
+            node = entry[-1]
+            if self.ready_entries.get(node) is not entry:
+                # It got queued again with a higher priority.
+                continue
+            del self.ready_entries[node]
+            if node.get_state() != NODE_PENDING:
+                continue
+            wait_side_effects = False
+            for se in node.get_executor().get_action_side_effects():
+                if se.get_state() == NODE_EXECUTING:
+                    se.add_to_waiting_s_e(node)
+                    wait_side_effects = True
+            if wait_side_effects:
+                continue
+            if not self.reserve_resource_pool(node):
+                continue
+            return node
         return None
 
     def _validate_pending_children(self):
@@ -775,9 +1138,28 @@ class Taskmaster(object):
         re-scanned, in order to handle generated header files (e.g.) and
         the implicit dependencies therein.
 
+        A Node that was put back on the candidates list when the last of
+        the children it was waiting for finished, without any of them
+        having been built (as in a null build), doesn't have its children
+        walked again: they're all known to be up-to-date, and the Node
+        can't have picked up new implicit dependencies, since building a
+        child is what makes its parents get re-scanned.
+
         Note that this method does not do any signature calculation or
         up-to-date check itself.  All of that is handled by the Task
         class.  This is purely concerned with the dependency graph walk.
+
+        When critical-path scheduling is enabled, ready Nodes are not
+        returned as soon as they're found.  Instead, we walk the
+        candidates list until ready_lookahead Nodes are queued (or the
+        list is empty), and then return the one with the longest path
+        (weighted by the build times recorded in the .sconsign file) to
+        a top-level target, so that long chains of work get started
+        first.
+
+        Failed-first scheduling queues the ready Nodes the same way,
+        and returns the ones that failed the last time they were built,
+        or that are prerequisites of those, before any others.
         """
 
         self.ready_exc = None
@@ -786,8 +1168,22 @@ class Taskmaster(object):
         if T: T.write(SCons.Util.UnicodeType('\n') + self.trace_message('Looking for a node to evaluate'))
 
         while True:
+            if self.queue_ready and \
+               len(self.ready_entries) >= self.ready_lookahead:
+                node = self.next_ready_node()
+                if node is not None:
+                    if T: T.write(self.trace_message(u'Evaluating %s\n' %
+                                                     self.trace_node(node)))
+                    return node
+
             node = self.next_candidate()
             if node is None:
+                if self.queue_ready:
+                    node = self.next_ready_node()
+                    if node is not None:
+                        if T: T.write(self.trace_message(u'Evaluating %s\n' %
+                                                         self.trace_node(node)))
+                        return node
                 if T: T.write(self.trace_message('No candidate anymore.') + u'\n')
                 return None
 
@@ -824,6 +1220,14 @@ class Taskmaster(object):
 
             executor = node.get_executor()
 
+            if node in self.children_done:
+                self.children_done.discard(node)
+                if state == NODE_PENDING and node.implicit is not None:
+                    if T: T.write(self.trace_message(u'       children already done'))
+                    if self._ready_node(node, executor, S):
+                        return node
+                    continue
+
             try:
                 children = executor.get_all_children()
             except SystemExit:
@@ -862,11 +1266,32 @@ class Taskmaster(object):
                 if childstate <= NODE_EXECUTING:
                     children_not_ready.append(child)
 
+            # Pass the length of the path from this node up to the
+            # top-level targets down to its children.
+            if self.critical_path:
+                path_time = self.critical_path_time(node)
+                downstream_time = self.downstream_time
+                for child in children_not_ready:
+                    if downstream_time.get(child, 0) < path_time:
+                        downstream_time[child] = path_time
+                        if child in self.ready_entries:
+                            # Its priority went up.
+                            self.queue_ready_node(child)
+
+            # Likewise pass down whether this node is on the path to a
+            # node that failed the last time.
+            if self.failed_first and self.on_failed_path(node):
+                for child in children_not_ready:
+                    self.add_failed_path(child)
+
             # These nodes have not even been visited yet.  Add
             # them to the list so that on some next pass we can
             # take a stab at evaluating them (or their children).
             children_not_visited.reverse()
-            self.candidates.extend(self.order(children_not_visited))
+            children_not_visited = self.order(children_not_visited)
+            if self.prescanner is not None and children_not_visited:
+                self.prescanner.prescan(children_not_visited)
+            self.candidates.extend(children_not_visited)
 
             # if T and children_not_visited:
             #    T.write(self.trace_message('     adding to candidates: %s' % map(str, children_not_visited)))
@@ -920,35 +1345,61 @@ class Taskmaster(object):
 
                 continue
 
-            # Skip this node if it has side-effects that are
-            # currently being built:
-            wait_side_effects = False
-            for se in executor.get_action_side_effects():
-                if se.get_state() == NODE_EXECUTING:
-                    se.add_to_waiting_s_e(node)
-                    wait_side_effects = True
+            if self._ready_node(node, executor, S):
+                return node
 
-            if wait_side_effects:
-                if S: S.side_effects = S.side_effects + 1
-                continue
+        return None
+
+    def _ready_node(self, node, executor, S):
+        """
+        Finishes the evaluation of a candidate Node whose children are
+        all up-to-date.  Returns True if the Node is to be evaluated
+        now, or False if it has to wait for a side effect that's being
+        built or for room in its resource pool, or was queued for
+        critical-path or failed-first scheduling.
+        """
+        T = self.trace
+
+        # Skip this node if it has side-effects that are
+        # currently being built:
+        wait_side_effects = False
+        for se in executor.get_action_side_effects():
+            if se.get_state() == NODE_EXECUTING:
+                se.add_to_waiting_s_e(node)
+                wait_side_effects = True
+
+        if wait_side_effects:
+            if S: S.side_effects = S.side_effects + 1
+            return False
 
-            # The default when we've gotten through all of the checks above:
-            # this node is ready to be built.
-            if S: S.build = S.build + 1
-            if T: T.write(self.trace_message(u'Evaluating %s\n' %
+        # The default when we've gotten through all of the checks above:
+        # this node is ready to be built.
+        if S: S.build = S.build + 1
+
+        if self.queue_ready:
+            if T: T.write(self.trace_message(u'     queued as ready: %s\n' %
                                              self.trace_node(node)))
+            self.add_ready_node(node)
+            return False
 
-            # For debugging only:
-            #
-            # try:
-            #     self._validate_pending_children()
-            # except:
-            #     self.ready_exc = sys.exc_info()
-            #     return node
+        # Skip this node if its resource pool is full:
+        if not self.reserve_resource_pool(node):
+            if T: T.write(self.trace_message(u'     waiting for resource pool: %s\n' %
+                                             self.trace_node(node)))
+            return False
 
-            return node
+        if T: T.write(self.trace_message(u'Evaluating %s\n' %
+                                         self.trace_node(node)))
 
-        return None
+        # For debugging only:
+        #
+        # try:
+        #     self._validate_pending_children()
+        # except:
+        #     self.ready_exc = sys.exc_info()
+        #     return True
+
+        return True
 
     def next_task(self):
         """
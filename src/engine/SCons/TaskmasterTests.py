@@ -39,6 +39,8 @@ import SCons.Errors
 built_text = None
 cache_text = []
 visited_nodes = []
+post_built_nodes = []
+pushed_nodes = []
 executed = None
 scan_called = 0
 
@@ -70,12 +72,16 @@ class Node(object):
         self._bsig_val = None
         self._current_val = 0
         self.always_build = None
+        self.attributes = SCons.Node.Node.Attrs()
+        self.build_env = {}
+        self.implicit = None
 
     def disambiguate(self):
         return self
 
     def push_to_cache(self):
-        pass
+        global pushed_nodes
+        pushed_nodes.append(self.name)
 
     def retrieve_from_cache(self):
         global cache_text
@@ -131,6 +137,12 @@ class Node(object):
         # target and need to start from scratch.
         self.del_binfo()
 
+    def post_build(self):
+        global post_built_nodes
+        post_built_nodes.append(self.name)
+        if not self.cached:
+            self.push_to_cache()
+
     def built(self):
         global built_text
         if not self.cached:
@@ -149,6 +161,9 @@ class Node(object):
     def has_builder(self):
         return not self.builder is None
 
+    def get_build_env(self):
+        return self.build_env
+
     def is_derived(self):
         return self.has_builder or self.side_effect
 
@@ -1008,6 +1023,64 @@ class TaskmasterTestCase(unittest.TestCase):
         assert built_text is None, built_text
         assert cache_text == ["n7 retrieved", "n8 retrieved"], cache_text
 
+    def test_post_build(self):
+        """Test finishing up the targets of a task after building them
+        """
+        global built_text
+        global cache_text
+        global post_built_nodes
+        global pushed_nodes
+
+        n1 = Node("n1")
+        n2 = Node("n2")
+        n1.targets = [n1, n2]
+        tm = SCons.Taskmaster.Taskmaster([n1])
+        t = tm.next_task()
+        n1.set_state(SCons.Node.executing)
+        n2.set_state(SCons.Node.up_to_date)
+        pushed_nodes = []
+        post_built_nodes = []
+        t.execute()
+        assert built_text == "n1 built", built_text
+        assert pushed_nodes == ["n1"], pushed_nodes
+        assert post_built_nodes == ["n1"], post_built_nodes
+        assert t.post_built
+
+        # The targets don't get pushed to the cache again.
+        t.executed()
+        assert built_text == "n1 built really", built_text
+        assert pushed_nodes == ["n1"], pushed_nodes
+
+        # Without post_build(), executed() pushes them.
+        n3 = Node("n3")
+        tm = SCons.Taskmaster.Taskmaster([n3])
+        t = tm.next_task()
+        n3.set_state(SCons.Node.executing)
+        pushed_nodes = []
+        post_built_nodes = []
+        built_text = "n3"
+        t.executed()
+        assert built_text == "n3 really", built_text
+        assert pushed_nodes == ["n3"], pushed_nodes
+        assert post_built_nodes == [], post_built_nodes
+
+        # Nothing happens to targets retrieved from the cache.
+        n4 = Node("n4")
+        n4.cached = 1
+        tm = SCons.Taskmaster.Taskmaster([n4])
+        t = tm.next_task()
+        n4.set_state(SCons.Node.executing)
+        cache_text = []
+        pushed_nodes = []
+        post_built_nodes = []
+        built_text = None
+        t.execute()
+        assert built_text is None, built_text
+        assert cache_text == ["n4 retrieved"], cache_text
+        assert pushed_nodes == [], pushed_nodes
+        assert post_built_nodes == [], post_built_nodes
+        assert not t.post_built
+
     def test_cached_execute(self):
         """Test executing a task with cached targets
         """
@@ -1052,6 +1125,444 @@ class TaskmasterTestCase(unittest.TestCase):
         has_binfo = hasattr(n1, 'binfo')
         assert has_binfo == True, has_binfo
 
+    def test_record_execution_time(self):
+        """Test recording how long building a task's targets took
+        """
+        class StoredInfo(object):
+            pass
+
+        n1 = Node("n1")
+        n1.stored_info = StoredInfo()
+        n1.stored_info.binfo = StoredInfo()
+        n1.get_stored_info = lambda: n1.stored_info
+        tm = SCons.Taskmaster.Taskmaster([n1])
+        t = tm.next_task()
+        t.prepare()
+        t.execute()
+        n1.set_state(SCons.Node.executing)
+        t.executed()
+        bexectime = n1.stored_info.binfo.bexectime
+        assert bexectime == t.execution_time, bexectime
+
+        # Targets retrieved from the cache keep their old time.
+        n2 = Node("n2")
+        n2.cached = 1
+        n2.stored_info = StoredInfo()
+        n2.stored_info.binfo = StoredInfo()
+        n2.get_stored_info = lambda: n2.stored_info
+        tm = SCons.Taskmaster.Taskmaster([n2])
+        t = tm.next_task()
+        t.prepare()
+        t.execute()
+        n2.set_state(SCons.Node.executing)
+        t.executed()
+        assert not hasattr(n2.stored_info.binfo, 'bexectime')
+
+    def test_critical_path(self):
+        """Test ordering ready nodes by their recorded critical path
+        """
+        class StoredInfo(object):
+            pass
+
+        class TimedNode(Node):
+            def __init__(self, name, kids=[], exectime=None):
+                Node.__init__(self, name, kids)
+                self.stored_info = StoredInfo()
+                self.stored_info.binfo = StoredInfo()
+                if exectime is not None:
+                    self.stored_info.binfo.bexectime = exectime
+            def get_stored_info(self):
+                return self.stored_info
+
+        def build_order(tm):
+            order = []
+            t = tm.next_task()
+            while t:
+                t.prepare()
+                t.execute()
+                t.executed()
+                t.postprocess()
+                order.append(t.targets[0].name)
+                t = tm.next_task()
+            return order
+
+        def graph():
+            x = TimedNode("x", exectime=1)
+            m = TimedNode("m", [x], exectime=10)
+            s = TimedNode("s", exectime=5)
+            top = TimedNode("top", [s, m], exectime=1)
+            return top
+
+        tm = SCons.Taskmaster.Taskmaster([graph()])
+        order = build_order(tm)
+        assert order == ['s', 'x', 'm', 'top'], order
+
+        # x and m take 11 seconds, s only 5.
+        tm = SCons.Taskmaster.Taskmaster([graph()], critical_path=True)
+        order = build_order(tm)
+        assert order == ['x', 'm', 's', 'top'], order
+
+        # Nodes without a recorded time keep the walk order.
+        n1 = TimedNode("n1")
+        n2 = TimedNode("n2")
+        n3 = TimedNode("n3", [n1, n2])
+        tm = SCons.Taskmaster.Taskmaster([n3], critical_path=True)
+        order = build_order(tm)
+        assert order == ['n1', 'n2', 'n3'], order
+
+        # Several ready nodes can be handed out before any of them
+        # has finished, longest first.
+        a = TimedNode("a", exectime=1)
+        b = TimedNode("b", exectime=3)
+        c = TimedNode("c", exectime=2)
+        top = TimedNode("top", [a, b, c])
+        tm = SCons.Taskmaster.Taskmaster([top], critical_path=True)
+        tasks = [tm.next_task(), tm.next_task(), tm.next_task()]
+        names = [t.targets[0].name for t in tasks]
+        assert names == ['b', 'c', 'a'], names
+        assert tm.next_task() is None
+
+        # A queued node moves up when a parent with a longer path
+        # turns out to depend on it too.
+        x = TimedNode("x", exectime=2)
+        y = TimedNode("y", exectime=1)
+        p1 = TimedNode("p1", [x], exectime=1)
+        p2 = TimedNode("p2", [x, y], exectime=100)
+        top = TimedNode("top", [p1, p2], exectime=1)
+        tm = SCons.Taskmaster.Taskmaster([top], critical_path=True)
+        t = tm.next_task()
+        assert t.targets[0].name == 'x', t.targets[0].name
+        t = tm.next_task()
+        assert t.targets[0].name == 'y', t.targets[0].name
+        assert tm.ready_entries == {}, tm.ready_entries
+
+        # Only so many ready nodes get queued before one is handed out.
+        a = TimedNode("a", exectime=1)
+        b = TimedNode("b", exectime=3)
+        c = TimedNode("c", exectime=2)
+        top = TimedNode("top", [a, b, c])
+        tm = SCons.Taskmaster.Taskmaster([top], critical_path=True)
+        tm.ready_lookahead = 1
+        tasks = [tm.next_task(), tm.next_task(), tm.next_task()]
+        names = [t.targets[0].name for t in tasks]
+        assert names == ['a', 'b', 'c'], names
+
+        # Stopping the build drops the queued ready nodes.
+        a = TimedNode("a", exectime=1)
+        b = TimedNode("b", exectime=3)
+        top = TimedNode("top", [a, b])
+        tm = SCons.Taskmaster.Taskmaster([top], critical_path=True)
+        t = tm.next_task()
+        assert t.targets[0].name == 'b', t.targets[0].name
+        tm.stop()
+        assert tm.next_task() is None
+        assert tm.ready_queue == [], tm.ready_queue
+
+    def test_failed_first(self):
+        """Test handing out the nodes that failed the last time first
+        """
+        class StoredInfo(object):
+            pass
+
+        class SConsign(object):
+            def __init__(self):
+                self.entries = {}
+            def set_entry(self, name, entry):
+                self.entries[name] = entry
+
+        class Dir(object):
+            def __init__(self):
+                self._sconsign = SConsign()
+            def sconsign(self):
+                return self._sconsign
+
+        class StoredNode(Node):
+            def __init__(self, name, kids=[], failed=None, exectime=None):
+                Node.__init__(self, name, kids)
+                self.store_info = 1
+                self.dir = Dir()
+                self.stored_info = StoredInfo()
+                self.stored_info.binfo = StoredInfo()
+                if failed is not None:
+                    self.stored_info.binfo.bfailed = failed
+                if exectime is not None:
+                    self.stored_info.binfo.bexectime = exectime
+            def get_stored_info(self):
+                return self.stored_info
+
+        def build_order(tm):
+            order = []
+            t = tm.next_task()
+            while t:
+                t.prepare()
+                t.execute()
+                t.executed()
+                t.postprocess()
+                order.append(t.targets[0].name)
+                t = tm.next_task()
+            return order
+
+        def graph():
+            a = StoredNode("a")
+            g = StoredNode("g")
+            f = StoredNode("f", [g], failed=1)
+            b = StoredNode("b")
+            top = StoredNode("top", [a, f, b])
+            return top
+
+        tm = SCons.Taskmaster.Taskmaster([graph()])
+        order = build_order(tm)
+        assert order == ['a', 'g', 'f', 'b', 'top'], order
+
+        # f and what it depends on go first.
+        top = graph()
+        tm = SCons.Taskmaster.Taskmaster([top], failed_first=True)
+        order = build_order(tm)
+        assert order == ['g', 'f', 'a', 'b', 'top'], order
+
+        # Building the nodes forgets about their failures.
+        for n in [top] + top.kids:
+            assert not hasattr(n.stored_info.binfo, 'bfailed'), n.name
+
+        # A node that was already queued as ready moves up when a node
+        # that failed turns out to depend on it.
+        c = StoredNode("c")
+        x = StoredNode("x")
+        f = StoredNode("f", [x], failed=1)
+        top = StoredNode("top", [c, x, f])
+        tm = SCons.Taskmaster.Taskmaster([top], failed_first=True)
+        order = build_order(tm)
+        assert order == ['x', 'f', 'c', 'top'], order
+
+        # With critical-path scheduling as well, the failed path still
+        # goes first.
+        a = StoredNode("a", exectime=10)
+        f = StoredNode("f", failed=1, exectime=1)
+        b = StoredNode("b", failed=1, exectime=2)
+        top = StoredNode("top", [a, f, b])
+        tm = SCons.Taskmaster.Taskmaster([top], critical_path=True,
+                                         failed_first=True)
+        order = build_order(tm)
+        assert order == ['b', 'f', 'a', 'top'], order
+
+        # A failure gets recorded, and written to the .sconsign file,
+        # without touching the rest of the stored information.
+        n1 = StoredNode("n1", exectime=5)
+        tm = SCons.Taskmaster.Taskmaster([n1])
+        t = tm.next_task()
+        t.record_failure(n1)
+        assert n1.stored_info.binfo.bfailed == 1
+        assert n1.stored_info.binfo.bexectime == 5
+        assert n1.dir.sconsign().entries == {'n1' : n1.stored_info}
+
+        # ...but only for nodes that get built and stored.
+        n2 = StoredNode("n2")
+        n2.builder = None
+        n3 = StoredNode("n3")
+        n3.store_info = 0
+        for n in [n2, n3]:
+            t.record_failure(n)
+            assert not hasattr(n.stored_info.binfo, 'bfailed'), n.name
+            assert n.dir.sconsign().entries == {}, n.name
+
+        # Nothing gets recorded for an interrupted build.
+        for exc in [KeyboardInterrupt, SystemExit]:
+            n5 = StoredNode("n5")
+            tm = SCons.Taskmaster.Taskmaster([n5])
+            t = tm.next_task()
+            try:
+                raise exc
+            except:
+                t.exception_set()
+            t.record_failure(n5)
+            assert not hasattr(n5.stored_info.binfo, 'bfailed'), exc
+            # BuildTask.failed() keeps the exception itself first.
+            t.exception = (exc(), None, None)
+            t.record_failure(n5)
+            assert not hasattr(n5.stored_info.binfo, 'bfailed'), exc
+        n6 = StoredNode("n6")
+        tm = SCons.Taskmaster.Taskmaster([n6])
+        t = tm.next_task()
+        tm.interrupted = True
+        t.record_failure(n6)
+        assert not hasattr(n6.stored_info.binfo, 'bfailed')
+        assert n6.dir.sconsign().entries == {}
+
+        # Nodes that are up-to-date forget about their failures, too.
+        n4 = StoredNode("n4", failed=1)
+        tm = SCons.Taskmaster.Taskmaster([n4])
+        t = tm.next_task()
+        t.prepare()
+        n4.set_state(SCons.Node.up_to_date)
+        t.executed()
+        assert not hasattr(n4.stored_info.binfo, 'bfailed')
+
+    def test_resource_pool(self):
+        """Test limiting the tasks handed out in a resource pool
+        """
+        save_pools = SCons.Taskmaster.resource_pools.copy()
+        try:
+            SCons.Taskmaster.resource_pools['link'] = \
+                SCons.Taskmaster.ResourcePool('link', 2)
+
+            l1 = Node("l1")
+            l2 = Node("l2")
+            l3 = Node("l3")
+            c1 = Node("c1")
+            top = Node("top", [l1, l2, c1, l3])
+            l1.attributes.resource_pool = 'link'
+            l2.attributes.resource_pool = 'link'
+            l3.build_env = {'RESOURCE_POOL' : 'link'}
+
+            # With two links running, the third one waits, but other
+            # ready work gets handed out.
+            tm = SCons.Taskmaster.Taskmaster([top])
+            t1 = tm.next_task()
+            assert t1.targets == [l1], t1.targets
+            t2 = tm.next_task()
+            assert t2.targets == [l2], t2.targets
+            t3 = tm.next_task()
+            assert t3.targets == [c1], t3.targets
+            assert tm.next_task() is None
+            pool = SCons.Taskmaster.resource_pools['link']
+            assert tm.pool_running[pool] == 2, tm.pool_running
+            assert tm.pool_waiting[pool] == [l3], tm.pool_waiting
+
+            t3.executed()
+            t3.postprocess()
+            assert tm.next_task() is None
+
+            # Once a link is done, the waiting one gets its place.
+            t2.executed()
+            t2.postprocess()
+            t4 = tm.next_task()
+            assert t4.targets == [l3], t4.targets
+            assert tm.pool_running[pool] == 2, tm.pool_running
+            for t in [t1, t4]:
+                t.executed()
+                t.postprocess()
+            assert tm.pool_running[pool] == 0, tm.pool_running
+            t = tm.next_task()
+            assert t.targets == [top], t.targets
+
+            # A pool without a size doesn't limit anything.
+            n1 = Node("n1")
+            n2 = Node("n2")
+            n1.attributes.resource_pool = 'unsized'
+            n2.attributes.resource_pool = 'unsized'
+            tm = SCons.Taskmaster.Taskmaster([n1, n2])
+            assert tm.next_task().targets == [n1]
+            assert tm.next_task().targets == [n2]
+
+            # Stopping the build drops the waiting nodes.
+            SCons.Taskmaster.resource_pools['link'].size = 1
+            l1 = Node("l1")
+            l2 = Node("l2")
+            top = Node("top", [l1, l2])
+            l1.attributes.resource_pool = 'link'
+            l2.attributes.resource_pool = 'link'
+            tm = SCons.Taskmaster.Taskmaster([top])
+            t = tm.next_task()
+            assert t.targets == [l1], t.targets
+            assert tm.next_task() is None
+            tm.stop()
+            assert tm.next_task() is None
+            assert tm.pool_waiting == {}, tm.pool_waiting
+        finally:
+            SCons.Taskmaster.resource_pools.clear()
+            SCons.Taskmaster.resource_pools.update(save_pools)
+
+    def test_children_done(self):
+        """Test not walking the children of a Node again once the
+        children it was waiting for are done
+        """
+        walked = []
+        class WalkedNode(Node):
+            def children(self):
+                walked.append(self.name)
+                return Node.children(self)
+
+        def run(tm, build=None):
+            """Runs all the tasks, really building the Nodes in
+            'build' and finding the others up-to-date."""
+            result = []
+            while True:
+                t = tm.next_task()
+                if t is None:
+                    return result
+                result.append(t.targets[0].name)
+                t.prepare()
+                t.execute()
+                if t.targets[0].name in (build or []):
+                    t.targets[0].set_state(SCons.Node.executing)
+                else:
+                    t.targets[0].set_state(SCons.Node.up_to_date)
+                t.executed()
+                t.postprocess()
+
+        # A Node whose children turn out to be up-to-date is handed
+        # out without walking its children a second time.
+        n1 = WalkedNode("n1")
+        n2 = WalkedNode("n2")
+        n3 = WalkedNode("n3", [n1, n2])
+        n3.implicit = []
+        tm = SCons.Taskmaster.Taskmaster([n3])
+        assert run(tm) == ['n1', 'n2', 'n3'], walked
+        assert walked.count('n3') == 1, walked
+        assert not tm.children_done, tm.children_done
+
+        # Building a child makes its parents get scanned (and walked)
+        # again.
+        del walked[:]
+        n1 = WalkedNode("n1")
+        n2 = WalkedNode("n2")
+        n3 = WalkedNode("n3", [n1, n2])
+        n3.implicit = []
+        tm = SCons.Taskmaster.Taskmaster([n3])
+        assert run(tm, build=['n2']) == ['n1', 'n2', 'n3'], walked
+        assert walked.count('n3') == 2, walked
+
+        # A Node that was also waiting on a side effect walks its
+        # children again.
+        del walked[:]
+        n1 = WalkedNode("n1")
+        n2 = WalkedNode("n2")
+        n3 = WalkedNode("n3", [n1, n2])
+        n3.implicit = []
+        tm = SCons.Taskmaster.Taskmaster([n3])
+        t = tm.next_task()
+        assert t.targets == [n1], t.targets
+        n2.set_state(SCons.Node.executing)
+        n1.side_effects = [n2]
+        t.prepare()
+        t.execute()
+        t.postprocess()
+        assert n3.ref_count == 0, n3.ref_count
+        assert n3 not in tm.children_done
+        assert run(tm) == ['n2', 'n3'], walked
+        assert walked.count('n3') > 1, walked
+
+    def test_prescanner(self):
+        """Test handing the Nodes added to the candidates to a prescanner
+        """
+        class Prescanner(object):
+            def __init__(self):
+                self.prescanned = []
+            def prescan(self, nodes):
+                self.prescanned.append([n.name for n in nodes])
+
+        n1 = Node("n1")
+        n2 = Node("n2")
+        n3 = Node("n3", [n1, n2])
+        n4 = Node("n4", [n3])
+        tm = SCons.Taskmaster.Taskmaster([n4])
+        assert tm.prescanner is None, tm.prescanner
+        tm.prescanner = Prescanner()
+        t = tm.next_task()
+        assert t.targets == [n1], t.targets
+        assert tm.prescanner.prescanned == [['n3'], ['n2', 'n1']], \
+               tm.prescanner.prescanned
+
     def test_exception(self):
         """Test generic Taskmaster exception handling
 
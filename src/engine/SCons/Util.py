@@ -27,6 +27,7 @@ Various utility functions go here.
 __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
 import os
+import stat
 import sys
 import copy
 import re
@@ -1427,6 +1428,73 @@ def make_path_relative(path):
     return path
 
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+else:
+    msvcrt = None
+
+def lock_file(path):
+    """
+    Waits for an exclusive lock on the lock file 'path' (which gets
+    created if need be), so that other processes can't get one until
+    it's released with unlock_file().  Returns the file descriptor that
+    holds the lock, or None if locking files isn't supported.
+    """
+    if fcntl is None and msvcrt is None:
+        return None
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except IOError:
+                        # It only tries for ten seconds, keep waiting.
+                        pass
+        except:
+            os.close(fd)
+            raise
+        if fcntl is None:
+            # Windows can't remove an open file, so unlock_file()
+            # leaves it alone.
+            return fd
+        # unlock_file() removes the lock file, so whoever got the lock
+        # on a file that has since been removed has to try again.
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except OSError:
+            pass
+        os.close(fd)
+
+def unlock_file(path, fd):
+    """
+    Releases the lock on the lock file 'path' that lock_file() returned
+    the file descriptor 'fd' for.
+    """
+    if fd is None:
+        return
+    if fcntl is not None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    os.close(fd)
+
+
 
 # The original idea for AddMethod() and RenameFunction() come from the
 # following post to the ActiveState Python Cookbook:
@@ -1501,6 +1569,12 @@ def RenameFunction(function, name):
 
 md5 = False
 
+# The hash formats MD5signature(), MD5filesignature() and MD5collect()
+# can use for content signatures, despite their names (see
+# set_hash_format()), and the one they're using.
+hash_formats = ['md5', 'sha256', 'blake2b', 'xxhash']
+hash_format = 'md5'
+
 
 def MD5signature(s):
     return str(s)
@@ -1511,34 +1585,106 @@ def MD5filesignature(fname, chunksize=65536):
         result = f.read()
     return result
 
+def _hash_constructor(name):
+    """
+    Returns a function that creates a hashlib-style hash object for the
+    named hash format, or None if it isn't available.
+    """
+    if name == 'xxhash':
+        try:
+            import xxhash
+        except ImportError:
+            return None
+        # Always XXH3 with 128-bit digests, so that signatures don't
+        # depend on the version of the xxhash module.
+        return getattr(xxhash, 'xxh3_128', None)
+    try:
+        import hashlib
+    except ImportError:
+        return None
+    if name == 'blake2b':
+        try:
+            blake2b = hashlib.blake2b
+        except AttributeError:
+            return None
+        return lambda: blake2b(digest_size=32)
+    return getattr(hashlib, name, None)
+
+def set_hash_format(name):
+    """
+    Selects the hash function for content signatures.  Raises
+    ValueError if it's not one of hash_formats, or isn't available
+    in this Python.
+    """
+    global hash_format, _hash_new
+    if name not in hash_formats:
+        raise ValueError("`%s' is not a valid hash format, try: %s"
+                         % (name, ', '.join(hash_formats)))
+    new = _hash_constructor(name)
+    if new is None or not md5:
+        raise ValueError("The %s hash format is not available in this "
+                         "version of Python." % name)
+    hash_format = name
+    _hash_new = new
+
 try:
-    import hashlib
+    import mmap
 except ImportError:
-    pass
-else:
-    if hasattr(hashlib, 'md5'):
-        md5 = True
+    mmap = None
 
-        def MD5signature(s):
-            m = hashlib.md5()
+def _map_file(f, minsize):
+    """
+    Returns a read-only memory map of the open file f, or None if it
+    isn't a regular file larger than minsize bytes, or can't be mapped
+    (an empty file, or one too large for the address space).
+    """
+    if mmap is None:
+        return None
+    try:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode) or st.st_size <= minsize:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError, OverflowError):
+        return None
 
-            try:
-                m.update(to_bytes(s))
-            except TypeError as e:
-                m.update(to_bytes(str(s)))
-
-            return m.hexdigest()
-
-        def MD5filesignature(fname, chunksize=65536):
-            m = hashlib.md5()
-            f = open(fname, "rb")
-            while True:
-                blck = f.read(chunksize)
-                if not blck:
-                    break
-                m.update(to_bytes(blck))
+_hash_new = _hash_constructor('md5')
+
+if _hash_new is not None:
+    md5 = True
+
+    def MD5signature(s):
+        m = _hash_new()
+
+        try:
+            m.update(to_bytes(s))
+        except TypeError as e:
+            m.update(to_bytes(str(s)))
+
+        return m.hexdigest()
+
+    def MD5filesignature(fname, chunksize=65536):
+        m = _hash_new()
+        f = open(fname, "rb")
+        try:
+            # Files larger than a chunk get hashed from a memory map
+            # in one call, without copying them into a bytes object
+            # for each chunk.
+            mapping = _map_file(f, chunksize)
+            if mapping is not None:
+                try:
+                    m.update(mapping)
+                finally:
+                    mapping.close()
+            else:
+                while True:
+                    blck = f.read(chunksize)
+                    if not blck:
+                        break
+                    m.update(to_bytes(blck))
+        finally:
             f.close()
-            return m.hexdigest()
+        return m.hexdigest()
 
 def MD5collect(signatures):
     """
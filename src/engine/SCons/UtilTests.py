@@ -780,6 +780,56 @@ class MD5TestCase(unittest.TestCase):
         s = MD5signature('222')
         assert 'bcbe3365e6ac95ea2c0343a2395834dd' == s, s
 
+    def test_MD5filesignature(self):
+        """Test generating the signature of a file"""
+        test = TestCmd.TestCmd(workdir = '')
+        contents = b'0123456789abcdef' * 1000
+        test.write('small', contents[:100])
+        test.write('large', contents)
+        test.write('empty', b'')
+
+        s = MD5filesignature(test.workpath('small'), chunksize=1024)
+        assert MD5signature(contents[:100]) == s, s
+        # Larger than a chunk, so it gets memory-mapped.
+        s = MD5filesignature(test.workpath('large'), chunksize=1024)
+        assert MD5signature(contents) == s, s
+        s = MD5filesignature(test.workpath('empty'), chunksize=0)
+        assert MD5signature(b'') == s, s
+
+        # The chunked reader gets the same result.
+        save_mmap = SCons.Util.mmap
+        SCons.Util.mmap = None
+        try:
+            s = MD5filesignature(test.workpath('large'), chunksize=1024)
+            assert MD5signature(contents) == s, s
+        finally:
+            SCons.Util.mmap = save_mmap
+
+    def test_set_hash_format(self):
+        """Test selecting the hash format of signatures"""
+        import hashlib
+        try:
+            SCons.Util.set_hash_format('sha256')
+            assert SCons.Util.hash_format == 'sha256', SCons.Util.hash_format
+            s = MD5signature('111')
+            expect = hashlib.sha256(b'111').hexdigest()
+            assert expect == s, s
+            s = MD5collect([s, MD5signature('222')])
+            assert len(s) == 64, s
+
+            try:
+                SCons.Util.set_hash_format('no_such_hash')
+            except ValueError:
+                pass
+            else:
+                raise Exception("did not catch expected ValueError")
+            assert SCons.Util.hash_format == 'sha256', SCons.Util.hash_format
+        finally:
+            SCons.Util.set_hash_format('md5')
+
+        s = MD5signature('111')
+        assert '698d51a19d8a121ce581499d7b701668' == s, s
+
 class NodeListTestCase(unittest.TestCase):
     def test_simple_attributes(self):
         """Test simple attributes of a NodeList class"""
@@ -44,6 +44,12 @@ class WarningOnByDefault(Warning):
 class TargetNotBuiltWarning(Warning): # Should go to OnByDefault
     pass
 
+class CacheCompressionWarning(WarningOnByDefault):
+    pass
+
+class CacheServerWarning(WarningOnByDefault):
+    pass
+
 class CacheVersionWarning(WarningOnByDefault):
     pass
 
@@ -86,6 +92,9 @@ class NoObjectCountWarning(WarningOnByDefault):
 class NoParallelSupportWarning(WarningOnByDefault):
     pass
 
+class NoWatchSupportWarning(WarningOnByDefault):
+    pass
+
 class ReservedVariableWarning(WarningOnByDefault):
     pass
 
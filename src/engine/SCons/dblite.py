@@ -5,9 +5,11 @@ from __future__ import print_function
 import os
 import pickle
 import shutil
+import sys
 import time
 
 from SCons.compat import PICKLE_PROTOCOL
+import SCons.Util
 
 keep_all_files = 00000
 ignore_corrupt_dbfiles = 0
@@ -43,6 +45,7 @@ dblite_suffix = '.dblite'
 # if bytes is not str:
 #     dblite_suffix += '.p3'
 tmp_suffix = '.tmp'
+lock_suffix = '.lock'
 
 
 class dblite(object):
@@ -70,8 +73,12 @@ class dblite(object):
 
     _os_rename = os.rename
     _os_unlink = os.unlink
+    _os_stat = os.stat
     _shutil_copyfile = shutil.copyfile
+    _lock_file = staticmethod(SCons.Util.lock_file)
+    _unlock_file = staticmethod(SCons.Util.unlock_file)
     _time_time = time.time
+    _replace_by_rename = sys.platform != 'win32'
 
     def __init__(self, file_base_name, flag, mode):
         assert flag in (None, "r", "w", "c", "n")
@@ -85,11 +92,21 @@ class dblite(object):
         else:
             self._file_name = file_base_name + dblite_suffix
             self._tmp_name = file_base_name + tmp_suffix
+        self._lock_name = self._file_name + lock_suffix
 
         self._flag = flag
         self._mode = mode
         self._dict = {}
         self._needs_sync = 00000
+        # The keys that were set since the last sync, and what the file
+        # looked like when we read it (see _file_stat()).
+        self._dirty = set()
+        self._stat = None
+        # If set, merge(key, value, other_value) gets called by sync()
+        # for a key that we set to 'value', and that another process
+        # set to 'other_value' since we read the file, and returns the
+        # value to write.  Without it, our value wins.
+        self.merge = None
 
         if self._os_chown is not None and (os.geteuid() == 0 or os.getuid() == 0):
             # running as root; chown back to current owner/group when done
@@ -106,27 +123,43 @@ class dblite(object):
             self._chown_to = -1  # don't chown
             self._chgrp_to = -1  # don't chgrp
 
-        if (self._flag == "n"):
-            self._open(self._file_name, "wb", self._mode)
-        else:
-            try:
-                f = self._open(self._file_name, "rb")
-            except IOError as e:
-                if (self._flag != "c"):
-                    raise e
+        # Don't read the file while another process is replacing it
+        # (see sync()), or create it while another one does.  We may not
+        # be able to create the lock file next to a file we only read,
+        # though, and then just read it.
+        try:
+            lock = self._lock_file(self._lock_name)
+        except (IOError, OSError):
+            if (self._flag != "r"):
+                raise
+            lock = None
+        try:
+            if (self._flag == "n"):
                 self._open(self._file_name, "wb", self._mode)
+                self._stat = self._file_stat()
             else:
-                p = f.read()
-                if len(p) > 0:
-                    try:
-                        self._dict = pickle.loads(p)
-                    except (pickle.UnpicklingError, EOFError, KeyError):
-                        # Note how we catch KeyErrors too here, which might happen
-                        # when we don't have cPickle available (default pickle
-                        # throws it).
-                        if (ignore_corrupt_dbfiles == 0): raise
-                        if (ignore_corrupt_dbfiles == 1):
-                            corruption_warning(self._file_name)
+                try:
+                    f = self._open(self._file_name, "rb")
+                except IOError as e:
+                    if (self._flag != "c"):
+                        raise e
+                    self._open(self._file_name, "wb", self._mode)
+                    self._stat = self._file_stat()
+                else:
+                    self._stat = self._file_stat(f)
+                    p = f.read()
+                    if len(p) > 0:
+                        try:
+                            self._dict = pickle.loads(p)
+                        except (pickle.UnpicklingError, EOFError, KeyError):
+                            # Note how we catch KeyErrors too here, which might happen
+                            # when we don't have cPickle available (default pickle
+                            # throws it).
+                            if (ignore_corrupt_dbfiles == 0): raise
+                            if (ignore_corrupt_dbfiles == 1):
+                                corruption_warning(self._file_name)
+        finally:
+            self._unlock_file(self._lock_name, lock)
 
     def close(self):
         if (self._needs_sync):
@@ -135,30 +168,81 @@ class dblite(object):
     def __del__(self):
         self.close()
 
-    def sync(self):
-        self._check_writable()
-        f = self._open(self._tmp_name, "wb", self._mode)
-        self._pickle_dump(self._dict, f, self._pickle_protocol)
+    def _file_stat(self, f=None):
+        """
+        Returns what identifies the contents of the file (the one that's
+        open as 'f', if given), so we can tell if another process wrote
+        it since, or None if there's no file.
+        """
+        try:
+            if f is None:
+                st = self._os_stat(self._file_name)
+            else:
+                st = os.fstat(f.fileno())
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime, st.st_ctime)
+
+    def _merge(self):
+        """
+        Reads the entries that another process wrote to the file since
+        we read it, and puts the ones we set since then on top of them.
+        """
+        try:
+            f = self._open(self._file_name, "rb")
+        except IOError:
+            return
+        p = f.read()
         f.close()
+        try:
+            other = pickle.loads(p) if p else {}
+        except (pickle.UnpicklingError, EOFError, KeyError):
+            # It's corrupt, so ours is all there is.
+            return
+        for key in self._dirty:
+            value = self._dict[key]
+            if self.merge is not None and key in other and other[key] != value:
+                value = self.merge(key, value, other[key])
+            other[key] = value
+        self._dict = other
 
-        # Windows doesn't allow renaming if the file exists, so unlink
-        # it first, chmod'ing it to make sure we can do so.  On UNIX, we
-        # may not be able to chmod the file if it's owned by someone else
-        # (e.g. from a previous run as root).  We should still be able to
-        # unlink() the file if the directory's writable, though, so ignore
-        # any OSError exception  thrown by the chmod() call.
+    def sync(self):
+        self._check_writable()
+        # Other processes can write the same file, so keep them out
+        # until we're done, and merge what they wrote since we read it.
+        lock = self._lock_file(self._lock_name)
         try:
-            self._os_chmod(self._file_name, 0o777)
-        except OSError:
-            pass
-        self._os_unlink(self._file_name)
-        self._os_rename(self._tmp_name, self._file_name)
-        if self._os_chown is not None and self._chown_to > 0:  # don't chown to root or -1
-            try:
-                self._os_chown(self._file_name, self._chown_to, self._chgrp_to)
-            except OSError:
-                pass
+            if self._file_stat() != self._stat:
+                self._merge()
+
+            f = self._open(self._tmp_name, "wb", self._mode)
+            self._pickle_dump(self._dict, f, self._pickle_protocol)
+            f.close()
+
+            # Windows doesn't allow renaming if the file exists, so unlink
+            # it first, chmod'ing it to make sure we can do so.  Elsewhere,
+            # the rename replaces the file in one go, so that processes
+            # reading it always find it.
+            if not self._replace_by_rename:
+                try:
+                    self._os_chmod(self._file_name, 0o777)
+                except OSError:
+                    pass
+                try:
+                    self._os_unlink(self._file_name)
+                except OSError:
+                    pass
+            self._os_rename(self._tmp_name, self._file_name)
+            if self._os_chown is not None and self._chown_to > 0:  # don't chown to root or -1
+                try:
+                    self._os_chown(self._file_name, self._chown_to, self._chgrp_to)
+                except OSError:
+                    pass
+            self._stat = self._file_stat()
+        finally:
+            self._unlock_file(self._lock_name, lock)
         self._needs_sync = 00000
+        self._dirty = set()
         if (keep_all_files):
             self._shutil_copyfile(
                 self._file_name,
@@ -178,6 +262,7 @@ class dblite(object):
         if (not is_bytes(value)):
             raise TypeError("value `%s' must be a bytes but is %s" % (value, type(value)))
         self._dict[key] = value
+        self._dirty.add(key)
         self._needs_sync = 0o001
 
     def keys(self):
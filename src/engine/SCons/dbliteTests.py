@@ -0,0 +1,146 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+import unittest
+
+import TestCmd
+import TestUnit
+
+import SCons.dblite
+
+
+class dbliteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test = TestCmd.TestCmd(workdir = '')
+        self.name = self.test.workpath('db')
+        self.file = self.name + SCons.dblite.dblite_suffix
+
+    def test_concurrent_sync(self):
+        """Test syncing a dblite that another process wrote"""
+        db = SCons.dblite.open(self.name, "c")
+        db['foo'] = b'foo'
+        db['bar'] = b'bar'
+        db.close()
+
+        db1 = SCons.dblite.open(self.name, "w")
+        db2 = SCons.dblite.open(self.name, "w")
+        db1['foo'] = b'foo 1'
+        db1['one'] = b'1'
+        db1.sync()
+        db2['bar'] = b'bar 2'
+        db2['two'] = b'2'
+        db2.sync()
+        # Neither loses what the other wrote.
+        db = SCons.dblite.open(self.name, "r")
+        assert db['foo'] == b'foo 1', db['foo']
+        assert db['bar'] == b'bar 2', db['bar']
+        assert db['one'] == b'1', db['one']
+        assert db['two'] == b'2', db['two']
+
+        # Only keys that both set get merged.
+        merged = []
+        def merge(key, value, other_value):
+            merged.append((key, value, other_value))
+            return value + other_value
+        db1 = SCons.dblite.open(self.name, "w")
+        db2 = SCons.dblite.open(self.name, "w")
+        db2.merge = merge
+        db1['foo'] = b'x'
+        db1['bar'] = b'y'
+        db1.sync()
+        db2['foo'] = b'z'
+        db2['one'] = b'1'
+        db2.sync()
+        assert merged == [('foo', b'z', b'x')], merged
+        db = SCons.dblite.open(self.name, "r")
+        assert db['foo'] == b'zx', db['foo']
+        assert db['bar'] == b'y', db['bar']
+
+        # After syncing, it's up to date with what's on disk.
+        del merged[:]
+        db2['foo'] = b'w'
+        db2.sync()
+        assert merged == [], merged
+        db = SCons.dblite.open(self.name, "r")
+        assert db['foo'] == b'w', db['foo']
+        assert db['bar'] == b'y', db['bar']
+
+    def test_replace(self):
+        """Test that syncing replaces the file without removing it first"""
+        db = SCons.dblite.open(self.name, "c")
+        db['foo'] = b'foo'
+        unlinked = []
+        db._os_unlink = unlinked.append
+        db._replace_by_rename = True
+        db.sync()
+        assert unlinked == [], unlinked
+        # Where renaming can't replace a file, it gets removed first.
+        db._replace_by_rename = False
+        db['foo'] = b'bar'
+        db.sync()
+        assert unlinked == [self.file], unlinked
+
+    def test_lock_on_open(self):
+        """Test locking the file while reading it"""
+        db = SCons.dblite.open(self.name, "c")
+        db['foo'] = b'foo'
+        db.close()
+
+        save_lock_file = SCons.dblite.dblite._lock_file
+        def lock_file(path):
+            locked.append(path)
+            return save_lock_file(path)
+        SCons.dblite.dblite._lock_file = staticmethod(lock_file)
+        try:
+            locked = []
+            db = SCons.dblite.open(self.name, "r")
+            assert db['foo'] == b'foo', db['foo']
+            assert locked == [self.file + '.lock'], locked
+
+            # A file that's only read doesn't need the lock.
+            def lock_file(path):
+                raise OSError("read-only directory")
+            SCons.dblite.dblite._lock_file = staticmethod(lock_file)
+            db = SCons.dblite.open(self.name, "r")
+            assert db['foo'] == b'foo', db['foo']
+            try:
+                SCons.dblite.open(self.name, "w")
+            except OSError:
+                pass
+            else:
+                raise AssertionError("opened without the lock")
+        finally:
+            SCons.dblite.dblite._lock_file = staticmethod(save_lock_file)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(dbliteTestCase, 'test_')
+    TestUnit.run(suite)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,599 @@
+"""SCons.dblog
+
+A dbm-like database of string keys and bytes values, kept in a single
+append-only log file.
+
+This is an alternative to the SCons.dblite module for large .sconsign
+databases.  dblite pickles its whole dictionary and rewrites the file
+every time it gets synced.  dblog instead appends only the records that
+changed, in one batch per sync, which ends with a commit record.  When
+a log is opened, it is scanned once to build an index of the offsets
+of the latest record of each key, and values only get read from the
+file when they're asked for.  A batch that was only partly written (by
+an interrupted build, say) is left out, along with anything after it.
+
+Every record that gets superseded is dead space in the log.  When there
+is enough of it (see compact_ratio and compact_min_size), the log gets
+compacted: a background thread copies the live records to a new log
+while the build goes on, and the new log replaces the old one at the
+next sync.
+
+The format of the log is a magic string, followed by records.  Each
+record has a header of the length of its key, the length of its value
+and the CRC-32 of the two, all of them unsigned 32-bit big-endian
+integers, followed by the UTF-8 encoded key and the value.  A commit
+record has a key length of 0xffffffff, and its value is the offset of
+the first record of its batch and the CRC-32 of the batch.
+"""
+
+from __future__ import print_function
+
+import os
+import struct
+import zlib
+
+import SCons.Util
+import SCons.dblite
+
+try:
+    import threading
+except ImportError:
+    threading = None
+
+ignore_corrupt_dbfiles = 0
+
+
+def corruption_warning(filename):
+    print("Warning: Discarding corrupt database:", filename)
+
+
+try:
+    unicode
+except NameError:
+    def is_string(s):
+        return isinstance(s, str)
+else:
+    def is_string(s):
+        return type(s) in (str, unicode)
+
+
+def is_bytes(s):
+    return isinstance(s, bytes)
+
+
+dblog_suffix = '.dblog'
+compact_suffix = '.compact'
+lock_suffix = '.lock'
+
+# A log gets compacted when more than this fraction of it is dead
+# space, as long as it has at least compact_min_size bytes of it.
+compact_ratio = 0.5
+compact_min_size = 64 * 1024
+
+_magic = b'SCons dblog 1\n'
+_header = struct.Struct('>III')
+_commit = struct.Struct('>QI')
+_commit_key_length = 0xffffffff
+
+
+def _encode_key(key):
+    if isinstance(key, bytes):
+        return key
+    return key.encode('utf-8')
+
+def _decode_key(data):
+    if bytes is str:
+        return data
+    return data.decode('utf-8')
+
+def _crc32(data, crc=0):
+    return zlib.crc32(data, crc) & 0xffffffff
+
+def _record(key, value):
+    """Returns the bytes of the record of 'key' and 'value'."""
+    key = _encode_key(key)
+    crc = _crc32(value, _crc32(key))
+    return _header.pack(len(key), len(value), crc) + key + value
+
+def _read_records(f, records):
+    """Reads the (key, (offset, size)) 'records' from the log file 'f',
+    and generates (key, record bytes) pairs of them."""
+    for key, (offset, size) in records:
+        f.seek(offset)
+        yield key, f.read(size)
+
+def _write_batch(f, start, records):
+    """Writes a batch of (key, record bytes) pairs to the log file 'f'
+    at offset 'start', followed by their commit record.  Returns a
+    dictionary of the (offset, size) of each key's record, and the
+    offset of the end of the batch."""
+    index = {}
+    crc = 0
+    offset = start
+    f.seek(start)
+    for key, record in records:
+        f.write(record)
+        crc = _crc32(record, crc)
+        index[key] = (offset, len(record))
+        offset = offset + len(record)
+    commit = _commit.pack(start, crc)
+    f.write(_header.pack(_commit_key_length, len(commit), _crc32(commit)))
+    f.write(commit)
+    f.truncate()
+    f.flush()
+    return index, offset + _header.size + len(commit)
+
+
+class dblog(object):
+    """
+    Squirrel away references to the functions in various modules
+    that we'll use when our __del__() method calls our sync() method
+    during shutdown (see the dblite class).
+    """
+
+    _open = open
+    _os_chmod = os.chmod
+
+    try:
+        _os_chown = os.chown
+    except AttributeError:
+        _os_chown = None
+
+    _os_rename = os.rename
+    _os_unlink = os.unlink
+    _os_stat = os.stat
+    _lock_file = staticmethod(SCons.Util.lock_file)
+    _unlock_file = staticmethod(SCons.Util.unlock_file)
+    _replace_by_rename = SCons.dblite.dblite._replace_by_rename
+
+    def __init__(self, file_base_name, flag, mode):
+        assert flag in (None, "r", "w", "c", "n")
+        if (flag is None): flag = "r"
+
+        base, ext = os.path.splitext(file_base_name)
+        if ext == dblog_suffix:
+            # There's already a suffix on the file name, don't add one.
+            self._file_name = file_base_name
+        else:
+            self._file_name = file_base_name + dblog_suffix
+        # Other processes could be compacting the same log.
+        self._compact_name = '%s%s.%d' % (self._file_name, compact_suffix,
+                                          os.getpid())
+        self._lock_name = self._file_name + lock_suffix
+
+        self._flag = flag
+        self._mode = mode
+        # The (offset, size) of the latest record of each key in the
+        # log, and the values that haven't been written to it yet.
+        self._index = {}
+        self._pending = {}
+        # The keys that were written to the log since it was opened.
+        self._written = set()
+        # The end of the last complete batch, the number of bytes of
+        # dead space before it, and whether the log has to be written
+        # over from scratch (because it was corrupt).
+        self._end = 0
+        self._dead = 0
+        self._rewrite = False
+        self._file = None
+        self._compactor = None
+        self._compacted = None
+        # What the log looked like when we read it (see _file_stat()).
+        self._stat = None
+        # If set, merge(key, value, other_value) gets called by sync()
+        # for a key that we set to 'value', and that another process
+        # set to 'other_value' since we read the log, and returns the
+        # value to write.  Without it, our value wins.
+        self.merge = None
+        if threading:
+            self._lock = threading.Lock()
+        else:
+            self._lock = None
+
+        if self._os_chown is not None and (os.geteuid() == 0 or os.getuid() == 0):
+            # running as root; chown back to current owner/group when done
+            try:
+                statinfo = os.stat(self._file_name)
+                self._chown_to = statinfo.st_uid
+                self._chgrp_to = statinfo.st_gid
+            except OSError as e:
+                # db file doesn't exist yet.
+                # Check os.environ for SUDO_UID, use if set
+                self._chown_to = int(os.environ.get('SUDO_UID', -1))
+                self._chgrp_to = int(os.environ.get('SUDO_GID', -1))
+        else:
+            self._chown_to = -1  # don't chown
+            self._chgrp_to = -1  # don't chgrp
+
+        # Don't read the log while another process is replacing it
+        # (see sync()), or create it while another one does.  We may not
+        # be able to create the lock file next to a log we only read,
+        # though, and then just read it.
+        try:
+            lock = self._lock_file(self._lock_name)
+        except (IOError, OSError):
+            if (self._flag != "r"):
+                raise
+            lock = None
+        try:
+            if (self._flag == "n"):
+                self._create()
+            else:
+                try:
+                    self._file = self._open(self._file_name, "rb")
+                except IOError as e:
+                    if (self._flag != "c"):
+                        raise e
+                    self._create()
+                else:
+                    self._stat = self._file_stat(self._file)
+                    self._load()
+        finally:
+            self._unlock_file(self._lock_name, lock)
+
+        if self._flag != "r" and self._needs_compacting():
+            self._start_compacting()
+
+    def _create(self):
+        f = self._open(self._file_name, "wb")
+        f.write(_magic)
+        f.close()
+        self._file = self._open(self._file_name, "rb")
+        self._stat = self._file_stat(self._file)
+        self._end = len(_magic)
+
+    def _file_stat(self, f=None):
+        """Returns what identifies the contents of the log (the one
+        that's open as 'f', if given), so we can tell if another process
+        wrote to it since, or None if there's no log."""
+        try:
+            if f is None:
+                st = self._os_stat(self._file_name)
+            else:
+                st = os.fstat(f.fileno())
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime, st.st_ctime)
+
+    def _reload(self):
+        """Reads the log again, after another process wrote to it, and
+        merges the values that it wrote with the pending ones."""
+        if self._compactor is not None:
+            # It copied what the log used to be.
+            if self._compactor is not True:
+                self._compactor.join()
+            self._compactor = None
+            if self._compacted is not None:
+                self._compacted = None
+                try:
+                    self._os_unlink(self._compact_name)
+                except OSError:
+                    pass
+        old_index = self._index
+        self._file.close()
+        self._index = {}
+        self._written = set()
+        self._end = 0
+        self._dead = 0
+        self._rewrite = False
+        try:
+            self._file = self._open(self._file_name, "rb")
+        except IOError:
+            self._create()
+            return
+        self._stat = self._file_stat(self._file)
+        self._load()
+        if self.merge is None:
+            return
+        for key, value in list(self._pending.items()):
+            record = self._index.get(key)
+            if record is not None and record != old_index.get(key):
+                try:
+                    other = self._read(key)
+                except KeyError:
+                    continue
+                if other != value:
+                    self._pending[key] = self.merge(key, value, other)
+
+    def _load(self):
+        """Scans the log, and builds the index of its records."""
+        # Reading it all in one go and then dropping it beats seeking
+        # from one record header to the next.
+        data = self._file.read()
+        size = len(data)
+        if size == 0:
+            self._rewrite = True
+            return
+        if data[:len(_magic)] != _magic:
+            self._corrupt()
+            return
+        self._end = offset = start = len(_magic)
+        batch = {}
+        # The last batch, which only gets into the index once its
+        # contents have been checked.
+        last = None
+        while offset + _header.size <= size:
+            klen, vlen, crc = _header.unpack_from(data, offset)
+            length = _header.size + vlen
+            if klen == _commit_key_length:
+                if vlen != _commit.size or offset + length > size:
+                    break
+                value = data[offset + _header.size:offset + length]
+                batch_start, batch_crc = _commit.unpack(value)
+                if _crc32(value) != crc or batch_start != start:
+                    break
+                if last:
+                    self._apply(*last)
+                last = (batch, start, offset, batch_crc, offset + length)
+                offset = start = offset + length
+                batch = {}
+                continue
+            length = length + klen
+            if offset + length > size:
+                break
+            key = _decode_key(data[offset + _header.size:offset + _header.size + klen])
+            try:
+                self._dead = self._dead + batch[key][1]
+            except KeyError:
+                pass
+            batch[key] = (offset, length)
+            offset = offset + length
+        if last:
+            batch, start, commit, batch_crc, end = last
+            if _crc32(data[start:commit]) == batch_crc:
+                self._apply(*last)
+
+    def _apply(self, batch, start, commit, batch_crc, end):
+        """Puts the records of a complete batch into the index."""
+        index = self._index
+        for key, record in batch.items():
+            try:
+                self._dead = self._dead + index[key][1]
+            except KeyError:
+                pass
+            index[key] = record
+        # Commit records are overhead that compacting gets rid of, too.
+        self._dead = self._dead + end - commit
+        self._end = end
+
+    def _corrupt(self):
+        if (ignore_corrupt_dbfiles == 0):
+            raise IOError("Corrupt database: %s" % self._file_name)
+        if (ignore_corrupt_dbfiles == 1):
+            corruption_warning(self._file_name)
+        self._index = {}
+        self._dead = 0
+        self._rewrite = True
+
+    def _needs_compacting(self):
+        return self._dead >= compact_min_size and \
+               self._dead > self._end * compact_ratio
+
+    def _start_compacting(self):
+        snapshot = sorted(self._index.items(), key=lambda item: item[1][0])
+        if threading:
+            self._compactor = threading.Thread(target=self._compact,
+                                               args=(snapshot,))
+            self._compactor.daemon = True
+            self._compactor.start()
+        else:
+            self._compactor = True
+            self._compact(snapshot)
+
+    def _compact(self, snapshot):
+        """Copies the records in 'snapshot', a list of the (key, (offset,
+        size)) of the live records of the log, to a new log.  Leaves the
+        index of the new log and its end in self._compacted, or None if
+        it couldn't be written."""
+        try:
+            src = self._open(self._file_name, "rb")
+            try:
+                dst = self._open(self._compact_name, "wb")
+                try:
+                    dst.write(_magic)
+                    index, end = _write_batch(dst, len(_magic),
+                                              _read_records(src, snapshot))
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+        except (IOError, OSError):
+            self._compacted = None
+            try:
+                self._os_unlink(self._compact_name)
+            except OSError:
+                pass
+        else:
+            self._compacted = (index, end)
+
+    def close(self):
+        if (self._pending or self._rewrite or self._compactor is not None) \
+           and self._flag != "r":
+            self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        self.close()
+
+    def sync(self):
+        self._check_writable()
+        # Other processes can write to the same log, so keep them out
+        # until we're done, and catch up with what they wrote since we
+        # read it.
+        lock = self._lock_file(self._lock_name)
+        try:
+            if self._file_stat() != self._stat:
+                self._reload()
+            self._sync()
+            self._stat = self._file_stat()
+        finally:
+            self._unlock_file(self._lock_name, lock)
+
+    def _sync(self):
+        if self._compactor is not None:
+            if self._compactor is not True:
+                self._compactor.join()
+            self._compactor = None
+            if self._compacted is not None:
+                index, end = self._compacted
+                self._compacted = None
+                self._replace(index, end)
+                return
+        if self._rewrite:
+            self._replace({}, len(_magic), create=True)
+            return
+        if not self._pending:
+            return
+        records = [(key, _record(key, value))
+                   for key, value in self._pending.items()]
+        f = self._open(self._file_name, "r+b")
+        try:
+            index, end = _write_batch(f, self._end, records)
+        finally:
+            f.close()
+        self._committed(index, end)
+
+    def _committed(self, index, end):
+        """Puts the records of a batch that was just written into the
+        index."""
+        for key, record in index.items():
+            try:
+                self._dead = self._dead + self._index[key][1]
+            except KeyError:
+                pass
+            self._index[key] = record
+            self._written.add(key)
+        self._dead = self._dead + _header.size + _commit.size
+        self._end = end
+        self._pending = {}
+
+    def _replace(self, index, end, create=False):
+        """Replaces the log with the compacted log that has the given
+        'index' and 'end' (or with a new one, if 'create' is set), after
+        appending the records that were written since the log was
+        opened, and the pending ones."""
+        keys = self._written | set(self._pending.keys())
+        records = []
+        for key in keys:
+            try:
+                value = self._pending[key]
+            except KeyError:
+                value = self[key]
+            records.append((key, _record(key, value)))
+        if create:
+            f = self._open(self._compact_name, "wb")
+            f.write(_magic)
+        else:
+            f = self._open(self._compact_name, "r+b")
+        try:
+            new_index, end = _write_batch(f, end, records)
+        finally:
+            f.close()
+        dead = 0
+        if not create:
+            # The commit record of the copied batch, too.
+            dead = _header.size + _commit.size
+        for key, record in new_index.items():
+            try:
+                dead = dead + index[key][1]
+            except KeyError:
+                pass
+            index[key] = record
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        # Windows doesn't allow renaming if the file exists, so unlink
+        # it first, chmod'ing it to make sure we can do so (see the
+        # dblite module).  Elsewhere, the rename replaces the log in one
+        # go, so that processes reading it always find it.
+        if not self._replace_by_rename:
+            try:
+                self._os_chmod(self._file_name, 0o777)
+            except OSError:
+                pass
+            try:
+                self._os_unlink(self._file_name)
+            except OSError:
+                pass
+        self._os_rename(self._compact_name, self._file_name)
+        if self._os_chown is not None and self._chown_to > 0:  # don't chown to root or -1
+            try:
+                self._os_chown(self._file_name, self._chown_to, self._chgrp_to)
+            except OSError:
+                pass
+        self._file = self._open(self._file_name, "rb")
+
+        self._index = index
+        self._written = set(new_index.keys())
+        self._pending = {}
+        self._dead = dead + _header.size + _commit.size
+        self._end = end
+        self._rewrite = False
+
+    def _check_writable(self):
+        if (self._flag == "r"):
+            raise IOError("Read-only database: %s" % self._file_name)
+
+    def __getitem__(self, key):
+        try:
+            return self._pending[key]
+        except KeyError:
+            pass
+        return self._read(key)
+
+    def _read(self, key):
+        """Reads the value of 'key' from the log."""
+        offset, size = self._index[key]
+        if self._lock:
+            self._lock.acquire()
+        try:
+            self._file.seek(offset)
+            record = self._file.read(size)
+        finally:
+            if self._lock:
+                self._lock.release()
+        klen, vlen, crc = _header.unpack(record[:_header.size])
+        if _crc32(record[_header.size:]) != crc:
+            if (ignore_corrupt_dbfiles == 0):
+                raise IOError("Corrupt record `%s' in database: %s" %
+                              (key, self._file_name))
+            if (ignore_corrupt_dbfiles == 1):
+                corruption_warning(self._file_name)
+            raise KeyError(key)
+        return record[_header.size + klen:]
+
+    def __setitem__(self, key, value):
+        self._check_writable()
+        if (not is_string(key)):
+            raise TypeError("key `%s' must be a string but is %s" % (key, type(key)))
+        if (not is_bytes(value)):
+            raise TypeError("value `%s' must be a bytes but is %s" % (value, type(value)))
+        self._pending[key] = value
+
+    def keys(self):
+        return list(set(self._index.keys()) | set(self._pending.keys()))
+
+    def has_key(self, key):
+        return key in self
+
+    def __contains__(self, key):
+        return key in self._pending or key in self._index
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def open(file, flag=None, mode=0o666):
+    return dblog(file, flag, mode)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,324 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+import os
+import threading
+import unittest
+
+import TestCmd
+import TestUnit
+
+import SCons.dblog
+
+
+class dblogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test = TestCmd.TestCmd(workdir = '')
+        self.name = self.test.workpath('db')
+        self.file = self.name + SCons.dblog.dblog_suffix
+        self.save_ignore = SCons.dblog.ignore_corrupt_dbfiles
+        self.save_warning = SCons.dblog.corruption_warning
+
+    def tearDown(self):
+        SCons.dblog.ignore_corrupt_dbfiles = self.save_ignore
+        SCons.dblog.corruption_warning = self.save_warning
+
+    def test_open(self):
+        """Test opening a dblog for the various flags"""
+        self.assertRaises(IOError, SCons.dblog.open, self.name, "r")
+        self.assertRaises(IOError, SCons.dblog.open, self.name, "w")
+
+        db = SCons.dblog.open(self.name, "c")
+        assert len(db) == 0, db.keys()
+        db['foo'] = b'bar'
+        db.close()
+        assert os.path.exists(self.file)
+
+        db = SCons.dblog.open(self.file, "r")
+        assert db['foo'] == b'bar', db['foo']
+        self.assertRaises(IOError, db.__setitem__, 'foo', b'baz')
+        self.assertRaises(IOError, db.sync)
+        db.close()
+
+        db = SCons.dblog.open(self.name, "n")
+        assert len(db) == 0, db.keys()
+        db.close()
+        db = SCons.dblog.open(self.name, "r")
+        assert len(db) == 0, db.keys()
+        db.close()
+
+    def test_items(self):
+        """Test setting and getting dblog items"""
+        db = SCons.dblog.open(self.name, "c")
+        self.assertRaises(TypeError, db.__setitem__, 1, b'x')
+        self.assertRaises(TypeError, db.__setitem__, 'x', 1)
+        db['foo'] = b'bar'
+        db['bar'] = b'foo'
+        # Unsynced items are visible.
+        assert db['foo'] == b'bar', db['foo']
+        db.sync()
+        db['foo'] = b'baz'
+        db['blat'] = b''
+        assert 'foo' in db
+        assert db.has_key('blat')
+        assert 'none' not in db
+        self.assertRaises(KeyError, db.__getitem__, 'none')
+        assert sorted(db.keys()) == ['bar', 'blat', 'foo'], db.keys()
+        assert len(db) == 3, len(db)
+        db.close()
+
+        db = SCons.dblog.open(self.name, "w")
+        assert db['foo'] == b'baz', db['foo']
+        assert db['bar'] == b'foo', db['bar']
+        assert db['blat'] == b'', db['blat']
+        assert sorted(db) == ['bar', 'blat', 'foo'], sorted(db)
+        db.close()
+
+    def test_append(self):
+        """Test that syncing only appends the changed items"""
+        db = SCons.dblog.open(self.name, "c")
+        db['foo'] = b'x' * 1000
+        db['bar'] = b'y' * 1000
+        db.close()
+        data = open(self.file, 'rb').read()
+
+        db = SCons.dblog.open(self.name, "w")
+        db['foo'] = b'z'
+        db.close()
+        new_data = open(self.file, 'rb').read()
+        assert new_data[:len(data)] == data
+        assert len(new_data) < len(data) + 100, len(new_data)
+
+        db = SCons.dblog.open(self.name, "r")
+        assert db['foo'] == b'z', db['foo']
+        assert db['bar'] == b'y' * 1000, db['bar']
+        db.close()
+
+    def test_torn_tail(self):
+        """Test that a partly written batch gets dropped"""
+        db = SCons.dblog.open(self.name, "c")
+        db['foo'] = b'bar'
+        db.close()
+        db = SCons.dblog.open(self.name, "w")
+        db['foo'] = b'baz'
+        db['bar'] = b'blat'
+        db.close()
+        data = open(self.file, 'rb').read()
+
+        # Cut the last batch anywhere before its end (with or without
+        # its commit record), and it's left out.
+        for size in (len(data) - 1, len(data) - 20, len(data) - 30):
+            open(self.file, 'wb').write(data[:size])
+            db = SCons.dblog.open(self.name, "r")
+            assert db['foo'] == b'bar', (size, db['foo'])
+            assert 'bar' not in db, size
+            db.close()
+
+        # A batch with garbage in it is left out, too.
+        garbage = data.replace(b'blat', b'blot')
+        open(self.file, 'wb').write(garbage)
+        db = SCons.dblog.open(self.name, "w")
+        assert db['foo'] == b'bar', db['foo']
+        assert 'bar' not in db
+        # Writing goes on from the end of the last complete batch.
+        db['bar'] = b'new'
+        db.close()
+        db = SCons.dblog.open(self.name, "r")
+        assert db['foo'] == b'bar', db['foo']
+        assert db['bar'] == b'new', db['bar']
+        db.close()
+
+    def test_concurrent_sync(self):
+        """Test syncing a dblog that another process wrote"""
+        db = SCons.dblog.open(self.name, "c")
+        db['foo'] = b'foo'
+        db['bar'] = b'bar'
+        db.close()
+
+        db1 = SCons.dblog.open(self.name, "w")
+        db2 = SCons.dblog.open(self.name, "w")
+        db1['foo'] = b'foo 1'
+        db1['one'] = b'1'
+        db1.sync()
+        db2['bar'] = b'bar 2'
+        db2['two'] = b'2'
+        db2.sync()
+        # Neither loses what the other wrote.
+        db = SCons.dblog.open(self.name, "r")
+        assert db['foo'] == b'foo 1', db['foo']
+        assert db['bar'] == b'bar 2', db['bar']
+        assert db['one'] == b'1', db['one']
+        assert db['two'] == b'2', db['two']
+        db.close()
+
+        # Only keys that both set get merged.
+        merged = []
+        def merge(key, value, other_value):
+            merged.append((key, value, other_value))
+            return value + other_value
+        db2.merge = merge
+        db1['foo'] = b'x'
+        db1['bar'] = b'y'
+        db1.sync()
+        db2['foo'] = b'z'
+        db2['one'] = b'1'
+        db2.sync()
+        assert merged == [('foo', b'z', b'x')], merged
+        db = SCons.dblog.open(self.name, "r")
+        assert db['foo'] == b'zx', db['foo']
+        assert db['bar'] == b'y', db['bar']
+        assert db['one'] == b'1', db['one']
+        db.close()
+        db1.close()
+        db2.close()
+
+    def test_corrupt(self):
+        """Test opening a dblog that isn't one"""
+        open(self.file, 'wb').write(b'not a dblog')
+        SCons.dblog.ignore_corrupt_dbfiles = 0
+        self.assertRaises(IOError, SCons.dblog.open, self.name, "c")
+
+        warnings = []
+        SCons.dblog.ignore_corrupt_dbfiles = 1
+        SCons.dblog.corruption_warning = warnings.append
+        db = SCons.dblog.open(self.name, "c")
+        assert warnings == [self.file], warnings
+        assert len(db) == 0, db.keys()
+        db['foo'] = b'bar'
+        db.close()
+        db = SCons.dblog.open(self.name, "r")
+        assert db['foo'] == b'bar', db['foo']
+        db.close()
+
+    def test_compact(self):
+        """Test compacting a dblog"""
+        db = SCons.dblog.open(self.name, "c")
+        db['foo'] = b'x' * 1000
+        db['bar'] = b'y' * 1000
+        db.close()
+        for c in (b'0', b'1', b'2'):
+            db = SCons.dblog.open(self.name, "w")
+            assert db._compactor is None
+            db['foo'] = c * 1000
+            db.close()
+        size = os.path.getsize(self.file)
+        assert size > 5000, size
+
+        save = SCons.dblog.compact_min_size
+        SCons.dblog.compact_min_size = 0
+        try:
+            # Opening it starts compacting it, and it gets swapped in
+            # (with the changes since it was opened) when it's synced.
+            db = SCons.dblog.open(self.name, "w")
+            assert db._compactor is not None
+            db['blat'] = b'z'
+            db.sync()
+            assert db._compactor is None
+            assert not os.path.exists(db._compact_name)
+            size = os.path.getsize(self.file)
+            assert size < 2500, size
+            assert db['foo'] == b'2' * 1000, db['foo']
+            assert db['blat'] == b'z', db['blat']
+            db['bar'] = b'y'
+            db.close()
+
+            db = SCons.dblog.open(self.name, "r")
+            assert db._compactor is None
+            assert sorted(db.keys()) == ['bar', 'blat', 'foo'], db.keys()
+            assert db['foo'] == b'2' * 1000, db['foo']
+            assert db['bar'] == b'y', db['bar']
+            assert db['blat'] == b'z', db['blat']
+            db.close()
+        finally:
+            SCons.dblog.compact_min_size = save
+
+    def test_compact_while_reading(self):
+        """Test reading a dblog while another one compacts it"""
+        db = SCons.dblog.open(self.name, "c")
+        db['foo'] = b'x' * 1000
+        db['bar'] = b'y' * 1000
+        db.close()
+        for c in (b'0', b'1', b'2'):
+            db = SCons.dblog.open(self.name, "w")
+            db['foo'] = c * 1000
+            db.close()
+
+        save = SCons.dblog.compact_min_size
+        SCons.dblog.compact_min_size = 0
+        try:
+            db = SCons.dblog.open(self.name, "w")
+            assert db._compactor is not None
+            db._replace_by_rename = True
+            found = []
+            read = []
+            def reader():
+                r = SCons.dblog.open(self.name, "r")
+                read.append((r['foo'], r['bar']))
+                r.close()
+            def rename(src, dst, real_rename=db._os_rename):
+                found.append(os.path.exists(self.file))
+                # A reader that comes along now waits for the lock,
+                # and reads the compacted log.
+                t = threading.Thread(target=reader)
+                t.start()
+                t.join(0.1)
+                found.append(t.is_alive())
+                real_rename(src, dst)
+                threads.append(t)
+            threads = []
+            db._os_rename = rename
+            db.sync()
+            for t in threads:
+                t.join()
+            assert found == [True, True], found
+            assert read == [(b'2' * 1000, b'y' * 1000)], read
+            assert os.path.getsize(self.file) < 2500
+            db.close()
+        finally:
+            SCons.dblog.compact_min_size = save
+
+        # Where renaming can't replace a file, it gets removed first.
+        db = SCons.dblog.open(self.name, "w")
+        db._replace_by_rename = False
+        unlinked = []
+        def unlink(path, real_unlink=db._os_unlink):
+            unlinked.append(path)
+            real_unlink(path)
+        db._os_unlink = unlink
+        db._rewrite = True
+        db.sync()
+        assert unlinked == [self.file], unlinked
+        db.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(dblogTestCase, 'test_')
+    TestUnit.run(suite)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,259 @@
+"""SCons.dbsqlite
+
+A dbm-like database of string keys and bytes values, kept in an SQLite
+database file.
+
+This is an alternative to the SCons.dblite module for large .sconsign
+databases.  Values that get set are kept in memory until the database
+is synced, which writes just them (for SConsign, the entries of the
+directories that changed) in a single transaction.  Values only get
+read from the file when they're asked for.
+
+The database is put in write-ahead logging (WAL) mode, so other
+processes (like the sconsign script) can open it read-only and look
+at it while a build is writing to it.
+"""
+
+from __future__ import print_function
+
+import os
+import sqlite3
+
+try:
+    import threading
+except ImportError:
+    threading = None
+
+ignore_corrupt_dbfiles = 0
+
+
+def corruption_warning(filename):
+    print("Warning: Discarding corrupt database:", filename)
+
+
+try:
+    unicode
+except NameError:
+    def is_string(s):
+        return isinstance(s, str)
+else:
+    def is_string(s):
+        return type(s) in (str, unicode)
+
+
+def is_bytes(s):
+    return isinstance(s, bytes)
+
+
+dbsqlite_suffix = '.sqlite'
+
+# How long to wait (in seconds) for another process that's writing to
+# the database.
+timeout = 60
+
+
+class dbsqlite(object):
+
+    def __init__(self, file_base_name, flag, mode):
+        assert flag in (None, "r", "w", "c", "n")
+        if (flag is None): flag = "r"
+
+        base, ext = os.path.splitext(file_base_name)
+        if ext == dbsqlite_suffix:
+            # There's already a suffix on the file name, don't add one.
+            self._file_name = file_base_name
+        else:
+            self._file_name = file_base_name + dbsqlite_suffix
+
+        self._flag = flag
+        self._mode = mode
+        self._pending = {}
+        self._conn = None
+        # What PRAGMA data_version was when we opened the database; it
+        # changes when another process writes to it.
+        self._version = None
+        # If set, merge(key, value, other_value) gets called by sync()
+        # for a key that we set to 'value', and that another process
+        # set to 'other_value' since we opened the database, and
+        # returns the value to write.  Without it, our value wins.
+        self.merge = None
+        if threading:
+            self._lock = threading.Lock()
+        else:
+            self._lock = None
+
+        if flag in ("r", "w") and not os.path.exists(self._file_name):
+            raise IOError("No such database: %s" % self._file_name)
+
+        try:
+            self._connect()
+        except sqlite3.DatabaseError as e:
+            if (ignore_corrupt_dbfiles == 0):
+                raise IOError("Corrupt database: %s: %s" % (self._file_name, e))
+            if (ignore_corrupt_dbfiles == 1):
+                corruption_warning(self._file_name)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if flag == "r":
+                return
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.unlink(self._file_name + suffix)
+                except OSError:
+                    pass
+            self._connect()
+
+    def _connect(self):
+        if self._flag != "r":
+            self._create()
+        # The connection is in autocommit mode (isolation_level=None),
+        # and sync() runs its own transaction.
+        self._conn = sqlite3.connect(self._file_name, timeout=timeout,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.text_factory = str
+        if self._flag == "r":
+            self._conn.execute("PRAGMA query_only = ON")
+            self._conn.execute("SELECT count(*) FROM sconsign").fetchone()
+            return
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # In WAL mode, this keeps the database consistent, it just
+        # might lose the last transaction if the machine crashes.
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sconsign "
+                           "(key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        if self._flag == "n":
+            self._conn.execute("DELETE FROM sconsign")
+        else:
+            self._conn.execute("SELECT count(*) FROM sconsign").fetchone()
+        self._version = self._data_version()
+
+    def _create(self):
+        """Creates an empty database file with our mode (less the
+        umask) if there isn't one, instead of leaving it to sqlite3,
+        which uses its own.  Its journal files get the same mode."""
+        try:
+            fd = os.open(self._file_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         self._mode)
+        except OSError:
+            # It's already there.
+            return
+        os.close(fd)
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()
+
+    def _query(self, sql, args=()):
+        if self._conn is None:
+            return []
+        if self._lock:
+            self._lock.acquire()
+        try:
+            return self._conn.execute(sql, args).fetchall()
+        finally:
+            if self._lock:
+                self._lock.release()
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._pending:
+            self.sync()
+        self._conn.close()
+        self._conn = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except sqlite3.Error:
+            pass
+
+    def sync(self):
+        self._check_writable()
+        if not self._pending:
+            return
+        if self._lock:
+            self._lock.acquire()
+        try:
+            # This waits for any other process that's writing to the
+            # database, and keeps them out until we're done.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.merge is not None and \
+                   self._data_version() != self._version:
+                    self._merge()
+                rows = [(key, sqlite3.Binary(value))
+                        for key, value in self._pending.items()]
+                self._conn.executemany("INSERT OR REPLACE INTO sconsign "
+                                       "(key, value) VALUES (?, ?)", rows)
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        finally:
+            if self._lock:
+                self._lock.release()
+        self._pending = {}
+
+    def _merge(self):
+        """Merges the values that another process wrote since we opened
+        the database with the pending ones."""
+        for key, value in list(self._pending.items()):
+            rows = self._conn.execute("SELECT value FROM sconsign "
+                                      "WHERE key = ?", (key,)).fetchall()
+            if rows:
+                other = bytes(rows[0][0])
+                if other != value:
+                    self._pending[key] = self.merge(key, value, other)
+        self._version = self._data_version()
+
+    def _check_writable(self):
+        if (self._flag == "r"):
+            raise IOError("Read-only database: %s" % self._file_name)
+
+    def __getitem__(self, key):
+        try:
+            return self._pending[key]
+        except KeyError:
+            pass
+        rows = self._query("SELECT value FROM sconsign WHERE key = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return bytes(rows[0][0])
+
+    def __setitem__(self, key, value):
+        self._check_writable()
+        if (not is_string(key)):
+            raise TypeError("key `%s' must be a string but is %s" % (key, type(key)))
+        if (not is_bytes(value)):
+            raise TypeError("value `%s' must be a bytes but is %s" % (value, type(value)))
+        self._pending[key] = value
+
+    def keys(self):
+        keys = set(row[0] for row in self._query("SELECT key FROM sconsign"))
+        return list(keys | set(self._pending.keys()))
+
+    def has_key(self, key):
+        return key in self
+
+    def __contains__(self, key):
+        if key in self._pending:
+            return True
+        return bool(self._query("SELECT 1 FROM sconsign WHERE key = ?", (key,)))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def open(file, flag=None, mode=0o666):
+    return dbsqlite(file, flag, mode)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
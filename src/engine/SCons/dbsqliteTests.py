@@ -0,0 +1,225 @@
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+import os
+import stat
+import sys
+import unittest
+
+import TestCmd
+import TestUnit
+
+try:
+    import SCons.dbsqlite
+except ImportError:
+    SCons_dbsqlite = None
+else:
+    SCons_dbsqlite = SCons.dbsqlite
+
+
+class dbsqliteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test = TestCmd.TestCmd(workdir = '')
+        self.name = self.test.workpath('db')
+        self.file = self.name + SCons_dbsqlite.dbsqlite_suffix
+        self.save_ignore = SCons_dbsqlite.ignore_corrupt_dbfiles
+        self.save_warning = SCons_dbsqlite.corruption_warning
+
+    def tearDown(self):
+        SCons_dbsqlite.ignore_corrupt_dbfiles = self.save_ignore
+        SCons_dbsqlite.corruption_warning = self.save_warning
+
+    def test_open(self):
+        """Test opening a dbsqlite database for the various flags"""
+        self.assertRaises(IOError, SCons_dbsqlite.open, self.name, "r")
+        self.assertRaises(IOError, SCons_dbsqlite.open, self.name, "w")
+
+        db = SCons_dbsqlite.open(self.name, "c")
+        assert len(db) == 0, db.keys()
+        db['foo'] = b'bar'
+        db.close()
+        assert os.path.exists(self.file)
+
+        db = SCons_dbsqlite.open(self.file, "r")
+        assert db['foo'] == b'bar', db['foo']
+        self.assertRaises(IOError, db.__setitem__, 'foo', b'baz')
+        self.assertRaises(IOError, db.sync)
+        db.close()
+
+        db = SCons_dbsqlite.open(self.name, "n")
+        assert len(db) == 0, db.keys()
+        db.close()
+        db = SCons_dbsqlite.open(self.name, "r")
+        assert len(db) == 0, db.keys()
+        db.close()
+
+    def test_mode(self):
+        """Test creating a dbsqlite database with a mode"""
+        if sys.platform == 'win32':
+            return
+        umask = os.umask(0o022)
+        try:
+            db = SCons_dbsqlite.open(self.name, "c", 0o640)
+            db['foo'] = b'bar'
+            db.close()
+        finally:
+            os.umask(umask)
+        mode = stat.S_IMODE(os.stat(self.file).st_mode)
+        assert mode == 0o640, oct(mode)
+
+        # An existing database keeps its mode.
+        db = SCons_dbsqlite.open(self.name, "c", 0o600)
+        db.close()
+        mode = stat.S_IMODE(os.stat(self.file).st_mode)
+        assert mode == 0o640, oct(mode)
+
+    def test_items(self):
+        """Test setting and getting dbsqlite items"""
+        db = SCons_dbsqlite.open(self.name, "c")
+        self.assertRaises(TypeError, db.__setitem__, 1, b'x')
+        self.assertRaises(TypeError, db.__setitem__, 'x', 1)
+        db['foo'] = b'bar'
+        db['bar'] = b'\x00\xff'
+        # Unsynced items are visible.
+        assert db['foo'] == b'bar', db['foo']
+        db.sync()
+        db['foo'] = b'baz'
+        db['blat'] = b''
+        assert 'foo' in db
+        assert db.has_key('blat')
+        assert 'none' not in db
+        self.assertRaises(KeyError, db.__getitem__, 'none')
+        assert sorted(db.keys()) == ['bar', 'blat', 'foo'], db.keys()
+        assert len(db) == 3, len(db)
+        db.close()
+
+        db = SCons_dbsqlite.open(self.name, "w")
+        assert db['foo'] == b'baz', db['foo']
+        assert db['bar'] == b'\x00\xff', db['bar']
+        assert db['blat'] == b'', db['blat']
+        assert sorted(db) == ['bar', 'blat', 'foo'], sorted(db)
+        db.close()
+
+    def test_concurrent_read(self):
+        """Test reading a dbsqlite database while it's being written"""
+        db = SCons_dbsqlite.open(self.name, "c")
+        db['foo'] = b'bar'
+        db.sync()
+
+        reader = SCons_dbsqlite.open(self.name, "r")
+        assert reader['foo'] == b'bar', reader['foo']
+        db['foo'] = b'baz'
+        db['bar'] = b'blat'
+        # Nothing shows up until it's synced...
+        assert reader['foo'] == b'bar', reader['foo']
+        assert 'bar' not in reader
+        db.sync()
+        # ...and then all of it does.
+        assert reader['foo'] == b'baz', reader['foo']
+        assert reader['bar'] == b'blat', reader['bar']
+        reader.close()
+        db.close()
+
+    def test_concurrent_sync(self):
+        """Test syncing a dbsqlite database that another process wrote"""
+        db = SCons_dbsqlite.open(self.name, "c")
+        db['foo'] = b'foo'
+        db['bar'] = b'bar'
+        db.close()
+
+        db1 = SCons_dbsqlite.open(self.name, "w")
+        db2 = SCons_dbsqlite.open(self.name, "w")
+        db1['foo'] = b'foo 1'
+        db1['one'] = b'1'
+        db1.sync()
+        db2['bar'] = b'bar 2'
+        db2['two'] = b'2'
+        db2.sync()
+        # Neither loses what the other wrote.
+        db = SCons_dbsqlite.open(self.name, "r")
+        assert db['foo'] == b'foo 1', db['foo']
+        assert db['bar'] == b'bar 2', db['bar']
+        assert db['one'] == b'1', db['one']
+        assert db['two'] == b'2', db['two']
+        db.close()
+
+        # Only keys that both set get merged.
+        merged = []
+        def merge(key, value, other_value):
+            merged.append((key, value, other_value))
+            return value + other_value
+        db2.merge = merge
+        db1['foo'] = b'x'
+        db1['bar'] = b'y'
+        db1.sync()
+        db2['foo'] = b'z'
+        db2['one'] = b'1'
+        db2.sync()
+        assert merged == [('foo', b'z', b'x')], merged
+        db = SCons_dbsqlite.open(self.name, "r")
+        assert db['foo'] == b'zx', db['foo']
+        assert db['bar'] == b'y', db['bar']
+        assert db['one'] == b'1', db['one']
+        db.close()
+        db1.close()
+        db2.close()
+
+    def test_corrupt(self):
+        """Test opening a dbsqlite database that isn't one"""
+        open(self.file, 'wb').write(b'not a database' * 100)
+        SCons_dbsqlite.ignore_corrupt_dbfiles = 0
+        self.assertRaises(IOError, SCons_dbsqlite.open, self.name, "c")
+
+        warnings = []
+        SCons_dbsqlite.ignore_corrupt_dbfiles = 1
+        SCons_dbsqlite.corruption_warning = warnings.append
+        db = SCons_dbsqlite.open(self.name, "r")
+        assert warnings == [self.file], warnings
+        assert len(db) == 0, db.keys()
+        db.close()
+
+        del warnings[:]
+        db = SCons_dbsqlite.open(self.name, "c")
+        assert warnings == [self.file], warnings
+        assert len(db) == 0, db.keys()
+        db['foo'] = b'bar'
+        db.close()
+        db = SCons_dbsqlite.open(self.name, "r")
+        assert db['foo'] == b'bar', db['foo']
+        db.close()
+
+
+if __name__ == "__main__":
+    if SCons_dbsqlite is None:
+        print("No sqlite3 module, skipping the SCons.dbsqlite tests.")
+    else:
+        suite = unittest.makeSuite(dbsqliteTestCase, 'test_')
+        TestUnit.run(suite)
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
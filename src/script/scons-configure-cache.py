@@ -41,26 +41,204 @@ import argparse
 import glob
 import json
 import os
+import sys
+
+##############################################################################
+# BEGIN STANDARD SCons SCRIPT HEADER
+#
+# This is the cut-and-paste logic so that a self-contained script can
+# interoperate correctly with different SCons versions and installation
+# locations for the engine.  If you modify anything in this section, you
+# should also change other scripts that use this same header.
+##############################################################################
+
+# Strip the script directory from sys.path() so on case-insensitive
+# (WIN32) systems Python doesn't think that the "scons" script is the
+# "SCons" package.  Replace it with our own library directories
+# (version-specific first, in case they installed by hand there,
+# followed by generic) so we pick up the right version of the build
+# engine modules if they're in either directory.
+
+
+script_dir = sys.path[0]
+
+if script_dir in sys.path:
+    sys.path.remove(script_dir)
+
+libs = []
+
+if "SCONS_LIB_DIR" in os.environ:
+    libs.append(os.environ["SCONS_LIB_DIR"])
+
+# - running from source takes priority (since 2.3.2), excluding SCONS_LIB_DIR settings
+script_path = os.path.abspath(os.path.dirname(__file__))
+source_path = os.path.join(script_path, '..', 'engine')
+libs.append(source_path)
+
+local_version = 'scons-local-' + __version__
+local = 'scons-local'
+if script_dir:
+    local_version = os.path.join(script_dir, local_version)
+    local = os.path.join(script_dir, local)
+libs.append(os.path.abspath(local_version))
+libs.append(os.path.abspath(local))
+
+scons_version = 'scons-%s' % __version__
+
+# preferred order of scons lookup paths
+prefs = []
+
+try:
+    import pkg_resources
+except ImportError:
+    pass
+else:
+    # when running from an egg add the egg's directory
+    try:
+        d = pkg_resources.get_distribution('scons')
+    except pkg_resources.DistributionNotFound:
+        pass
+    else:
+        prefs.append(d.location)
+
+if sys.platform == 'win32':
+    # sys.prefix is (likely) C:\Python*;
+    # check only C:\Python*.
+    prefs.append(sys.prefix)
+    prefs.append(os.path.join(sys.prefix, 'Lib', 'site-packages'))
+else:
+    # On other (POSIX) platforms, things are more complicated due to
+    # the variety of path names and library locations.  Try to be smart
+    # about it.
+    if script_dir == 'bin':
+        # script_dir is `pwd`/bin;
+        # check `pwd`/lib/scons*.
+        prefs.append(os.getcwd())
+    else:
+        if script_dir == '.' or script_dir == '':
+            script_dir = os.getcwd()
+        head, tail = os.path.split(script_dir)
+        if tail == "bin":
+            # script_dir is /foo/bin;
+            # check /foo/lib/scons*.
+            prefs.append(head)
+
+    head, tail = os.path.split(sys.prefix)
+    if tail == "usr":
+        # sys.prefix is /foo/usr;
+        # check /foo/usr/lib/scons* first,
+        # then /foo/usr/local/lib/scons*.
+        prefs.append(sys.prefix)
+        prefs.append(os.path.join(sys.prefix, "local"))
+    elif tail == "local":
+        h, t = os.path.split(head)
+        if t == "usr":
+            # sys.prefix is /foo/usr/local;
+            # check /foo/usr/local/lib/scons* first,
+            # then /foo/usr/lib/scons*.
+            prefs.append(sys.prefix)
+            prefs.append(head)
+        else:
+            # sys.prefix is /foo/local;
+            # check only /foo/local/lib/scons*.
+            prefs.append(sys.prefix)
+    else:
+        # sys.prefix is /foo (ends in neither /usr or /local);
+        # check only /foo/lib/scons*.
+        prefs.append(sys.prefix)
+
+    temp = [os.path.join(x, 'lib') for x in prefs]
+    temp.extend([os.path.join(x,
+                                           'lib',
+                                           'python' + sys.version[:3],
+                                           'site-packages') for x in prefs])
+    prefs = temp
+
+    # Add the parent directory of the current python's library to the
+    # preferences.  On SuSE-91/AMD64, for example, this is /usr/lib64,
+    # not /usr/lib.
+    try:
+        libpath = os.__file__
+    except AttributeError:
+        pass
+    else:
+        # Split /usr/libfoo/python*/os.py to /usr/libfoo/python*.
+        libpath, tail = os.path.split(libpath)
+        # Split /usr/libfoo/python* to /usr/libfoo
+        libpath, tail = os.path.split(libpath)
+        # Check /usr/libfoo/scons*.
+        prefs.append(libpath)
+
+# Look first for 'scons-__version__' in all of our preference libs,
+# then for 'scons'.
+libs.extend([os.path.join(x, scons_version) for x in prefs])
+libs.extend([os.path.join(x, 'scons') for x in prefs])
+
+sys.path = libs + sys.path
+
+##############################################################################
+# END STANDARD SCons SCRIPT HEADER
+##############################################################################
+
+import SCons.CacheDir
+import SCons.Util
+
+def hash_format_dirs():
+    """Returns the subdirectories that hold the entries of the hash
+    formats other than MD5 (see CacheDir.cachepath())."""
+    return [f for f in SCons.Util.hash_formats
+            if f != 'md5' and os.path.isdir(f)]
 
 def rearrange_cache_entries(current_prefix_len, new_prefix_len):
     print('Changing prefix length from', current_prefix_len, 'to', new_prefix_len)
+    rearrange_entries('', current_prefix_len, new_prefix_len)
+    for top in hash_format_dirs():
+        rearrange_entries(top, current_prefix_len, new_prefix_len)
+
+    # The entries in the index have the old paths.
+    reset_usage(None, None)
+
+def rearrange_entries(top, current_prefix_len, new_prefix_len):
+    # List the prefix directories before any new ones get made.
+    old_dirs = []
+    for dir in sorted(os.listdir(top or '.')):
+        if not top and dir in SCons.Util.hash_formats:
+            continue
+        if os.path.isdir(os.path.join(top, dir)):
+            old_dirs.append(os.path.join(top, dir))
+
     dirs = set()
-    old_dirs = set()
-    for file in glob.iglob(os.path.join('*', '*')):
-        name = os.path.basename(file)
-        dir = name[:current_prefix_len].upper()
-        if dir not in old_dirs:
-            print('Migrating', dir)
-            old_dirs.add(dir)
-        dir = name[:new_prefix_len].upper()
-        if dir not in dirs:
-            os.mkdir(dir)
-            dirs.add(dir)
-        os.rename(file, os.path.join(dir, name))
+    for old_dir in old_dirs:
+        print('Migrating', old_dir)
+        for name in os.listdir(old_dir):
+            dir = os.path.join(top, name[:new_prefix_len].upper())
+            if dir not in dirs:
+                if not os.path.isdir(dir):
+                    os.mkdir(dir)
+                dirs.add(dir)
+            os.rename(os.path.join(old_dir, name), os.path.join(dir, name))
 
     # Now delete the original directories
     for dir in old_dirs:
-        os.rmdir(dir)
+        if dir not in dirs:
+            os.rmdir(dir)
+
+def reset_usage(current_limit, new_limit):
+    # When a cache gets a limit, it has entries that aren't in the index
+    # yet, so have the next prune look for them.
+    if os.path.exists(SCons.CacheDir.usage_name):
+        os.unlink(SCons.CacheDir.usage_name)
+
+def size(value):
+    """Converts a size like 500M or 2G (or just a number of bytes) to
+    a number of bytes."""
+    units = {'K' : 2**10, 'M' : 2**20, 'G' : 2**30, 'T' : 2**40}
+    try:
+        if value[-1:].upper() in units:
+            return int(float(value[:-1]) * units[value[-1:].upper()])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid size: %r' % value)
 
 # This dictionary should have one entry per entry in the cache config
 # Each entry should have the following:
@@ -83,6 +261,36 @@ config_entries = {
             'type' : int
             },
         'converter' : rearrange_cache_entries
+    },
+    'max_size' : {
+        'default' : 0,
+        'command-line' : {
+            'help' : 'Maximum size of the cache (like 500M or 2G); '
+                     'the least recently used entries get removed '
+                     'when it gets bigger. 0 means no limit',
+            'metavar' : '<size>',
+            'type' : size
+            },
+        'converter' : reset_usage
+    },
+    'max_entries' : {
+        'default' : 0,
+        'command-line' : {
+            'help' : 'Maximum number of entries in the cache; '
+                     'the least recently used entries get removed '
+                     'when it has more. 0 means no limit',
+            'metavar' : '<number>',
+            'type' : int
+            },
+        'converter' : reset_usage
+    },
+    'compression' : {
+        'default' : 'none',
+        'command-line' : {
+            'help' : 'Codec to compress the files pushed to the cache with; '
+                     'the entries that are already in it are left as they are',
+            'choices' : ['none'] + sorted(SCons.CacheDir.codecs.keys())
+            }
     }
 }
 parser = argparse.ArgumentParser(
@@ -98,10 +306,14 @@ parser.add_argument('cache-dir', help='Path to scons cache directory')
 for param in config_entries:
     parser.add_argument('--' + param.replace('_', '-'), 
                         **config_entries[param]['command-line'])
+parser.add_argument('--prune', action='store_true',
+                    help='Remove the least recently used entries until the '
+                         'cache is within its max size and max entries')
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
 
 # Get the command line as a dict without any of the unspecified entries.
-args = dict([x for x in vars(parser.parse_args()).items() if x[1]])
+args = dict([x for x in vars(parser.parse_args()).items() if x[1] is not None])
+prune = args.pop('prune')
 
 # It seems somewhat strange to me, but positional arguments don't get the -
 # in the name changed to _, whereas optional arguments do...
@@ -109,8 +321,10 @@ os.chdir(args['cache-dir'])
 del args['cache-dir']
 
 if not os.path.exists('config'):
-    # Validate the only files in the directory are directories 0-9, a-f
+    # Validate the only files in the directory are directories 0-9, a-f,
+    # and those of the other hash formats
     expected = [ '{:X}'.format(x) for x in range(0, 16) ]
+    expected.extend([f for f in SCons.Util.hash_formats if f != 'md5'])
     if not set(os.listdir('.')).issubset(expected):
         raise RuntimeError("This doesn't look like a version 1 cache directory")
     config = dict()
@@ -139,3 +353,8 @@ for key in args:
 # and write the updated config file
 with open('config', 'w') as conf:
     json.dump(config, conf)
+
+if prune:
+    removed = SCons.CacheDir.prune('.', config['max_size'],
+                                   config['max_entries'])
+    print('Removed', removed, 'entries')
@@ -191,15 +191,22 @@ import imp
 
 import SCons.SConsign
 
+# The file name suffixes of the dbm-like modules that come with SCons.
+SCons_DB_Modules = [('.dblite', 'SCons.dblite'),
+                    ('.dblog',  'SCons.dblog'),
+                    ('.sqlite', 'SCons.dbsqlite')]
+
 def my_whichdb(filename):
-    if filename[-7:] == ".dblite":
-        return "SCons.dblite"
-    try:
-        f = open(filename + ".dblite", "rb")
-        f.close()
-        return "SCons.dblite"
-    except IOError:
-        pass
+    for suffix, dbm_name in SCons_DB_Modules:
+        if filename.endswith(suffix):
+            return dbm_name
+    for suffix, dbm_name in SCons_DB_Modules:
+        try:
+            f = open(filename + suffix, "rb")
+            f.close()
+            return dbm_name
+        except IOError:
+            pass
     return _orig_whichdb(filename)
 
 
@@ -221,6 +228,17 @@ def my_import(mname):
         fp, pathname, description = imp.find_module(mname)
     return imp.load_module(mname, fp, pathname, description)
 
+def import_dbm(dbm_name):
+    if dbm_name not in [m for s, m in SCons_DB_Modules]:
+        return my_import(dbm_name)
+    __import__(dbm_name)
+    dbm = sys.modules[dbm_name]
+    # Ensure that we don't ignore corrupt DB files,
+    # this was handled by calling my_import('SCons.dblite')
+    # again in earlier versions...
+    dbm.ignore_corrupt_dbfiles = 0
+    return dbm
+
 class Flagger(object):
     default_value = 1
     def __setitem__(self, item, value):
@@ -428,7 +446,9 @@ class Do_SConsignDB(object):
 
     def printentries(self, dir, val):
         print('=== ' + dir + ':')
-        printentries(pickle.loads(val), dir)
+        sconsign = SCons.SConsign.Base()
+        sconsign.entries, sconsign.encoded = SCons.SConsign.decode_entries(val)
+        printentries(sconsign.all_entries(), dir)
 
 def Do_SConsignDir(name):
     try:
@@ -438,6 +458,7 @@ def Do_SConsignDir(name):
         return
     try:
         sconsign = SCons.SConsign.Dir(fp)
+        entries = sconsign.all_entries()
     except KeyboardInterrupt:
         raise
     except pickle.UnpicklingError:
@@ -446,7 +467,7 @@ def Do_SConsignDir(name):
     except Exception as e:
         sys.stderr.write("sconsign: ignoring invalid .sconsign file `%s': %s\n" % (name, e))
         return
-    printentries(sconsign.entries, args[0])
+    printentries(entries, args[0])
 
 ##############################################################################
 
@@ -490,19 +511,13 @@ for o, a in opts:
         # Try to map the given DB format to a known module
         # name, that we can then try to import...
         Module_Map = {'dblite'   : 'SCons.dblite',
+                      'dblog'    : 'SCons.dblog',
+                      'sqlite'   : 'SCons.dbsqlite',
                       'sconsign' : None}
         dbm_name = Module_Map.get(a, a)
         if dbm_name:
             try:
-                if dbm_name != "SCons.dblite":
-                    dbm = my_import(dbm_name)
-                else:
-                    import SCons.dblite
-                    dbm = SCons.dblite
-                    # Ensure that we don't ignore corrupt DB files,
-                    # this was handled by calling my_import('SCons.dblite')
-                    # again in earlier versions...
-                    SCons.dblite.ignore_corrupt_dbfiles = 0
+                dbm = import_dbm(dbm_name)
             except:
                 sys.stderr.write("sconsign: illegal file format `%s'\n" % a)
                 print(helpstr)
@@ -534,16 +549,10 @@ else:
     for a in args:
         dbm_name = whichdb(a)
         if dbm_name:
-            Map_Module = {'SCons.dblite' : 'dblite'}
-            if dbm_name != "SCons.dblite":
-                dbm = my_import(dbm_name)
-            else:
-                import SCons.dblite
-                dbm = SCons.dblite
-                # Ensure that we don't ignore corrupt DB files,
-                # this was handled by calling my_import('SCons.dblite')
-                # again in earlier versions...
-                SCons.dblite.ignore_corrupt_dbfiles = 0
+            Map_Module = {'SCons.dblite'   : 'dblite',
+                          'SCons.dblog'    : 'dblog',
+                          'SCons.dbsqlite' : 'sqlite'}
+            dbm = import_dbm(dbm_name)
             Do_SConsignDB(Map_Module.get(dbm_name, dbm_name), dbm)(a)
         else:
             Do_SConsignDir(a)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test retrieving derived files from, and pushing them to, an HTTP
+cache server.
+"""
+
+import threading
+
+import TestSCons
+
+import SCons.CacheDirHTTP
+
+test = TestSCons.TestSCons()
+
+test.subdir('cache')
+
+server = SCons.CacheDirHTTP.CacheServer(test.workpath('cache'))
+thread = threading.Thread(target=server.serve_forever)
+thread.daemon = True
+thread.start()
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s/cache')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+env.Cat('ccc.out', 'ccc.in')
+""" % server.url())
+
+test.write('aaa.in', "aaa.in\n")
+test.write('bbb.in', "bbb.in\n")
+test.write('ccc.in', "ccc.in\n")
+
+test.run(arguments = '-j 2 .')
+
+test.must_match('aaa.out', "aaa.in\n")
+test.must_match('bbb.out', "bbb.in\n")
+test.must_match('ccc.out', "ccc.in\n")
+test.fail_test(test.stdout().count('Retrieved ') != 0)
+
+test.run(arguments = '-c .')
+test.must_not_exist('aaa.out')
+
+test.run(arguments = '-j 2 .')
+
+test.must_match('aaa.out', "aaa.in\n")
+test.must_match('bbb.out', "bbb.in\n")
+test.must_match('ccc.out', "ccc.in\n")
+test.fail_test(test.stdout().count('Retrieved ') != 3)
+
+# A server that can't be reached just doesn't get used.
+server.shutdown()
+server.server_close()
+
+test.run(arguments = '-c .')
+
+expect = r"""
+scons: warning: Unable to use cache server %s/cache: .*
+""" % server.url()
+
+test.run(arguments = '.', stderr = expect + TestSCons.file_expr,
+         match = TestSCons.match_re_dotall)
+
+test.must_match('aaa.out', "aaa.in\n")
+test.fail_test(test.stdout().count('Retrieved ') != 0)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
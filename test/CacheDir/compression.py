@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test pushing compressed files to a CacheDir with a compression codec in
+its config, and retrieving them, along with uncompressed ones.
+"""
+
+import gzip
+import os
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+test.subdir('cache')
+
+test.write(['cache', 'config'], '{"prefix_len": 2, "compression": "gzip"}')
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+""" % test.workpath('cache'))
+
+test.write('aaa.in', "aaa.in\n" * 100)
+test.write('bbb.in', "bbb.in\n" * 100)
+
+def cache_entries():
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(test.workpath('cache')):
+        if dirpath != test.workpath('cache'):
+            entries.extend([os.path.join(dirpath, f) for f in filenames])
+    return sorted(entries)
+
+test.run(arguments = '.')
+
+entries = cache_entries()
+test.fail_test(len(entries) != 2)
+for entry in entries:
+    test.fail_test(not entry.endswith('.gz'))
+    with gzip.open(entry, 'rb') as f:
+        test.fail_test(f.read() not in (b"aaa.in\n" * 100, b"bbb.in\n" * 100))
+
+test.run(arguments = '-c .')
+test.run(arguments = '.')
+
+test.must_match('aaa.out', "aaa.in\n" * 100)
+test.must_match('bbb.out', "bbb.in\n" * 100)
+test.fail_test(test.stdout().count('Retrieved ') != 2)
+test.up_to_date(arguments = '.')
+
+# The entries that got compressed still get retrieved once the cache
+# doesn't compress new ones anymore.
+test.write(['cache', 'config'], '{"prefix_len": 2, "compression": "none"}')
+test.write('bbb.in', "bbb.in 2\n")
+
+test.run(arguments = '-c .')
+test.run(arguments = '.')
+
+test.must_match('aaa.out', "aaa.in\n" * 100)
+test.must_match('bbb.out', "bbb.in 2\n")
+test.fail_test(test.stdout().count('Retrieved ') != 1)
+test.fail_test(len(cache_entries()) != 3)
+test.fail_test(len([e for e in cache_entries() if e.endswith('.gz')]) != 2)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test that a CacheDir that scons-configure-cache.py set the compression
+of gets compressed entries pushed to it, which a later build can
+retrieve.
+"""
+
+import gzip
+import json
+import os
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+configure_cache = os.path.join(os.environ.get('SCONS_SCRIPT_DIR', ''),
+                               'scons-configure-cache.py')
+if not os.path.exists(configure_cache):
+    test.skip_test("Could not find scons-configure-cache.py, skipping test.\n")
+
+def configure(arguments, status = 0, stderr = None):
+    test.run(program = configure_cache,
+             interpreter = TestSCons.python,
+             arguments = 'cache ' + arguments,
+             status = status,
+             stderr = stderr)
+
+def cache_entries():
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(test.workpath('cache')):
+        if dirpath != test.workpath('cache'):
+            entries.extend([os.path.join(dirpath, f) for f in filenames])
+    return sorted(entries)
+
+test.subdir('cache')
+test.write(['cache', 'config'], '{"prefix_len": 2}')
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+""" % test.workpath('cache'))
+
+test.write('aaa.in', "aaa.in\n" * 100)
+test.write('bbb.in', "bbb.in\n" * 100)
+
+configure('--compression gzip')
+with open(test.workpath('cache', 'config')) as f:
+    config = json.load(f)
+test.fail_test(config['compression'] != 'gzip', message = str(config))
+
+configure('--compression bogus', status = 2)
+test.fail_test(test.stderr().find("invalid choice: 'bogus'") == -1)
+
+test.run(arguments = '.')
+
+entries = cache_entries()
+test.fail_test(len(entries) != 2, message = str(entries))
+for entry in entries:
+    test.fail_test(not entry.endswith('.gz'), message = entry)
+    with gzip.open(entry, 'rb') as f:
+        test.fail_test(f.read() not in (b"aaa.in\n" * 100, b"bbb.in\n" * 100))
+
+test.run(arguments = '-c .')
+test.run(arguments = '.')
+
+test.must_match('aaa.out', "aaa.in\n" * 100)
+test.must_match('bbb.out', "bbb.in\n" * 100)
+test.fail_test(test.stdout().count('Retrieved ') != 2)
+test.up_to_date(arguments = '.')
+
+# Turning it off again leaves the compressed entries alone.
+configure('--compression none')
+test.write('bbb.in', "bbb.in 2\n")
+test.run(arguments = '.')
+
+entries = cache_entries()
+test.fail_test(len(entries) != 3, message = str(entries))
+test.fail_test(len([e for e in entries if e.endswith('.gz')]) != 2)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
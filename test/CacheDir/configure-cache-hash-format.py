@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test that scons-configure-cache.py changes the prefix length of the
+entries of a CacheDir that holds entries of several hash formats, and
+that they can still be retrieved afterwards.
+"""
+
+import os
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+configure_cache = os.path.join(os.environ.get('SCONS_SCRIPT_DIR', ''),
+                               'scons-configure-cache.py')
+if not os.path.exists(configure_cache):
+    test.skip_test("Could not find scons-configure-cache.py, skipping test.\n")
+
+test.subdir('cache')
+
+test.write(['cache', 'config'], '{"prefix_len": 2}')
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+""" % test.workpath('cache'))
+
+test.write('aaa.in', "aaa.in\n")
+test.write('bbb.in', "bbb.in\n")
+
+def prefix_dirs(*top):
+    path = test.workpath('cache', *top)
+    return sorted([d for d in os.listdir(path)
+                   if os.path.isdir(os.path.join(path, d)) and d != 'sha256'])
+
+# Fill the cache with MD5 and SHA-256 entries.
+test.run()
+test.run(arguments = '-c')
+test.run(arguments = '--hash-format=sha256')
+test.must_exist(['cache', 'sha256'])
+test.fail_test([d for d in prefix_dirs() if len(d) != 2])
+test.fail_test([d for d in prefix_dirs('sha256') if len(d) != 2])
+
+test.run(program = configure_cache,
+         interpreter = TestSCons.python,
+         arguments = 'cache --prefix-len 1')
+
+for top in [(), ('sha256',)]:
+    dirs = prefix_dirs(*top)
+    test.fail_test(not dirs)
+    for d in dirs:
+        test.fail_test(len(d) != 1, message = 'bad prefix dir ' + d)
+        for name in os.listdir(test.workpath('cache', *(top + (d,)))):
+            test.fail_test(name[:1].upper() != d,
+                           message = 'misfiled entry ' + name)
+
+# Both kinds of entries can still be retrieved.
+for options in ['', '--hash-format=sha256']:
+    test.run(arguments = options + ' -c')
+    test.run(arguments = options)
+    test.fail_test(test.stdout().count('Retrieved ') != 2)
+    test.must_match('aaa.out', "aaa.in\n")
+    test.must_match('bbb.out', "bbb.in\n")
+
+# A cache without a config can have entries of other hash formats, too.
+test.subdir('old', ['old', 'A'], ['old', 'sha256'], ['old', 'sha256', 'C'])
+test.write(['old', 'A', 'abcdef'], "abcdef\n")
+test.write(['old', 'sha256', 'C', 'cdef01'], "cdef01\n")
+
+test.run(program = configure_cache,
+         interpreter = TestSCons.python,
+         arguments = 'old')
+
+test.must_match(['old', 'AB', 'abcdef'], "abcdef\n")
+test.must_match(['old', 'sha256', 'CD', 'cdef01'], "cdef01\n")
+test.must_not_exist(['old', 'A'])
+test.must_not_exist(['old', 'sha256', 'C'])
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test the --max-size, --max-entries and --prune options of
+scons-configure-cache.py.
+"""
+
+import json
+import os
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+configure_cache = os.path.join(os.environ.get('SCONS_SCRIPT_DIR', ''),
+                               'scons-configure-cache.py')
+if not os.path.exists(configure_cache):
+    test.skip_test("Could not find scons-configure-cache.py, skipping test.\n")
+
+def configure(arguments, status = 0, stderr = None):
+    test.run(program = configure_cache,
+             interpreter = TestSCons.python,
+             arguments = 'cache ' + arguments,
+             status = status,
+             stderr = stderr)
+
+def config():
+    with open(test.workpath('cache', 'config')) as f:
+        return json.load(f)
+
+def cache_entries():
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(test.workpath('cache')):
+        if dirpath != test.workpath('cache'):
+            entries.extend([os.path.join(dirpath, f) for f in filenames])
+    return sorted(entries)
+
+test.subdir('cache')
+test.write(['cache', 'config'], '{"prefix_len": 2}')
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+env.Cat('ccc.out', 'ccc.in')
+""" % test.workpath('cache'))
+
+test.write('aaa.in', "aaa.in\n")
+test.write('bbb.in', "bbb.in\n")
+test.write('ccc.in', "ccc.in\n")
+
+# Sizes get converted to bytes, and the missing limits get their
+# defaults.
+configure('--max-size 2K')
+c = config()
+test.fail_test(c['max_size'] != 2048, message = str(c))
+test.fail_test(c['max_entries'] != 0, message = str(c))
+test.fail_test(c['prefix_len'] != 2, message = str(c))
+
+configure('--max-size 2X', status = 2, stderr = None)
+test.fail_test(test.stderr().find("invalid size: '2X'") == -1)
+test.fail_test(config()['max_size'] != 2048)
+
+configure('--max-size 0')
+test.fail_test(config()['max_size'] != 0)
+
+# Fill the cache while it has no limits, so none of its entries are
+# in an index, and make aaa's entry the least recently used one.
+test.run()
+entries = cache_entries()
+test.fail_test(len(entries) != 3, message = str(entries))
+test.must_not_exist(['cache', 'index'])
+for i, name in enumerate(['aaa', 'bbb', 'ccc']):
+    for entry in entries:
+        if open(entry).read() == name + '.in\n':
+            os.utime(entry, (1000000000 + i, 1000000000 + i))
+
+configure('--max-entries 2 --prune')
+test.fail_test(test.stdout().find('Removed 1 entries') == -1)
+test.fail_test(config()['max_entries'] != 2)
+contents = sorted([open(entry).read() for entry in cache_entries()])
+test.fail_test(contents != ["bbb.in\n", "ccc.in\n"], message = str(contents))
+
+# The index was rewritten with the entries that are left, and the
+# usage file with their size and number.
+index = test.read(['cache', 'index'], mode = 'r').splitlines()
+test.fail_test(len(index) != 2, message = str(index))
+for line in index:
+    test.fail_test(line.split(' ')[1] != 'get', message = line)
+with open(test.workpath('cache', 'usage')) as f:
+    usage = json.load(f)
+test.fail_test(usage['entries'] != 2, message = str(usage))
+test.fail_test(usage['size'] != 2 * len("bbb.in\n"), message = str(usage))
+test.fail_test(usage['index_size'] != os.path.getsize(test.workpath('cache', 'index')),
+               message = str(usage))
+
+# Pruning again within the limits removes nothing.
+configure('--prune')
+test.fail_test(test.stdout().find('Removed 0 entries') == -1)
+test.must_exist(['cache', 'usage'])
+
+# Changing a limit drops the usage file, so that the next prune looks
+# for all of the entries again...
+configure('--max-size 1M')
+test.fail_test(config()['max_size'] != 2**20)
+test.must_not_exist(['cache', 'usage'])
+
+configure('--prune')
+test.must_exist(['cache', 'usage'])
+
+# ...but setting it to what it already is doesn't.
+configure('--max-size 1024K')
+test.must_exist(['cache', 'usage'])
+
+configure('--max-entries 1')
+test.must_not_exist(['cache', 'usage'])
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
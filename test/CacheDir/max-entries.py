@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Test that the least recently used entries get removed from a CacheDir
+with a max_entries in its config at the end of a build.
+"""
+
+import os
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+test.subdir('cache')
+
+test.write(['cache', 'config'], '{"prefix_len": 2, "max_entries": 2}')
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    open(str(target[0]), 'w').write(open(str(source[0])).read())
+CacheDir(r'%s')
+env = Environment(BUILDERS = {'Cat' : Builder(action = cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+env.Cat('ccc.out', 'ccc.in')
+""" % test.workpath('cache'))
+
+test.write('aaa.in', "aaa.in\n")
+test.write('bbb.in', "bbb.in\n")
+test.write('ccc.in', "ccc.in\n")
+
+def cache_entries():
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(test.workpath('cache')):
+        if dirpath != test.workpath('cache'):
+            entries.extend(filenames)
+    return entries
+
+test.run()
+
+test.must_match('aaa.out', "aaa.in\n")
+test.must_match('bbb.out', "bbb.in\n")
+test.must_match('ccc.out', "ccc.in\n")
+test.fail_test(len(cache_entries()) != 2)
+test.must_exist(['cache', 'index'])
+test.must_exist(['cache', 'usage'])
+
+# Two of them get retrieved, the other one gets rebuilt and pushed, and
+# the least recently used entry gets removed again.
+test.run(arguments = '-c')
+test.run()
+
+test.must_match('aaa.out', "aaa.in\n")
+test.must_match('bbb.out', "bbb.in\n")
+test.must_match('ccc.out', "ccc.in\n")
+test.fail_test(test.stdout().count('Retrieved ') != 2)
+test.fail_test(len(cache_entries()) != 2)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
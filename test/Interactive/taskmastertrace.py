@@ -89,7 +89,7 @@ Task.postprocess():  adjusted parent ref count <pending    0   'foo.out'>
 
 Taskmaster: Looking for a node to evaluate
 Taskmaster:     Considering node <pending    0   'foo.out'> and its children:
-Taskmaster:        <up_to_date 0   'foo.in'>
+Taskmaster:        children already done
 Taskmaster: Evaluating <pending    0   'foo.out'>
 
 Task.make_ready_current(): node <pending    0   'foo.out'>
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+
+"""
+Verify that the --watch option keeps the signatures of the source files
+that didn't change between interactive builds, and still notices the
+ones that did.
+"""
+
+import sys
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+if not sys.platform.startswith('linux'):
+    test.skip_test("Watching files for changes needs Linux; skipping test.\n")
+
+test.write('SConstruct', """\
+import SCons.Node.FS
+
+# Log the source files whose contents get read.
+get_contents = SCons.Node.FS.File.get_contents
+def logging_get_contents(self):
+    if self.name.endswith('.in'):
+        open('hashed.log', 'a').write(self.name + '\\n')
+    return get_contents(self)
+SCons.Node.FS.File.get_contents = logging_get_contents
+
+Command('foo.out', 'foo.in', Copy('$TARGET', '$SOURCE'))
+Command('bar.out', 'bar.in', Copy('$TARGET', '$SOURCE'))
+for n in range(1, 5):
+    Command(str(n), [], Touch('$TARGET'))
+""")
+
+test.write('foo.in', "foo.in 1\n")
+test.write('bar.in', "bar.in 1\n")
+
+scons = test.start(arguments = '-Q --interactive --watch')
+
+scons.send("build foo.out bar.out 1\n")
+test.wait_for(test.workpath('1'))
+test.must_match('hashed.log', "foo.in\nbar.in\n")
+
+# The directory only gets watched after the first build, so nothing
+# can be trusted yet.
+scons.send("build foo.out bar.out 2\n")
+test.wait_for(test.workpath('2'))
+test.must_match('hashed.log', "foo.in\nbar.in\n" * 2)
+
+test.write('foo.in', "foo.in 3\n")
+scons.send("build foo.out bar.out 3\n")
+test.wait_for(test.workpath('3'))
+test.must_match('hashed.log', "foo.in\nbar.in\n" * 2 + "foo.in\n")
+test.must_match('foo.out', "foo.in 3\n")
+
+scons.send("build foo.out bar.out 4\n")
+test.wait_for(test.workpath('4'))
+test.must_match('hashed.log', "foo.in\nbar.in\n" * 2 + "foo.in\n")
+
+expect_stdout = """\
+scons>>> Copy("foo.out", "foo.in")
+Copy("bar.out", "bar.in")
+Touch("1")
+scons>>> scons: `foo.out' is up to date.
+scons: `bar.out' is up to date.
+Touch("2")
+scons>>> Copy("foo.out", "foo.in")
+scons: `bar.out' is up to date.
+Touch("3")
+scons>>> scons: `foo.out' is up to date.
+scons: `bar.out' is up to date.
+Touch("4")
+scons>>> 
+"""
+
+test.finish(scons, stdout = expect_stdout)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+"""
+Verify that parallel builds, which compute the content signatures of
+the source files before they start, still notice the sources that
+changed, for the Decider() of each target, and leave the sources of a
+clean alone.
+"""
+
+import time
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+test.write('build.py', r"""
+import sys
+open(sys.argv[1], 'w').write(open(sys.argv[2], 'r').read())
+""")
+
+test.write('SConstruct', """
+B = Builder(action = r'%(_python_)s build.py $TARGET $SOURCE')
+env = Environment(BUILDERS = { 'B' : B })
+timestamp_env = env.Clone()
+timestamp_env.Decider('timestamp-newer')
+env.B('f1.out', 'f1.in')
+env.B('f2.out', 'f2.in')
+env.B('f3.mid', 'f3.in')
+env.B('f3.out', 'f3.mid')
+timestamp_env.B('f4.out', 'f4.in')
+Default(env.Alias('all', ['f1.out', 'f2.out', 'f3.out', 'f4.out']))
+""" % locals())
+
+test.write('f1.in', "f1.in\n")
+test.write('f2.in', "f2.in " * 20000 + "\n")
+test.write('f3.in', "f3.in\n")
+test.write('f4.in', "f4.in\n")
+
+test.run(arguments = '-j 4')
+test.must_match('f1.out', "f1.in\n")
+test.must_match('f2.out', "f2.in " * 20000 + "\n")
+test.must_match('f3.out', "f3.in\n")
+test.must_match('f4.out', "f4.in\n")
+
+test.up_to_date(options = '-j 4', arguments = 'all')
+
+test.write('f2.in', "f2.in " * 20001 + "\n")
+test.write('f3.in', "f3.in 2\n")
+test.not_up_to_date(options = '-j 4', arguments = 'f2.out f3.out')
+test.must_match('f2.out', "f2.in " * 20001 + "\n")
+test.must_match('f3.out', "f3.in 2\n")
+test.up_to_date(options = '-j 4', arguments = 'all')
+
+# A source with the same content, but newer, is only a change for
+# the target that decides by its timestamp.
+test.touch('f1.in', time.time() + 10)
+test.touch('f4.in', time.time() + 10)
+test.up_to_date(options = '-j 4', arguments = 'f1.out')
+test.not_up_to_date(options = '-j 4', arguments = 'f4.out')
+
+test.run(arguments = '-j 4 -c')
+test.must_not_exist('f1.out')
+test.must_not_exist('f3.mid')
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that env.ResourcePool() and $RESOURCE_POOL limit how many
+targets in a pool get built at the same time, while other targets
+keep getting built in parallel.
+"""
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+test.write('job.py', """\
+import sys
+import time
+start = time.time()
+time.sleep(0.5)
+with open(sys.argv[1], 'w') as f:
+    f.write('%f %f\\n' % (start, time.time()))
+""")
+
+test.write('SConstruct', """
+env = Environment()
+env.ResourcePool('link', 1)
+job = r'%(_python_)s job.py $TARGET'
+link = []
+for i in range(2):
+    link.extend(env.Command('link%%d.out' %% i, [], job))
+env.ResourcePool('link', target = link)
+for i in range(2, 4):
+    env.Command('link%%d.out' %% i, [], job, RESOURCE_POOL = 'link')
+for i in range(4):
+    env.Command('other%%d.out' %% i, [], job)
+""" % locals())
+
+def intervals(prefix):
+    result = []
+    for i in range(4):
+        start, end = test.read('%s%d.out' % (prefix, i), mode='r').split()
+        result.append((float(start), float(end)))
+    return result
+
+def max_overlap(intervals):
+    times = []
+    for start, end in intervals:
+        times.append((start, 1))
+        times.append((end, -1))
+    running = 0
+    result = 0
+    for t, n in sorted(times):
+        running = running + n
+        result = max(running, result)
+    return result
+
+for args in ['-j 4 .', '-j 4 --schedule=critical-path .']:
+    test.run(arguments = args)
+
+    links = intervals('link')
+    test.fail_test(max_overlap(links) != 1,
+                   message = "links ran in parallel with %s" % args)
+    test.fail_test(max_overlap(links + intervals('other')) < 2,
+                   message = "nothing ran in parallel with %s" % args)
+
+    test.run(arguments = '-c .')
+
+test.write('SConstruct', """
+ResourcePool('link', 0)
+""")
+
+test.run(arguments = '.',
+         status = 2,
+         stderr = None)
+test.must_contain_all_lines(test.stderr(), [
+    "A positive integer is required for the size of resource pool link: 0"
+])
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
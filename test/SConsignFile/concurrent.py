@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that SCons processes that build different targets at the same
+time, sharing the .sconsign database, don't lose each other's entries.
+"""
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+test.subdir('sub')
+
+test.write('build.py', r"""
+import sys
+contents = open(sys.argv[2], 'rb').read()
+file = open(sys.argv[1], 'wb')
+file.write(contents)
+file.close()
+""")
+
+# Tells the test that the build started, and waits for it to go on.
+test.write('wait.py', r"""
+import os
+import sys
+import time
+open('started', 'w').close()
+while not os.path.exists('go'):
+    time.sleep(0.1)
+contents = open(sys.argv[2], 'rb').read()
+file = open(sys.argv[1], 'wb')
+file.write(contents)
+file.close()
+""")
+
+test.write('SConstruct', """
+B = Builder(action = r'%(_python_)s build.py $TARGET $SOURCE')
+W = Builder(action = r'%(_python_)s wait.py $TARGET $SOURCE')
+env = Environment(BUILDERS = { 'B' : B, 'W' : W })
+env.B('a.out', 'a.in')
+env.B('b.out', 'b.in')
+env.B('sub/a.out', 'sub/a.in')
+env.B('sub/b.out', 'sub/b.in')
+env.W('wait.out', 'wait.in')
+""" % locals())
+
+for name in ['a', 'b', 'wait', 'sub/a', 'sub/b']:
+    test.write(name + '.in', name + '.in\n')
+
+# One build reads the .sconsign database, and waits...
+p = test.start(arguments = 'a.out sub/a.out wait.out')
+test.wait_for(test.workpath('started'), popen = p)
+
+# ...while another one writes it...
+test.run(arguments = 'b.out sub/b.out')
+test.must_match('b.out', "b.in\n")
+test.must_match(['sub', 'b.out'], "sub/b.in\n")
+
+# ...and then the first one writes it, too.
+test.write('go', "")
+test.finish(p, stdout = None)
+test.must_match('a.out', "a.in\n")
+test.must_match(['sub', 'a.out'], "sub/a.in\n")
+
+test.must_not_exist(test.workpath('.sconsign.dblite.lock'))
+
+# Nothing got lost, so everything's up to date.
+test.up_to_date(arguments = '.')
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -24,17 +24,64 @@
 
 __revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
 
+"""
+Verify the -l, --load-average and --max-load options, and that a
+parallel build with a load average limit builds everything.
+"""
+
 import TestSCons
 
 test = TestSCons.TestSCons()
 
-test.write('SConstruct', "")
+test.write('SConstruct', """
+print("load_average: %s" % GetOption('load_average'))
+def cat(target, source, env):
+    with open(str(target[0]), 'w') as ofp:
+        for s in source:
+            with open(str(s), 'r') as ifp:
+                ofp.write(ifp.read())
+env = Environment(BUILDERS = {'Cat' : Builder(action = Action(cat, None))})
+for i in range(4):
+    env.Cat('f%d.out' % i, 'f%d.in' % i)
+""")
+
+for i in range(4):
+    test.write('f%d.in' % i, "f%d.in\n" % i)
+
+test.run(arguments = '-Q -l 2.5 -n .',
+         stdout = "load_average: 2.5\n")
+
+test.run(arguments = '-Q --load-average=3 -n .',
+         stdout = "load_average: 3.0\n")
+
+test.run(arguments = '-Q --max-load=4.5 -n .',
+         stdout = "load_average: 4.5\n")
+
+test.run(arguments = '-Q -n .',
+         stdout = "load_average: 0\n")
+
+test.run(arguments = '-Q -l x .',
+         stderr = TestSCons.re_escape("""\
+usage: scons [OPTION] [TARGET] ...
+
+SCons Error: option -l: invalid floating-point value: 'x'
+"""),
+         status = 2,
+         match = TestSCons.match_re)
+
+test.run(arguments = '-Q -j 4 -l 1000 .')
 
-test.option_not_yet_implemented('-l', '1 .')
+for i in range(4):
+    test.must_match('f%d.out' % i, "f%d.in\n" % i)
 
-test.option_not_yet_implemented('--load-average', '=1 .')
+test.write('SConstruct', """
+SetOption('load_average', '1.5')
+print("load_average: %s" % GetOption('load_average'))
+""")
 
-test.option_not_yet_implemented('--max-load', '=1 .')
+test.run(arguments = '-Q -n .',
+         stdout = "load_average: 1.5\n"
+                  "scons: `.' is up to date.\n")
 
 test.pass_test()
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that --command-loop builds the targets of a parallel build in
+parallel, that targets built by Python functions still get built, and
+that failed commands are reported as usual.
+"""
+
+import os
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+if os.name != 'posix':
+    test.skip_test('command loops are only supported on POSIX; skipping test.\n')
+
+test.write('job.py', """\
+import sys
+import time
+start = time.time()
+time.sleep(1)
+with open(sys.argv[1], 'w') as f:
+    f.write('%f %f\\n' % (start, time.time()))
+""")
+
+test.write('SConstruct', """
+def write(target, source, env):
+    with open(str(target[0]), 'w') as f:
+        f.write('function\\n')
+env = Environment()
+for i in range(4):
+    env.Command('job%%d.out' %% i, 'job.py', r'%(_python_)s $SOURCE $TARGET')
+env.Command('function.out', [], write)
+env.Command('list.out', [], ['echo 1 > $TARGET', '-exit 2', 'echo 2 >> $TARGET'])
+env.Command('fail.out', [], ['exit 3', 'touch $TARGET'])
+""" % locals())
+
+expect = test.wrap_stdout("""\
+echo 1 > list.out
+exit 2
+echo 2 >> list.out
+""")
+
+test.run(arguments = '--command-loop -j 4 list.out', stdout = expect)
+test.must_match('list.out', '1\n2\n', mode='r')
+
+test.run(arguments = '-Q --command-loop -j 4 job0.out job1.out job2.out job3.out function.out',
+         stdout = None)
+
+times = []
+for i in range(4):
+    start, end = test.read('job%d.out' % i, mode='r').split()
+    times.append((float(start), 1))
+    times.append((float(end), -1))
+running = 0
+max_running = 0
+for t, n in sorted(times):
+    running = running + n
+    max_running = max(running, max_running)
+test.fail_test(max_running < 2, message = "%d jobs ran at once" % max_running)
+test.must_match('function.out', 'function\n', mode='r')
+
+test.run(arguments = '-Q --command-loop -j 4 fail.out',
+         stdout = "exit 3\n",
+         stderr = "scons: *** [fail.out] Error 3\n",
+         status = 2)
+test.must_not_exist('fail.out')
+
+test.write('SConstruct', """
+SetOption('command_loop', True)
+""" + test.read('SConstruct', mode='r'))
+
+test.run(arguments = '-Q -c .', stdout = None)
+test.run(arguments = '-Q -j 4 -k .', stdout = None,
+         stderr = "scons: *** [fail.out] Error 3\n",
+         status = 2)
+for i in range(4):
+    test.must_exist('job%d.out' % i)
+test.must_match('function.out', 'function\n', mode='r')
+test.must_match('list.out', '1\n2\n', mode='r')
+test.must_not_exist('fail.out')
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
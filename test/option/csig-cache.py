@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+"""
+Verify that the --csig-cache option caches the content signatures of
+files by their stat() information, so that a new variant directory of
+unchanged sources doesn't hash them again.  The variant directories
+don't duplicate the sources, since hard links change the times of the
+sources.
+"""
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+test.subdir('src')
+
+test.write('SConstruct', """
+from __future__ import print_function
+import atexit
+import os
+import SCons.Util
+
+hashed = set()
+MD5filesignature = SCons.Util.MD5filesignature
+def counting_MD5filesignature(fname, *args, **kw):
+    if fname.endswith('.in'):
+        hashed.add(os.path.basename(fname))
+    return MD5filesignature(fname, *args, **kw)
+SCons.Util.MD5filesignature = counting_MD5filesignature
+atexit.register(lambda: print("hashed:", " ".join(sorted(hashed))))
+
+variant = ARGUMENTS.get('variant', 'build1')
+VariantDir(variant, 'src', duplicate=0)
+env = Environment()
+for name in ['f1', 'f2']:
+    env.Command('%s/%s.out' % (variant, name), '%s/%s.in' % (variant, name),
+                Copy('$TARGET', '$SOURCE'))
+""")
+
+# Big enough to be hashed with MD5filesignature().
+test.write(['src', 'f1.in'], "f1.in\n" * 20)
+test.write(['src', 'f2.in'], "f2.in\n" * 20)
+
+# Files that were changed in the last two seconds don't get cached.
+test.sleep(2)
+
+test.run(arguments = '-Q --csig-cache=csigs .')
+test.must_contain_all_lines(test.stdout(), ["hashed: f1.in f2.in\n"])
+test.must_exist('csigs.dblite')
+
+test.run(arguments = '-Q --csig-cache=csigs variant=build2 .')
+test.must_contain_all_lines(test.stdout(), ["hashed: \n"])
+test.must_match(['build2', 'f1.out'], "f1.in\n" * 20)
+
+test.run(arguments = '-Q variant=build3 .')
+test.must_contain_all_lines(test.stdout(), ["hashed: f1.in f2.in\n"])
+
+test.write(['src', 'f1.in'], "f1.in 2\n" * 20)
+test.run(arguments = '-Q --csig-cache=csigs variant=build2 .')
+test.must_contain_all_lines(test.stdout(), ["hashed: f1.in\n"])
+test.must_match(['build2', 'f1.out'], "f1.in 2\n" * 20)
+
+# SetOption() works, too.
+test.write('SConstruct', test.read('SConstruct', mode='r') + """
+SetOption('csig_cache', 'csigs')
+""")
+
+# The new f1.in is cached once it's been left alone long enough.
+test.sleep(2)
+test.run(arguments = '-Q variant=build4 .')
+test.must_match(['build4', 'f1.out'], "f1.in 2\n" * 20)
+test.run(arguments = '-Q variant=build5 .')
+test.must_contain_all_lines(test.stdout(), ["hashed: \n"])
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that the --function-processes option builds targets whose
+actions are picklable Python functions in worker processes, and
+everything else in the main SCons process.
+"""
+
+import sys
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+if sys.platform == 'win32':
+    test.skip_test('Worker processes need fork(); skipping test.\n')
+
+test.subdir('site_scons')
+
+test.write(['site_scons', 'pidfuncs.py'], """\
+import os
+def write_pid(target, source, env):
+    open(str(target[0]), 'w').write(str(os.getpid()))
+def fail(target, source, env):
+    return 3
+""")
+
+test.write('SConstruct', """\
+import os
+import pidfuncs
+open('main.pid', 'w').write(str(os.getpid()))
+env = Environment()
+env.Command('f1.out', [], pidfuncs.write_pid)
+env.Command('f2.out', [], pidfuncs.write_pid)
+env.Command('local.out', [],
+            lambda target, source, env: pidfuncs.write_pid(target, source, env))
+if ARGUMENTS.get('FAIL'):
+    env.Command('fail.out', [], pidfuncs.fail)
+""")
+
+def pid(file):
+    return int(test.read(file, mode='r'))
+
+test.run(arguments = '-j 2 --function-processes .')
+main = pid('main.pid')
+test.fail_test(pid('f1.out') == main)
+test.fail_test(pid('f2.out') == main)
+test.fail_test(pid('local.out') != main)
+
+test.run(arguments = '-c .')
+
+# Without -j there are no worker processes.
+test.run(arguments = '--function-processes .')
+main = pid('main.pid')
+test.fail_test(pid('f1.out') != main)
+test.fail_test(pid('f2.out') != main)
+
+test.run(arguments = '-c .')
+
+# Or without the option.
+test.run(arguments = '-j 2 .')
+main = pid('main.pid')
+test.fail_test(pid('f1.out') != main)
+test.fail_test(pid('f2.out') != main)
+
+test.run(arguments = '-c .')
+
+test.write('SConstruct', """\
+SetOption('function_processes', True)
+""" + test.read('SConstruct', mode='r'))
+
+test.run(arguments = '-j 2 .')
+main = pid('main.pid')
+test.fail_test(pid('f1.out') == main)
+test.fail_test(pid('f2.out') == main)
+
+# Failures in the worker processes are reported as usual.
+test.run(arguments = '-j 2 FAIL=1 fail.out',
+         status = 2,
+         stderr = "scons: *** [fail.out] Error 3\n")
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
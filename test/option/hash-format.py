@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+"""
+Verify that the --hash-format option selects the hash of content
+signatures, keeps a separate .sconsign file and CacheDir subdirectory
+for each format, and rejects unknown formats.
+"""
+
+import os
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+test.write('build.py', r"""
+import sys
+open(sys.argv[1], 'w').write(open(sys.argv[2], 'r').read())
+""")
+
+test.write('SConstruct', """
+CacheDir('cache')
+B = Builder(action = r'%(_python_)s build.py $TARGETS $SOURCES')
+env = Environment(BUILDERS = { 'B' : B })
+env.B(target = 'f1.out', source = 'f1.in')
+""" % locals())
+
+test.write('f1.in', "f1.in\n")
+
+test.run(arguments = '--hash-format=sha256 .')
+test.must_match('f1.out', "f1.in\n")
+test.must_exist('.sconsign_sha256.dblite')
+test.must_not_exist('.sconsign.dblite')
+test.must_exist(test.workpath('cache', 'sha256'))
+
+test.up_to_date(options = '--hash-format=sha256', arguments = '.')
+
+# The md5 signatures are kept apart, so the default format rebuilds
+# (from the cache, which is also kept apart) and keeps its own file.
+test.not_up_to_date(arguments = 'f1.out')
+test.must_exist('.sconsign.dblite')
+
+test.up_to_date(arguments = '.')
+test.up_to_date(options = '--hash-format=sha256', arguments = '.')
+
+# A change is noticed with either format.
+test.write('f1.in', "f1.in 2\n")
+test.not_up_to_date(options = '--hash-format=sha256', arguments = 'f1.out')
+test.must_match('f1.out', "f1.in 2\n")
+test.not_up_to_date(arguments = 'f1.out')
+
+# SetOption() selects the format before anything has been hashed.
+test.write('SConstruct', """
+SetOption('hash_format', 'sha256')
+""" + test.read('SConstruct', mode='r'))
+
+test.up_to_date(arguments = '.')
+
+expect = r"""usage: scons [OPTION] [TARGET] ...
+
+SCons Error: `nope' is not a valid hash format, try: md5, sha256, blake2b, xxhash
+"""
+
+test.run(arguments = '--hash-format=nope .', stderr = expect, status = 2)
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that a parallel build shares the job slots of a make that runs
+it through the make jobserver, and with --jobserver passes a jobserver
+of its own on to the make it runs.
+"""
+
+import os
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+if os.name != 'posix':
+    test.skip_test('make jobservers are only supported on POSIX; skipping test.\n')
+
+make = test.where_is('make')
+if not make:
+    test.skip_test('Could not find make; skipping test.\n')
+
+test.subdir('sub')
+
+test.write(['sub', 'Makefile'], """\
+all:
+\t@echo "$(MAKEFLAGS)"
+""")
+
+test.write('job.py', """\
+import os
+import sys
+import time
+start = time.time()
+time.sleep(1)
+with open(sys.argv[1], 'w') as f:
+    f.write('%f %f\\n' % (start, time.time()))
+    f.write(os.environ.get('MAKEFLAGS', '') + '\\n')
+""")
+
+test.write('SConstruct', """
+env = Environment()
+env.Command('sub.out', 'sub/Makefile', '%(make)s -s -C sub > $TARGET')
+for i in range(4):
+    env.Command('job%%d.out' %% i, 'job.py', r'%(_python_)s $SOURCE $TARGET')
+""" % locals())
+
+# Without --jobserver, the make we run runs its own jobs.
+test.run(arguments = '-Q -j 2 sub.out', stdout = None, stderr = '')
+test.must_not_contain('sub.out', '--jobserver-auth=', mode='r')
+
+# With --jobserver, it shares our job slots.
+test.unlink('sub.out')
+test.run(arguments = '-Q -j 2 --jobserver sub.out', stdout = None, stderr = '')
+test.must_contain('sub.out', '--jobserver-auth=', mode='r')
+
+test.write('SConstruct', """
+SetOption('jobserver', True)
+""" + test.read('SConstruct', mode='r'))
+
+test.unlink('sub.out')
+test.run(arguments = '-Q -j 2 sub.out', stdout = None, stderr = '')
+test.must_contain('sub.out', '--jobserver-auth=', mode='r')
+
+# Run by a make with two job slots, four jobs of ours only run two at a
+# time, and the make we run is passed the jobserver too.
+test.write('Makefile', """\
+all:
+\t+%s %s -Q -j 4 .
+""" % (TestSCons.python, test.program))
+
+test.run(arguments = '-Q -c .', stdout = None)
+test.run(program = make, arguments = '-s -j2', stdout = None, stderr = '')
+
+times = []
+for i in range(4):
+    lines = test.read('job%d.out' % i, mode='r').split('\n')
+    start, end = lines[0].split()
+    times.append((float(start), 1))
+    times.append((float(end), -1))
+    assert '--jobserver-auth=' in lines[1], lines[1]
+running = 0
+max_running = 0
+for t, n in sorted(times):
+    running = running + n
+    max_running = max(running, max_running)
+test.fail_test(max_running > 2, message = "%d jobs ran at once" % max_running)
+test.must_contain('sub.out', '--jobserver-auth=', mode='r')
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+"""
+Verify that the implicit dependencies of sources are found as usual when
+--prescan reads their includes ahead of a parallel build, and that it
+can be set with SetOption().
+"""
+
+import TestSCons
+
+_python_ = TestSCons._python_
+
+test = TestSCons.TestSCons()
+
+test.write('cat.py', """\
+import sys
+with open(sys.argv[1], 'w') as out:
+    for f in sys.argv[2:]:
+        with open(f) as inp:
+            out.write(inp.read())
+""")
+
+test.write('SConstruct', """
+env = Environment(CPPPATH = ['inc'])
+cat = Builder(action = r'%(_python_)s cat.py $TARGET $SOURCES',
+              source_scanner = CScanner)
+env.Append(BUILDERS = {'Cat' : cat})
+for i in range(4):
+    env.Cat('f%%d.out' %% i, 'f%%d.c' %% i)
+env.Cat('all.out', ['f%%d.out' %% i for i in range(4)])
+""" % locals())
+
+test.subdir('inc')
+for i in range(4):
+    test.write('f%d.c' % i, '#include "f%d.h"\n#include <common.h>\n' % i)
+    test.write('f%d.h' % i, 'f%d.h\n' % i)
+test.write(['inc', 'common.h'], '#include "nested.h"\n')
+test.write(['inc', 'nested.h'], 'nested.h\n')
+
+test.run(arguments = '-Q --prescan -j 4 .', stdout = None)
+test.up_to_date(options = '--prescan -j 4', arguments = '.')
+
+test.write(['inc', 'nested.h'], 'nested.h 2\n')
+test.not_up_to_date(options = '--prescan -j 4',
+                    arguments = ' '.join(['f%d.out' % i for i in range(4)]))
+test.run(arguments = '-Q --prescan -j 4 .', stdout = None)
+test.up_to_date(options = '--prescan -j 4', arguments = '.')
+
+test.write('f2.h', 'f2.h 2\n')
+test.run(arguments = '--prescan -j 4 .',
+         stdout = test.wrap_stdout(r"""%(_python_)s cat.py f2.out f2.c
+%(_python_)s cat.py all.out f0.out f1.out f2.out f3.out
+""" % locals()))
+
+test.write('SConstruct', """
+SetOption('prescan', True)
+""" + test.read('SConstruct', mode='r'))
+
+test.write('f3.h', 'f3.h 2\n')
+test.run(arguments = '-Q -j 4 --implicit-cache .',
+         stdout = r"""%(_python_)s cat.py f3.out f3.c
+%(_python_)s cat.py all.out f0.out f1.out f2.out f3.out
+""" % locals())
+test.write(['inc', 'extra.h'], 'extra.h\n')
+test.write(['inc', 'common.h'], '#include "nested.h"\n#include "extra.h"\n')
+test.run(arguments = '-Q -j 4 .', stdout = None)
+test.up_to_date(options = '-j 4', arguments = '.')
+test.write(['inc', 'extra.h'], 'extra.h 2\n')
+test.not_up_to_date(options = '-j 4', arguments = 'f3.out')
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
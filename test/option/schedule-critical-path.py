@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+
+"""
+Verify that the --schedule=critical-path option builds the target
+that took longest last time first, using the build times recorded
+in the .sconsign file.
+"""
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+test.write('SConstruct', """\
+import time
+def cat(env, source, target):
+    time.sleep(env['SLEEP'])
+    target = str(target[0])
+    f = open(target, "wb")
+    for src in source:
+        f.write(open(str(src), "rb").read())
+    f.close()
+env = Environment(BUILDERS={'Cat':Builder(action=cat)})
+env.Cat('aaa.out', 'aaa.in', SLEEP=0)
+env.Cat('bbb.out', 'bbb.in', SLEEP=0)
+env.Cat('ccc.out', 'ccc.in', SLEEP=2)
+env.Cat('all', ['aaa.out', 'bbb.out', 'ccc.out'], SLEEP=0)
+""")
+
+test.write('aaa.in', "aaa.in\n")
+test.write('bbb.in', "bbb.in\n")
+test.write('ccc.in', "ccc.in\n")
+
+walk_order = """\
+cat(["aaa.out"], ["aaa.in"])
+cat(["bbb.out"], ["bbb.in"])
+cat(["ccc.out"], ["ccc.in"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+"""
+
+# Nothing has been recorded yet, so we get the usual order.
+test.run(arguments = '-Q --schedule=critical-path all', stdout = walk_order)
+test.must_match('all', "aaa.in\nbbb.in\nccc.in\n")
+
+test.run(arguments = '-Q -c all')
+
+test.run(arguments = '-Q --schedule=critical-path all', stdout = """\
+cat(["ccc.out"], ["ccc.in"])
+cat(["aaa.out"], ["aaa.in"])
+cat(["bbb.out"], ["bbb.in"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+""")
+test.must_match('all', "aaa.in\nbbb.in\nccc.in\n")
+
+test.run(arguments = '-Q -c all')
+
+# The default order is unchanged.
+test.run(arguments = '-Q all', stdout = walk_order)
+
+test.run(arguments = '-Q -c all')
+
+test.write('SConstruct', """\
+SetOption('schedule', 'critical-path')
+""" + test.read('SConstruct', mode='r'))
+
+test.run(arguments = '-Q all', stdout = """\
+cat(["ccc.out"], ["ccc.in"])
+cat(["aaa.out"], ["aaa.in"])
+cat(["bbb.out"], ["bbb.in"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+""")
+
+test.run(arguments = '-Q --schedule=no-such-mode all',
+         status = 2,
+         stderr = None)
+test.must_contain_all_lines(test.stderr(),
+                            ["`no-such-mode' is not a valid schedule option type"])
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4:
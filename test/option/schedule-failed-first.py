@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# __COPYRIGHT__
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__revision__ = "__FILE__ __REVISION__ __DATE__ __DEVELOPER__"
+"""
+Verify that the --schedule=failed-first option builds the targets that
+failed last time, and what they depend on, before the others, and that
+it forgets about the failures once the targets are built.
+"""
+
+import TestSCons
+
+test = TestSCons.TestSCons()
+
+test.write('SConstruct', """\
+def cat(env, source, target):
+    contents = b''.join([open(str(src), "rb").read() for src in source])
+    if b'error' in contents:
+        return 1
+    open(str(target[0]), "wb").write(contents)
+env = Environment(BUILDERS={'Cat':Builder(action=cat)})
+env.Cat('aaa.out', 'aaa.in')
+env.Cat('bbb.out', 'bbb.in')
+env.Cat('ccc.mid', 'ccc.in')
+env.Cat('ccc.out', 'ccc.mid')
+env.Cat('all', ['aaa.out', 'bbb.out', 'ccc.out'])
+""")
+
+def write_inputs(ccc='ccc.in\n', bbb='bbb.in\n', n=1):
+    test.write('aaa.in', "aaa.in %d\n" % n)
+    test.write('bbb.in', bbb)
+    test.write('ccc.in', ccc)
+
+walk_order = """\
+cat(["aaa.out"], ["aaa.in"])
+cat(["bbb.out"], ["bbb.in"])
+cat(["ccc.mid"], ["ccc.in"])
+cat(["ccc.out"], ["ccc.mid"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+"""
+
+# Nothing has failed yet, so we get the usual order.
+write_inputs()
+test.run(arguments = '-Q --schedule=failed-first all', stdout = walk_order)
+
+# ccc.mid can't be built, but the others can with -k.
+write_inputs(ccc='error\n', n=2)
+test.run(arguments = '-Q -k all',
+         stdout = """\
+cat(["aaa.out"], ["aaa.in"])
+cat(["ccc.mid"], ["ccc.in"])
+""",
+         stderr = "scons: *** [ccc.mid] Error 1\n",
+         status = 2)
+
+write_inputs(ccc='ccc.in 3\n', n=3)
+test.run(arguments = '-Q --schedule=failed-first all', stdout = """\
+cat(["ccc.mid"], ["ccc.in"])
+cat(["ccc.out"], ["ccc.mid"])
+cat(["aaa.out"], ["aaa.in"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+""")
+test.must_match('all', "aaa.in 3\nbbb.in\nccc.in 3\n")
+
+# ccc.mid got built, so it's forgotten.
+write_inputs(ccc='ccc.in 4\n', bbb='bbb.in 4\n', n=4)
+test.run(arguments = '-Q --schedule=failed-first all', stdout = walk_order)
+
+# Failures are recorded without -k, too, and the default order is
+# unchanged.
+write_inputs(ccc='ccc.in 4\n', bbb='error\n', n=5)
+test.run(arguments = '-Q all',
+         stdout = """\
+cat(["aaa.out"], ["aaa.in"])
+cat(["bbb.out"], ["bbb.in"])
+""",
+         stderr = "scons: *** [bbb.out] Error 1\n",
+         status = 2)
+
+write_inputs(ccc='ccc.in 6\n', bbb='bbb.in 6\n', n=6)
+test.run(arguments = '-Q all', stdout = walk_order)
+
+write_inputs(ccc='ccc.in 7\n', bbb='error\n', n=7)
+test.run(arguments = '-Q all', status = 2, stdout = None, stderr = None)
+
+test.write('SConstruct', """\
+SetOption('schedule', 'failed-first')
+""" + test.read('SConstruct', mode='r'))
+
+write_inputs(ccc='ccc.in 8\n', bbb='bbb.in 8\n', n=8)
+test.run(arguments = '-Q all', stdout = """\
+cat(["bbb.out"], ["bbb.in"])
+cat(["aaa.out"], ["aaa.in"])
+cat(["ccc.mid"], ["ccc.in"])
+cat(["ccc.out"], ["ccc.mid"])
+cat(["all"], ["aaa.out", "bbb.out", "ccc.out"])
+""")
+test.must_match('all', "aaa.in 8\nbbb.in 8\nccc.in 8\n")
+
+test.pass_test()
+
+# Local Variables:
+# tab-width:4
+# indent-tabs-mode:nil
+# End:
+# vim: set expandtab tabstop=4 shiftwidth=4: